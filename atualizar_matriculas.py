@@ -8,6 +8,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'imoveis_caixa.settings')
 django.setup()
 
 from propriedades.models import Propriedade
+from propriedades.versao import incrementar_versao_dados
 
 # Configuração de logging
 logging.basicConfig(
@@ -58,6 +59,9 @@ def atualizar_urls_matriculas():
                 
     except Exception as e:
         logger.error(f"Erro durante a atualização: {str(e)}")
+    
+    if atualizados:
+        incrementar_versao_dados()
         
     # Relatório final
     logger.info("\n=== Relatório Final ===")
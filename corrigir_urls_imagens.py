@@ -8,6 +8,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'imoveis_caixa.settings')
 django.setup()
 
 from propriedades.models import Propriedade
+from propriedades.versao import incrementar_versao_dados
 
 # Configuração de logging
 logging.basicConfig(
@@ -70,6 +71,9 @@ def main():
                 urls_invalidas += 1
                 continue
         
+        if urls_corrigidas:
+            incrementar_versao_dados()
+        
         # Relatório final
         logger.info("\n=== Relatório Final ===")
         logger.info(f"Total de imóveis processados: {total_imoveis}")
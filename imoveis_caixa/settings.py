@@ -138,6 +138,86 @@ DATABASES = {
     )
 }
 
+# Configuração do cache compartilhado entre os workers
+#
+# CACHE_BACKEND escolhe o backend: 'redis', 'memcached', 'database', 'file' ou
+# 'locmem'. CACHE_LOCATION define o endereço do servidor (redis://..., host:porta),
+# a tabela (database) ou o diretório (file).
+#
+# Sem servidor de cache, o padrão é 'file': todos os workers do gunicorn no mesmo
+# host compartilham o diretório, então cada chave é calculada uma vez por host em
+# vez de uma vez por worker (como acontecia com o LocMemCache implícito). O backend
+# 'database' compartilha também entre hosts; requer `python manage.py createcachetable`.
+#
+# Dimensionamento (alias 'mapa', usado pelas chaves mapa_api_*, propriedades_api_* e tile_*):
+#   - página do mapa em JSON (500 marcadores) ....... ~130 KB
+#   - página columnar / binária (500 marcadores) .... ~23 KB / ~14 KB
+#   - clusters de um zoom ........................... 1-20 KB
+#   - página de propriedades_api (10 itens) ......... ~4 KB
+#   - tile do mapa (tiles_api) ...................... 1-30 KB
+#   Com CACHE_MAPA_MAX_ENTRIES=2000 e tamanho médio de ~30 KB, o pior caso é ~60 MB.
+#   Ao atingir o limite, 1/CULL_FREQUENCY das entradas é descartada (backends file,
+#   database e locmem). No Redis/Memcached o limite é a memória do servidor: configure
+#   maxmemory-policy allkeys-lru (Redis) para descartar primeiro as chaves menos usadas.
+#   As chaves incluem a versão dos dados, então entradas de versões anteriores nunca
+#   são lidas novamente e são as primeiras a sair pelo LRU ou pelo TTL de um dia.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis' if os.environ.get('REDIS_URL') else 'file')
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION', os.environ.get('REDIS_URL', ''))
+
+CACHE_BACKENDS = {
+    'redis': 'django.core.cache.backends.redis.RedisCache',  # requer o pacote redis
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',  # requer o pacote pymemcache
+    'database': 'django.core.cache.backends.db.DatabaseCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+def _configurar_cache(alias, max_entries):
+    """Monta a configuração de um alias de cache para o backend escolhido."""
+    if CACHE_BACKEND == 'database':
+        location = f"{CACHE_LOCATION or 'cache_imoveis'}_{alias}"
+    elif CACHE_BACKEND == 'file':
+        location = os.path.join(CACHE_LOCATION or os.path.join(BASE_DIR, 'cache'), alias)
+    elif CACHE_BACKEND == 'locmem':
+        location = alias
+    else:
+        location = CACHE_LOCATION
+
+    configuracao = {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': location,
+        'KEY_PREFIX': alias,
+        'TIMEOUT': 60 * 60 * 24,
+    }
+    if CACHE_BACKEND in ('database', 'file', 'locmem'):
+        configuracao['OPTIONS'] = {
+            'MAX_ENTRIES': max_entries,
+            'CULL_FREQUENCY': 3,
+        }
+    return configuracao
+
+
+CACHES = {
+    'default': _configurar_cache('default', int(os.environ.get('CACHE_MAX_ENTRIES', 1000))),
+    'mapa': _configurar_cache('mapa', int(os.environ.get('CACHE_MAPA_MAX_ENTRIES', 2000))),
+}
+
+# Snapshot colunar em memória (NumPy) usado pelo mapa_api e propriedades_api
+# para filtrar e contar sem consultar o banco. Cada worker mantém sua cópia
+# (~100 bytes por imóvel) e a recarrega quando a versão dos dados muda.
+SNAPSHOT_COLUNAR = os.environ.get('SNAPSHOT_COLUNAR', 'True') == 'True'
+
+# Fragmentos JSON já serializados de cada imóvel (itens do mapa_api, do
+# propriedades_api e detalhes), mantidos em memória por worker até a versão
+# dos dados mudar. Os itens de lista ocupam ~0,5 KB; os de detalhes, alguns KB,
+# por isso o limite é em bytes (padrão: 64 MB por worker).
+FRAGMENTOS_MAX_BYTES = int(os.environ.get('FRAGMENTOS_MAX_BYTES', 64 * 1024 * 1024))
+
+# Consultas do mapa e da listagem fora do snapshot leem a tabela estreita
+# MarcadorMapa (reconstruída pelo importador) em vez de Propriedade
+MARCADORES_MAPA = os.environ.get('MARCADORES_MAPA', 'True') == 'True'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -24,6 +24,10 @@ django.setup()
 
 # Agora podemos importar os modelos
 from propriedades.models import Propriedade, ImagemPropriedade
+from propriedades.tiles import gerar_tiles
+from propriedades.versao import incrementar_versao_dados
+from propriedades.resumo import reconstruir_resumo_localidades
+from propriedades.marcadores import reconstruir_marcadores
 
 # Configuração do logging
 log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'importacao.log')
@@ -726,13 +730,34 @@ class ImportadorCaixa:
                         logging.error(f"Erro ao processar imóvel {codigo}: {str(e)}")
                         continue
                 
-                logging.info(f"Estado {estado} processado com sucesso")
+                # Atualizar o resumo de localidades do estado
+                try:
+                    reconstruir_resumo_localidades(estado)
+                except Exception as e:
+                    logging.error(f"Erro ao reconstruir resumo de localidades do estado {estado}: {str(e)}")
+                
+                # Atualizar o modelo de leitura do mapa (MarcadorMapa) do estado
+                try:
+                    reconstruir_marcadores(estado)
+                except Exception as e:
+                    logging.error(f"Erro ao reconstruir marcadores do mapa do estado {estado}: {str(e)}")
+                
+                # Invalidar os caches das APIs para refletir os dados do estado
+                versao = incrementar_versao_dados()
+                
+                logging.info(f"Estado {estado} processado com sucesso (versão dos dados: {versao})")
                 logging.info(f"Total de imóveis processados: {total_imoveis}")
                 logging.info(f"Total de imóveis removidos: {total_removidos}")
                 logging.info(f"Total de imóveis atualizados: {total_atualizados}")
                 logging.info(f"Total de imóveis novos: {total_novos}")
             
             logging.info("Importação concluída com sucesso")
+
+            # Pré-calcular os tiles dos zooms baixos com os dados atualizados
+            try:
+                gerar_tiles()
+            except Exception as e:
+                logging.error(f"Erro ao gerar tiles do mapa: {str(e)}")
             return {
                 'total_imoveis': total_imoveis,
                 'total_removidos': total_removidos,
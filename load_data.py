@@ -6,6 +6,9 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'imoveis_caixa.settings')
 django.setup()
 
 from propriedades.models import Propriedade
+from propriedades.versao import incrementar_versao_dados
+from propriedades.resumo import reconstruir_resumo_localidades
+from propriedades.marcadores import reconstruir_marcadores
 
 def importar_dados():
     # Limpar dados existentes
@@ -53,6 +56,9 @@ def importar_dados():
             print(f"Dados: {fields}")
             continue
     
+    reconstruir_resumo_localidades()
+    reconstruir_marcadores()
+    incrementar_versao_dados()
     print(f"Importados {len(data)} imóveis com sucesso!")
 
 if __name__ == '__main__':
@@ -1,5 +1,26 @@
 from django.contrib import admin
+from django.db import transaction
+from .marcadores import reconstruir_marcadores
 from .models import Propriedade, ImagemPropriedade
+from .resumo import reconstruir_resumo_localidades
+from .versao import incrementar_versao_dados
+
+
+def atualizar_dados_derivados(estados):
+    """
+    Depois do commit, reconstrói o resumo de localidades e os marcadores do
+    mapa dos estados alterados e incrementa a versão dos dados (que invalida
+    caches, snapshot e fragmentos), como o importador faz ao fim de cada estado.
+    """
+    estados = sorted({estado for estado in estados if estado})
+
+    def atualizar():
+        for estado in estados:
+            reconstruir_resumo_localidades(estado)
+            reconstruir_marcadores(estado)
+        incrementar_versao_dados()
+
+    transaction.on_commit(atualizar)
 
 class ImagemPropriedadeInline(admin.TabularInline):
     model = ImagemPropriedade
@@ -13,6 +34,22 @@ class PropriedadeAdmin(admin.ModelAdmin):
     inlines = [ImagemPropriedadeInline]
     readonly_fields = ['data_atualizacao']
 
+    # Alterações feitas aqui precisam refletir nas APIs como as do importador
+    def save_model(self, request, obj, form, change):
+        estado_anterior = form.initial.get('estado') if change else None
+        super().save_model(request, obj, form, change)
+        atualizar_dados_derivados([obj.estado, estado_anterior])
+
+    def delete_model(self, request, obj):
+        estado = obj.estado
+        super().delete_model(request, obj)
+        atualizar_dados_derivados([estado])
+
+    def delete_queryset(self, request, queryset):
+        estados = list(queryset.values_list('estado', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        atualizar_dados_derivados(estados)
+
 @admin.register(ImagemPropriedade)
 class ImagemPropriedadeAdmin(admin.ModelAdmin):
     list_display = ['propriedade', 'url', 'ordem']
@@ -1,6 +1,27 @@
+import importlib.util
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Pacotes de que os backends de cache dependem (ver CACHE_BACKEND no settings)
+PACOTES_CACHE = {
+    'django.core.cache.backends.redis.RedisCache': 'redis',
+    'django.core.cache.backends.memcached.PyMemcacheCache': 'pymemcache',
+}
 
 
 class PropriedadesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'propriedades'
+
+    def ready(self):
+        # Sem o pacote, o Django só falharia na primeira leitura do cache, com o
+        # servidor já no ar; aqui a falta aparece ao iniciar o gunicorn ou o manage.py
+        for alias, configuracao in settings.CACHES.items():
+            pacote = PACOTES_CACHE.get(configuracao['BACKEND'])
+            if pacote and importlib.util.find_spec(pacote) is None:
+                raise ImproperlyConfigured(
+                    f"O cache '{alias}' usa {configuracao['BACKEND']}, que requer o pacote "
+                    f"'{pacote}' (pip install {pacote}); instale-o ou defina CACHE_BACKEND=file"
+                )
@@ -0,0 +1,154 @@
+import bisect
+import logging
+import re
+import time
+
+from unidecode import unidecode
+
+from .models import ResumoLocalidade
+from .versao import MemoPorVersao
+
+logger = logging.getLogger(__name__)
+
+# Similaridade mínima (Jaccard de trigramas) para sugestões aproximadas
+SIMILARIDADE_MINIMA = 0.3
+
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 50
+
+
+def normalizar(texto):
+    """
+    Normaliza o texto como ValidadorGeografico._normalizar_texto (sem acentos,
+    maiúsculo, sem caracteres especiais), com os espaços colapsados.
+    """
+    if not texto:
+        return ''
+    texto = unidecode(texto.upper())
+    texto = re.sub(r'[^A-Z0-9\s]', '', texto)
+    return ' '.join(texto.split())
+
+
+def trigramas(texto):
+    """Retorna os trigramas do texto normalizado, com bordas marcadas por espaço."""
+    texto = f'  {texto} '
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceLocalidades:
+    """
+    Índice em memória de cidades e bairros para o autocompletar.
+
+    Cada localidade é encontrada por prefixo de qualquer palavra do nome
+    (busca binária em uma lista ordenada) e, para erros de digitação, por
+    similaridade de trigramas (listas invertidas trigrama → localidades).
+    """
+
+    def __init__(self, localidades, versao):
+        self.versao = versao
+        self.localidades = localidades
+        self.normalizados = [normalizar(l['bairro'] or l['cidade']) for l in localidades]
+        self.trigramas = [trigramas(nome) for nome in self.normalizados]
+
+        # Prefixos: (sufixo do nome a partir de cada palavra, índice da localidade)
+        prefixos = []
+        for i, nome in enumerate(self.normalizados):
+            palavras = nome.split()
+            for j in range(len(palavras)):
+                prefixos.append((' '.join(palavras[j:]), i))
+        prefixos.sort()
+        self.prefixos = prefixos
+        self.chaves_prefixos = [chave for chave, _ in prefixos]
+
+        self.invertido = {}
+        for i, grupo in enumerate(self.trigramas):
+            for trigrama in grupo:
+                self.invertido.setdefault(trigrama, []).append(i)
+
+    @classmethod
+    def carregar(cls, versao):
+        inicio = time.time()
+        totais = {}
+        for estado, cidade, bairro, total in ResumoLocalidade.objects.filter(
+            total_com_coordenadas__gt=0
+        ).values_list('estado', 'cidade', 'bairro', 'total_com_coordenadas'):
+            totais[(estado, cidade, None)] = totais.get((estado, cidade, None), 0) + total
+            if bairro:
+                totais[(estado, cidade, bairro)] = totais.get((estado, cidade, bairro), 0) + total
+
+        localidades = [
+            {
+                'tipo': 'bairro' if bairro else 'cidade',
+                'estado': estado,
+                'cidade': cidade,
+                'bairro': bairro,
+                'count': total,
+            }
+            for (estado, cidade, bairro), total in sorted(totais.items(), key=lambda item: [v or '' for v in item[0]])
+        ]
+        indice = cls(localidades, versao)
+        logger.info(f"Índice de autocompletar carregado: {len(localidades)} localidades em {time.time() - inicio:.2f}s (versão {versao})")
+        return indice
+
+    def _por_prefixo(self, consulta):
+        inicio = bisect.bisect_left(self.chaves_prefixos, consulta)
+        encontrados = set()
+        for chave, i in self.prefixos[inicio:]:
+            if not chave.startswith(consulta):
+                break
+            encontrados.add(i)
+        return encontrados
+
+    def _por_similaridade(self, consulta):
+        grupo = trigramas(consulta)
+        comuns = {}
+        for trigrama in grupo:
+            for i in self.invertido.get(trigrama, ()):
+                comuns[i] = comuns.get(i, 0) + 1
+        similares = {}
+        for i, quantidade in comuns.items():
+            similaridade = quantidade / (len(grupo) + len(self.trigramas[i]) - quantidade)
+            if similaridade >= SIMILARIDADE_MINIMA:
+                similares[i] = similaridade
+        return similares
+
+    def sugerir(self, texto, estado=None, tipo=None, limite=LIMITE_PADRAO):
+        """
+        Retorna as localidades que começam com o texto (em qualquer palavra)
+        ou que se parecem com ele, das mais relevantes para as menos.
+        """
+        consulta = normalizar(texto)
+        if not consulta:
+            return []
+
+        prefixo = self._por_prefixo(consulta)
+        similares = self._por_similaridade(consulta) if len(consulta) >= 3 else {}
+
+        candidatos = []
+        for i in prefixo | similares.keys():
+            localidade = self.localidades[i]
+            if estado and localidade['estado'] != estado:
+                continue
+            if tipo and localidade['tipo'] != tipo:
+                continue
+            # Prefixo do nome inteiro > prefixo de uma palavra > apenas similar; entre
+            # os prefixos vale a quantidade de imóveis e entre os similares, a similaridade
+            if self.normalizados[i].startswith(consulta):
+                grupo = 0
+            elif i in prefixo:
+                grupo = 1
+            else:
+                grupo = 2
+            similaridade = similares[i] if grupo == 2 else 0
+            candidatos.append((grupo, -similaridade, -localidade['count'], i))
+
+        candidatos.sort()
+        return [self.localidades[i] for *_, i in candidatos[:limite]]
+
+
+_memo = MemoPorVersao(IndiceLocalidades.carregar)
+
+
+def obter_indice():
+    """Retorna o índice do worker, reconstruindo-o quando a versão dos dados muda."""
+    return _memo.obter()
@@ -0,0 +1,78 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from unidecode import unidecode
+
+# Campos do imóvel que compõem o texto pesquisável
+CAMPOS_BUSCA = ['endereco', 'bairro', 'cidade', 'descricao', 'analise_matricula']
+
+# Tabela FTS5 usada no SQLite (desenvolvimento); ver migração 0015
+TABELA_FTS_SQLITE = 'propriedades_busca'
+
+TABELA_PROPRIEDADE = 'propriedades_propriedade'
+
+# Limite de termos por consulta, para evitar consultas patológicas
+MAXIMO_TERMOS = 10
+
+
+def normalizar_texto(texto):
+    """Remove acentos e pontuação e converte para minúsculas."""
+    if not texto:
+        return ''
+    texto = unidecode(texto).lower()
+    return re.sub(r'[^a-z0-9]+', ' ', texto).strip()
+
+
+def texto_busca(propriedade):
+    """Monta o texto pesquisável (sem acentos) a partir dos campos do imóvel."""
+    partes = (getattr(propriedade, campo) for campo in CAMPOS_BUSCA)
+    return ' '.join(normalizar_texto(parte) for parte in partes if parte)
+
+
+def termos_busca(q):
+    """Divide a consulta normalizada em termos (no máximo MAXIMO_TERMOS)."""
+    return normalizar_texto(q).split()[:MAXIMO_TERMOS]
+
+
+def buscar(queryset, q):
+    """
+    Restringe o queryset aos imóveis cujo texto contém todos os termos da
+    consulta e anota a relevância (maior é melhor) em `relevancia`.
+
+    No PostgreSQL usa o índice GIN sobre to_tsvector('portuguese', texto_busca),
+    com radicalização em português; no SQLite usa a tabela FTS5 com busca por
+    prefixo dos termos. Em ambos, acentos são ignorados porque texto_busca e
+    a consulta são normalizados da mesma forma.
+    """
+    termos = termos_busca(q)
+    if not termos:
+        return queryset.none()
+
+    if connection.vendor == 'postgresql':
+        consulta = ' & '.join(termos)
+        # Mesma expressão do índice GIN (migração 0015), para que ele seja usado
+        vetor = f"to_tsvector('portuguese', {TABELA_PROPRIEDADE}.texto_busca)"
+        return queryset.filter(RawSQL(
+            f"{vetor} @@ to_tsquery('portuguese', %s)", (consulta,), output_field=BooleanField()
+        )).annotate(relevancia=RawSQL(
+            f"ts_rank({vetor}, to_tsquery('portuguese', %s))", (consulta,)
+        ))
+
+    if connection.vendor == 'sqlite':
+        consulta = ' '.join(f'"{termo}"*' for termo in termos)
+        return queryset.filter(RawSQL(
+            f"{TABELA_PROPRIEDADE}.id IN (SELECT rowid FROM {TABELA_FTS_SQLITE} WHERE {TABELA_FTS_SQLITE} MATCH %s)",
+            (consulta,), output_field=BooleanField()
+        )).annotate(relevancia=RawSQL(
+            # bm25 retorna valores menores para os mais relevantes
+            f"(SELECT -bm25({TABELA_FTS_SQLITE}) FROM {TABELA_FTS_SQLITE} "
+            f"WHERE {TABELA_FTS_SQLITE} MATCH %s AND rowid = {TABELA_PROPRIEDADE}.id)",
+            (consulta,)
+        ))
+
+    # Outros bancos: busca sequencial, sem ranking
+    for termo in termos:
+        queryset = queryset.filter(texto_busca__contains=termo)
+    return queryset.annotate(relevancia=RawSQL('0', ()))
@@ -0,0 +1,171 @@
+import math
+import os
+import random
+import threading
+import time
+import zlib
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # fora de sistemas POSIX a trava usa apenas o cache.add()
+    fcntl = None
+
+from .versao import TIMEOUT_CACHE_VERSIONADO, chave_versao_anterior
+
+# Tempo máximo (segundos) que um recálculo pode segurar a trava
+TIMEOUT_TRAVA = 30
+
+# O add() do FileBasedCache não é atômico (has_key seguido de set), então nesse
+# backend a trava é um flock em um de FAIXAS_TRAVA arquivos no diretório do cache
+FAIXAS_TRAVA = 256
+
+# Faixas travadas pela thread atual: um cálculo aninhado (como em
+# resposta_cache) que caia na mesma faixa não espera pela própria trava
+_faixas_travadas = threading.local()
+
+# Marca, por thread, que a requisição atual recebeu um valor da versão anterior dos dados
+_versao_anterior = threading.local()
+
+# Espera máxima (segundos) por um recálculo em andamento quando não há valor antigo
+ESPERA_MAXIMA = 3
+INTERVALO_ESPERA = 0.05
+
+# Por quanto tempo (segundos) um valor vencido ainda pode ser servido enquanto é recalculado
+JANELA_VENCIDO = 60 * 10
+
+# Agressividade da renovação antecipada (1.0 é o valor sugerido pelo algoritmo XFetch)
+BETA_RENOVACAO = 1.0
+
+
+def limpar_marca_versao_anterior():
+    """Começa a acompanhar, para a requisição atual, se algum valor veio da versão anterior."""
+    _versao_anterior.servido = False
+
+
+def serviu_versao_anterior():
+    """Indica se obter_ou_calcular serviu um valor da versão anterior desde limpar_marca_versao_anterior()."""
+    return getattr(_versao_anterior, 'servido', False)
+
+
+def _deve_renovar(envelope):
+    """
+    Renovação antecipada probabilística (XFetch): quanto mais perto do fim da
+    validade e mais caro o cálculo, maior a chance de uma requisição renovar
+    o valor antes que ele vença para todos ao mesmo tempo.
+    """
+    sorteio = random.random() or 1e-12
+    antecipacao = envelope['custo'] * BETA_RENOVACAO * -math.log(sorteio)
+    return time.time() + antecipacao >= envelope['valido_ate']
+
+
+def _calcular_e_gravar(backend, chave, calcular, timeout):
+    servido_antes = serviu_versao_anterior()
+    _versao_anterior.servido = False
+    inicio = time.time()
+    try:
+        valor = calcular()
+    finally:
+        derivado_da_anterior = serviu_versao_anterior()
+        _versao_anterior.servido = servido_antes or derivado_da_anterior
+    if derivado_da_anterior:
+        # Montado sobre um valor da versão anterior (como a compressão em
+        # resposta_cache): serve esta requisição, mas não fica na chave atual
+        return valor
+    custo = time.time() - inicio
+    backend.set(chave, {
+        'valor': valor,
+        'valido_ate': time.time() + timeout,
+        'custo': custo,
+    }, timeout + JANELA_VENCIDO)
+    return valor
+
+
+def _adquirir_trava(backend, chave):
+    """
+    Tenta adquirir, sem esperar, a trava de recálculo da chave. Retorna a
+    função que a libera, ou None se outra requisição já a detém.
+    """
+    if fcntl is not None and isinstance(backend, FileBasedCache):
+        os.makedirs(backend._dir, exist_ok=True)
+        caminho = os.path.join(backend._dir, f'trava-{zlib.crc32(chave.encode("utf-8")) % FAIXAS_TRAVA}.lock')
+        travadas = _faixas_travadas.__dict__.setdefault('caminhos', set())
+        if caminho in travadas:
+            return lambda: None
+        arquivo = open(caminho, 'a')
+        try:
+            fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            arquivo.close()
+            return None
+        travadas.add(caminho)
+
+        def liberar():
+            travadas.discard(caminho)
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+            arquivo.close()
+        return liberar
+
+    # Redis, Memcached e banco de dados têm add() atômico
+    chave_trava = f'{chave}:trava'
+    if backend.add(chave_trava, 1, TIMEOUT_TRAVA):
+        return lambda: backend.delete(chave_trava)
+    return None
+
+
+def _calcular_com_trava(backend, chave, calcular, timeout, liberar):
+    try:
+        return _calcular_e_gravar(backend, chave, calcular, timeout)
+    finally:
+        liberar()
+
+
+def obter_ou_calcular(chave, calcular, timeout=TIMEOUT_CACHE_VERSIONADO, cache_alias='default'):
+    """
+    Retorna o valor em cache para a chave ou o calcula com `calcular()`.
+
+    Apenas uma requisição por vez recalcula cada chave (single-flight, com uma
+    trava curta no próprio cache ou, no backend de arquivos, um flock). Enquanto isso as demais recebem o valor
+    antigo, se houver, ou aguardam o recálculo terminar. Logo após uma nova
+    versão dos dados o valor antigo é o da mesma chave na versão anterior
+    (ver serviu_versao_anterior). Perto do fim da validade o valor é renovado
+    antecipadamente por uma única requisição.
+    Exceções de `calcular()` são propagadas e não são gravadas em cache.
+    """
+    backend = caches[cache_alias]
+    envelope = backend.get(chave)
+
+    if envelope is not None and not _deve_renovar(envelope):
+        return envelope['valor']
+
+    liberar = _adquirir_trava(backend, chave)
+    if liberar:
+        return _calcular_com_trava(backend, chave, calcular, timeout, liberar)
+
+    # Outra requisição já está recalculando: servir o valor antigo, se houver
+    if envelope is not None:
+        return envelope['valor']
+
+    # Primeiro cálculo da chave depois de uma nova versão dos dados: servir o
+    # valor da versão anterior em vez de esperar
+    chave_anterior = chave_versao_anterior(chave)
+    envelope = backend.get(chave_anterior) if chave_anterior else None
+    if envelope is not None:
+        _versao_anterior.servido = True
+        return envelope['valor']
+
+    # Sem valor antigo: aguardar o recálculo em andamento por um tempo limitado
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        envelope = backend.get(chave)
+        if envelope is not None:
+            return envelope['valor']
+        # O recálculo terminou sem gravar (erro) ou a trava expirou: assumir o recálculo
+        liberar = _adquirir_trava(backend, chave)
+        if liberar:
+            return _calcular_com_trava(backend, chave, calcular, timeout, liberar)
+
+    return _calcular_e_gravar(backend, chave, calcular, timeout)
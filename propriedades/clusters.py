@@ -0,0 +1,167 @@
+import math
+from decimal import Decimal
+
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Max, Min, Sum, Value
+from django.db.models.functions import Floor, Round
+
+from .formatos import ESCALA_COORDENADA, campo_escalado, desescalar
+
+# Zoom a partir do qual o mapa passa a receber marcadores individuais
+ZOOM_MARCADORES_INDIVIDUAIS = 14
+
+# Quantidade de células da grade por tile (em cada eixo) no zoom atual
+CELULAS_POR_TILE = 4
+
+# Máximo de clusters na resposta: enquanto houver mais células ocupadas, as
+# células são juntadas de 2x2 em 2x2 (zoom menor), para que a resposta tenha
+# poucos KB independentemente de quantos imóveis forem encontrados
+MAXIMO_CLUSTERS = 256
+
+# Máximo de células da grade na área do primeiro agrupamento (a do filtro ou,
+# sem filtro de região, a ocupada pelos imóveis), que limita o trabalho dele
+MAXIMO_CELULAS = 4096
+
+
+def tamanho_celula(zoom):
+    """Retorna o tamanho (em graus) da célula da grade para o zoom informado."""
+    zoom = max(0, min(int(zoom), ZOOM_MARCADORES_INDIVIDUAIS))
+    return Decimal(360) / (2 ** zoom) / CELULAS_POR_TILE
+
+
+# As células são calculadas sobre as coordenadas em micrograus inteiros, deslocadas
+# para ficarem positivas, com a mesma conta no snapshot, no banco e nos tiles
+VOLTA_E6 = 360 * ESCALA_COORDENADA
+DESLOCAMENTO_E6 = 180 * ESCALA_COORDENADA
+
+
+def indice_celula(coordenada_e6, zoom):
+    """
+    Índice da célula da grade do zoom que contém a coordenada (em micrograus
+    inteiros). Aceita um int ou um array NumPy de inteiros.
+    """
+    return (coordenada_e6 + DESLOCAMENTO_E6) * (2 ** zoom * CELULAS_POR_TILE) // VOLTA_E6
+
+
+def _expressao_celula(campo, escala, zoom):
+    """indice_celula como expressão do banco (escala é a do campo, ver campo_escalado)."""
+    coordenada = F(campo)
+    if escala != ESCALA_COORDENADA:
+        coordenada = Round(coordenada * (ESCALA_COORDENADA // escala))
+    # Numerador inteiro exato (< 2**53) dividido em ponto flutuante: o Floor coincide com o //
+    return Floor(ExpressionWrapper(
+        (coordenada + DESLOCAMENTO_E6) * (2 ** zoom * CELULAS_POR_TILE) / Value(float(VOLTA_E6)),
+        output_field=FloatField()
+    ))
+
+
+def formatar_valor(valor):
+    """Valor mínimo do cluster sempre com duas casas, em todos os caminhos."""
+    return f'{valor:.2f}' if valor is not None else None
+
+
+def zoom_agrupamento(zoom, caixa):
+    """
+    Retorna o zoom cuja grade cobre a caixa (min_lon, min_lat, max_lon, max_lat)
+    com no máximo MAXIMO_CELULAS células: o próprio zoom, se couber, ou o maior
+    zoom menor que caiba.
+    """
+    min_lon, min_lat, max_lon, max_lat = caixa
+    zoom = max(0, min(int(zoom), ZOOM_MARCADORES_INDIVIDUAIS))
+    while zoom > 0:
+        celula = float(tamanho_celula(zoom))
+        colunas = math.floor(max_lon / celula) - math.floor(min_lon / celula) + 1
+        linhas = math.floor(max_lat / celula) - math.floor(min_lat / celula) + 1
+        if colunas * linhas <= MAXIMO_CELULAS:
+            break
+        zoom -= 1
+    return zoom
+
+
+def montar_clusters(celulas, zoom):
+    """
+    Recebe as células ocupadas da grade do zoom, {(índice lat, índice lon):
+    (total, soma das latitudes, soma das longitudes, valor mínimo)}, com as
+    somas em micrograus inteiros (exatas em todos os caminhos), junta-as
+    até restarem no máximo MAXIMO_CLUSTERS e retorna (clusters, zoom da grade).
+
+    As grades são aninhadas (a célula do zoom - 1 é o índice dividido por 2),
+    então o resultado não depende do zoom em que o agrupamento começou.
+    """
+    while len(celulas) > MAXIMO_CLUSTERS and zoom > 0:
+        juntas = {}
+        for (linha, coluna), (total, soma_lat, soma_lon, valor_min) in celulas.items():
+            chave = (linha // 2, coluna // 2)
+            grupo = juntas.get(chave)
+            if grupo is None:
+                juntas[chave] = (total, soma_lat, soma_lon, valor_min)
+            else:
+                juntas[chave] = (
+                    grupo[0] + total,
+                    grupo[1] + soma_lat,
+                    grupo[2] + soma_lon,
+                    valor_min if grupo[3] is None or (valor_min is not None and valor_min < grupo[3]) else grupo[3],
+                )
+        celulas, zoom = juntas, zoom - 1
+
+    clusters = [
+        {
+            'latitude': round(soma_lat / total / ESCALA_COORDENADA, 6),
+            'longitude': round(soma_lon / total / ESCALA_COORDENADA, 6),
+            'count': total,
+            'valor_min': formatar_valor(valor_min),
+        }
+        for _, (total, soma_lat, soma_lon, valor_min) in sorted(celulas.items())
+    ]
+    return clusters, zoom
+
+
+def agrupar_em_clusters(queryset, zoom, caixa=None):
+    """
+    Agrupa os imóveis do queryset em células de uma grade regular e retorna
+    (clusters, zoom da grade); ver montar_clusters.
+
+    O agrupamento é feito no banco em uma única consulta agregada, na grade
+    que cobre a caixa (ou, sem caixa, a área ocupada pelos imóveis) com no
+    máximo MAXIMO_CELULAS células, então o tamanho da resposta não depende
+    do número de imóveis encontrados.
+    """
+    # No MarcadorMapa as coordenadas e o valor são inteiros escalados
+    latitude, escala_coordenada = campo_escalado(queryset.model, 'latitude')
+    longitude, _ = campo_escalado(queryset.model, 'longitude')
+    valor, escala_valor = campo_escalado(queryset.model, 'valor')
+
+    queryset = queryset.order_by()
+    if caixa is None:
+        extensao = queryset.aggregate(
+            min_lat=Min(latitude), max_lat=Max(latitude), min_lon=Min(longitude), max_lon=Max(longitude)
+        )
+        if extensao['min_lat'] is None:
+            return [], zoom
+        caixa = tuple(
+            float(extensao[chave]) / escala_coordenada
+            for chave in ('min_lon', 'min_lat', 'max_lon', 'max_lat')
+        )
+    zoom = zoom_agrupamento(zoom, caixa)
+
+    grupos = queryset.annotate(
+        celula_lat=_expressao_celula(latitude, escala_coordenada, zoom),
+        celula_lon=_expressao_celula(longitude, escala_coordenada, zoom),
+    ).values('celula_lat', 'celula_lon').annotate(
+        total=Count('pk'),
+        valor_min=Min(valor),
+        soma_lat=Sum(latitude),
+        soma_lon=Sum(longitude),
+    )
+
+    # Em Propriedade a soma vem em graus (float no SQLite): o arredondamento
+    # para micrograus recupera a soma exata das coordenadas de 6 casas
+    para_e6 = ESCALA_COORDENADA // escala_coordenada
+    celulas = {}
+    for grupo in grupos:
+        celulas[(int(grupo['celula_lat']), int(grupo['celula_lon']))] = (
+            grupo['total'],
+            round(float(grupo['soma_lat']) * para_e6),
+            round(float(grupo['soma_lon']) * para_e6),
+            desescalar(grupo['valor_min'], escala_valor),
+        )
+    return montar_clusters(celulas, zoom)
@@ -0,0 +1,101 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .cache_utils import limpar_marca_versao_anterior, serviu_versao_anterior
+from .models import Propriedade
+from .resposta_cache import escolher_codificacao
+from .versao import data_versao, versao_dados
+
+
+def _hash_representacao(request):
+    """
+    Hash da URL completa, do Accept (que escolhe entre JSON e binário no
+    mapa_api) e da codificação negociada (cada Content-Encoding tem bytes,
+    e portanto ETag, próprios).
+    """
+    representacao = (
+        f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}|{escolher_codificacao(request)}"
+    )
+    return hashlib.sha1(representacao.encode('utf-8')).hexdigest()[:16]
+
+
+def etag_versao(request, *args, **kwargs):
+    """ETag das APIs de leitura: versão dos dados mais o hash da representação."""
+    return f"v{versao_dados()}-{_hash_representacao(request)}"
+
+
+def ultima_modificacao(request, *args, **kwargs):
+    """Last-Modified das APIs de leitura: quando a versão atual dos dados foi criada."""
+    return data_versao()
+
+
+def data_imovel(request, codigo):
+    """
+    data_atualizacao do imóvel (None se não existir), lida uma vez por
+    requisição e compartilhada entre o ETag, o Last-Modified e a view.
+    """
+    if not hasattr(request, '_data_imovel'):
+        request._data_imovel = Propriedade.objects.filter(codigo=codigo).values_list(
+            'data_atualizacao', flat=True
+        ).first()
+    return request._data_imovel
+
+
+def etag_imovel(request, codigo, *args, **kwargs):
+    """ETag das APIs de um imóvel: data de atualização da linha mais o hash da representação."""
+    atualizado_em = data_imovel(request, codigo)
+    if atualizado_em is None:
+        return None
+    return f"i{atualizado_em.timestamp():.6f}-{_hash_representacao(request)}"
+
+
+def ultima_modificacao_imovel(request, codigo, *args, **kwargs):
+    """Last-Modified das APIs de um imóvel: data_atualizacao da própria linha."""
+    return data_imovel(request, codigo)
+
+
+def _condicional(view, etag_func, last_modified_func):
+    view_condicional = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+    # Os cabeçalhos são aplicados fora do condition(), para valerem também no 304
+    # (que é devolvido sem executar a view)
+    @wraps(view)
+    def view_com_cabecalhos(request, *args, **kwargs):
+        limpar_marca_versao_anterior()
+        response = view_condicional(request, *args, **kwargs)
+        if serviu_versao_anterior():
+            # Conteúdo da versão anterior (servido enquanto o da atual é calculado):
+            # não pode ser guardado com o ETag e a data da versão atual
+            response.headers.pop('ETag', None)
+            response.headers.pop('Last-Modified', None)
+            patch_cache_control(response, no_store=True)
+        if not response.has_header('Cache-Control'):
+            patch_cache_control(response, public=True, no_cache=True)
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return response
+    return view_com_cabecalhos
+
+
+def leitura_condicional(view):
+    """
+    Decorator para APIs de leitura que só dependem dos dados importados.
+
+    Acrescenta ETag e Last-Modified derivados da versão dos dados e responde
+    304 a If-None-Match/If-Modified-Since antes de executar a view (a versão
+    é lida da memória do worker, então a revalidação não consulta o banco).
+    A resposta pode ser guardada por navegadores e CDN, mas deve ser revalidada.
+    """
+    return _condicional(view, etag_versao, ultima_modificacao)
+
+
+def leitura_condicional_imovel(view):
+    """
+    Como leitura_condicional, para APIs de um único imóvel (recebem `codigo`):
+    ETag e Last-Modified vêm da data_atualizacao da linha, de forma que a
+    alteração de outros imóveis (ou uma nova importação que não mexa neste)
+    não invalida o que o cliente já tem.
+    """
+    return _condicional(view, etag_imovel, ultima_modificacao_imovel)
@@ -0,0 +1,76 @@
+import csv
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Colunas exportadas, na ordem do CSV (as mesmas do propriedades_api)
+CAMPOS_EXPORTACAO = [
+    'codigo', 'tipo_imovel', 'estado', 'cidade', 'bairro', 'endereco',
+    'valor', 'valor_avaliacao', 'desconto', 'valor_m2', 'area', 'area_privativa',
+    'quartos', 'modalidade_venda', 'latitude', 'longitude', 'imagem_url',
+]
+
+# Linhas lidas do cursor do servidor por vez, e linhas por pedaço da resposta
+TAMANHO_LOTE = 2000
+LINHAS_POR_PEDACO = 500
+
+FORMATOS_EXPORTACAO = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _em_pedacos(linhas):
+    """
+    Agrupa as linhas serializadas em pedaços, evitando um write por linha.
+    A primeira linha sai sozinha, para o cliente receber o primeiro byte logo.
+    """
+    linhas = iter(linhas)
+    for linha in linhas:
+        yield linha
+        break
+    pedaco = []
+    for linha in linhas:
+        pedaco.append(linha)
+        if len(pedaco) >= LINHAS_POR_PEDACO:
+            yield ''.join(pedaco)
+            pedaco = []
+    if pedaco:
+        yield ''.join(pedaco)
+
+
+def linhas_ndjson(valores):
+    """Gera um objeto JSON por linha (decimais como string, como no propriedades_api)."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield from _em_pedacos(
+        encoder.encode(item) + '\n'
+        for item in valores.iterator(chunk_size=TAMANHO_LOTE)
+    )
+
+
+def linhas_csv(valores, campos):
+    """
+    Gera o CSV: o cabeçalho sai antes da consulta ao banco, para o primeiro
+    byte chegar imediatamente; depois, as linhas lidas do cursor em lotes.
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    def escrever(linha):
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerow(linha)
+        return buffer.getvalue()
+
+    yield escrever(campos)
+    yield from _em_pedacos(
+        escrever(['' if valor is None else valor for valor in linha])
+        for linha in valores.values_list(*campos).iterator(chunk_size=TAMANHO_LOTE)
+    )
+
+
+def gerar_exportacao(queryset, campos, formato):
+    """Retorna o gerador com o conteúdo da exportação no formato pedido (ndjson ou csv)."""
+    if formato == 'csv':
+        return linhas_csv(queryset, campos)
+    return linhas_ndjson(queryset.values(*campos))
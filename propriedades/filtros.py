@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import math
+from decimal import Decimal, DecimalException
+
+from .busca import buscar, normalizar_texto
+from .geo import RAIO_MAXIMO_KM, caixa_do_raio, condicao_poligono, expressao_distancia_km
+from .models import Propriedade
+
+logger = logging.getLogger(__name__)
+
+# Filtros de lista (valores separados por vírgula) e o campo correspondente
+FILTROS_LISTA = {
+    'estado': 'estado__in',
+    'cidade': 'cidade__in',
+    'bairro': 'bairro__in',
+    'tipo_imovel': 'tipo_imovel__in',
+}
+
+# Filtros numéricos e o lookup correspondente
+FILTROS_NUMERICOS = {
+    'valor_min': 'valor__gte',
+    'valor_max': 'valor__lte',
+    'desconto_min': 'desconto__gte',
+}
+
+
+def _limite_campo(lookup):
+    """Maior valor absoluto que cabe no DecimalField do lookup (max_digits - decimal_places dígitos inteiros)."""
+    campo = Propriedade._meta.get_field(lookup.split('__')[0])
+    return Decimal(10) ** (campo.max_digits - campo.decimal_places)
+
+
+def _decimal(texto, limite=None):
+    """
+    Converte o texto em Decimal normalizado; retorna None se inválido ou se
+    o valor absoluto não for menor que `limite`.
+    """
+    try:
+        valor = Decimal(texto.strip())
+        if not valor.is_finite() or (limite is not None and abs(valor) >= limite):
+            return None
+        # normalize() remove zeros à direita: '100.00' e '1E+2' viram a mesma chave
+        return valor.normalize()
+    except (DecimalException, AttributeError):
+        return None
+
+
+def _texto_decimal(valor):
+    return format(valor, 'f')
+
+
+class FiltroPropriedades:
+    """
+    Representação canônica dos filtros aceitos pelas APIs de imóveis.
+
+    Os valores são normalizados na leitura (listas ordenadas e sem
+    duplicatas, números em forma canônica), de forma que requisições
+    equivalentes, independentemente da ordem dos parâmetros, produzam a
+    mesma chave de cache.
+    """
+
+    def __init__(self):
+        self.listas = {}
+        self.numeros = {}
+        self.quartos_min = None
+        self.codigo = None
+        self.bbox = None
+        self.texto = None
+        self.raio = None
+        # Geometria do shapely (ver geo.ler_poligono); informada no corpo do POST, não na URL
+        self.poligono = None
+
+    @classmethod
+    def de_request(cls, params):
+        """Cria o filtro a partir de um QueryDict (request.GET)."""
+        filtro = cls()
+
+        for nome in FILTROS_LISTA:
+            if texto := params.get(nome):
+                valores = sorted({v.strip() for v in texto.split(',') if v.strip()})
+                if valores:
+                    filtro.listas[nome] = valores
+
+        for nome, lookup in FILTROS_NUMERICOS.items():
+            if texto := params.get(nome):
+                valor = _decimal(texto, _limite_campo(lookup))
+                if valor is None:
+                    logger.debug(f"Valor inválido para {nome}: {texto}")
+                    continue
+                filtro.numeros[nome] = valor
+
+        if texto := params.get('quartos'):
+            # quartos=2,3 significa "pelo menos 2 ou pelo menos 3", ou seja, pelo menos 2
+            valores = [int(v) for v in texto.split(',') if v.strip().isdigit()]
+            if valores:
+                filtro.quartos_min = min(valores)
+
+        if codigo := params.get('codigo'):
+            filtro.codigo = codigo.strip()
+
+        if texto := params.get('bbox'):
+            try:
+                min_lon, min_lat, max_lon, max_lat = [float(v) for v in texto.split(',')]
+                if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+                    raise ValueError
+                # Limitar aos intervalos válidos de longitude e latitude
+                min_lon, max_lon = [min(max(v, -180.0), 180.0) for v in (min_lon, max_lon)]
+                min_lat, max_lat = [min(max(v, -90.0), 90.0) for v in (min_lat, max_lat)]
+                filtro.bbox = (
+                    round(min(min_lon, max_lon), 6),
+                    round(min(min_lat, max_lat), 6),
+                    round(max(min_lon, max_lon), 6),
+                    round(max(min_lat, max_lat), 6),
+                )
+            except (ValueError, TypeError):
+                logger.debug(f"Valor inválido para bbox: {texto}")
+
+        # Busca por proximidade: lat, lon e raio_km (limitado a RAIO_MAXIMO_KM)
+        if params.get('lat') and params.get('lon') and params.get('raio_km'):
+            try:
+                lat, lon, raio_km = float(params['lat']), float(params['lon']), float(params['raio_km'])
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180 and raio_km > 0):
+                    raise ValueError
+                filtro.raio = (round(lat, 6), round(lon, 6), round(min(raio_km, float(RAIO_MAXIMO_KM)), 3))
+            except ValueError:
+                logger.debug(f"Valores inválidos para busca por raio: {params.get('lat')}, {params.get('lon')}, {params.get('raio_km')}")
+
+        # Busca textual: guardada já normalizada, para que 'Edícula' e 'edicula' compartilhem a chave
+        if texto := normalizar_texto(params.get('q')):
+            filtro.texto = texto
+
+        return filtro
+
+    def tem_filtros(self):
+        """Indica se algum filtro que restringe a região ou o perfil foi informado."""
+        return bool(
+            self.listas or self.bbox or self.texto or self.raio or self.poligono is not None
+            or 'valor_max' in self.numeros or 'desconto_min' in self.numeros
+        )
+
+    def aplicar(self, queryset):
+        """Aplica os filtros ao queryset de Propriedade."""
+        for nome, valores in self.listas.items():
+            queryset = queryset.filter(**{FILTROS_LISTA[nome]: valores})
+
+        for nome, valor in self.numeros.items():
+            queryset = queryset.filter(**{FILTROS_NUMERICOS[nome]: valor})
+
+        if self.quartos_min is not None:
+            queryset = queryset.filter(quartos__gte=self.quartos_min)
+
+        if self.codigo:
+            queryset = queryset.filter(codigo=self.codigo)
+
+        if self.bbox:
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            queryset = queryset.filter(
+                latitude__gte=min_lat,
+                latitude__lte=max_lat,
+                longitude__gte=min_lon,
+                longitude__lte=max_lon
+            )
+
+        if self.raio:
+            # Pré-filtro pelo retângulo (índices de lat/lon) e refinamento pela distância real
+            lat, lon, raio_km = self.raio
+            min_lon, min_lat, max_lon, max_lat = caixa_do_raio(lat, lon, raio_km)
+            queryset = queryset.filter(
+                latitude__gte=min_lat,
+                latitude__lte=max_lat,
+                longitude__gte=min_lon,
+                longitude__lte=max_lon
+            ).annotate(
+                distancia_km=expressao_distancia_km(lat, lon)
+            ).filter(distancia_km__lte=raio_km)
+
+        if self.poligono is not None:
+            # Pré-filtro pelo retângulo do polígono e teste vetorizado dos candidatos,
+            # que voltam para a consulta como faixas de latitude/longitude
+            min_lon, min_lat, max_lon, max_lat = self.poligono.bounds
+            queryset = queryset.filter(
+                latitude__gte=min_lat,
+                latitude__lte=max_lat,
+                longitude__gte=min_lon,
+                longitude__lte=max_lon
+            )
+            candidatos = list(queryset.order_by().values_list('latitude', 'longitude'))
+            queryset = queryset.filter(condicao_poligono(self.poligono, candidatos))
+
+        if self.texto:
+            queryset = buscar(queryset, self.texto)
+
+        return queryset
+
+    def parametros(self):
+        """Retorna os filtros como pares (nome, valor) ordenados por nome."""
+        pares = [(nome, ','.join(valores)) for nome, valores in self.listas.items()]
+        pares += [(nome, _texto_decimal(valor)) for nome, valor in self.numeros.items()]
+        if self.quartos_min is not None:
+            pares.append(('quartos', str(self.quartos_min)))
+        if self.codigo:
+            pares.append(('codigo', self.codigo))
+        if self.bbox:
+            pares.append(('bbox', ','.join(f'{v:.6f}' for v in self.bbox)))
+        if self.texto:
+            pares.append(('q', self.texto))
+        if self.raio:
+            pares.append(('raio', ','.join(str(v) for v in self.raio)))
+        if self.poligono is not None:
+            pares.append(('poligono', hashlib.sha1(self.poligono.wkb).hexdigest()))
+        return sorted(pares)
+
+    def chave(self, prefixo, **extras):
+        """
+        Gera a chave de cache para os filtros, acrescida de parâmetros extras
+        (paginação, formato, etc.). Extras com valor None são ignorados.
+        """
+        pares = self.parametros()
+        pares += sorted((nome, str(valor)) for nome, valor in extras.items() if valor is not None)
+        texto = '&'.join(f'{nome}={valor}' for nome, valor in pares)
+        return f"{prefixo}_{hashlib.sha1(texto.encode('utf-8')).hexdigest()}"
@@ -0,0 +1,98 @@
+import struct
+import sys
+from array import array
+from decimal import Decimal
+
+# Escalas de quantização dos campos numéricos
+ESCALA_COORDENADA = 1_000_000  # micrograus
+ESCALA_VALOR = 100             # centavos
+ESCALA_DESCONTO = 100          # pontos-base (1% = 100)
+
+# Cabeçalho do formato binário: assinatura, versão e quantidade de marcadores
+ASSINATURA_BINARIO = b'IMV'
+VERSAO_BINARIO = 1
+CONTENT_TYPE_BINARIO = 'application/octet-stream'
+
+
+def _quantizar(valor, escala):
+    if valor is None:
+        return 0
+    return int((Decimal(valor) * escala).to_integral_value())
+
+
+def campo_escalado(modelo, campo):
+    """
+    Retorna (nome, escala) do campo de Propriedade no modelo informado. O
+    MarcadorMapa guarda alguns campos como inteiros escalados (ver
+    CAMPOS_ESCALADOS); nos demais modelos a escala é 1.
+    """
+    return getattr(modelo, 'CAMPOS_ESCALADOS', {}).get(campo, (campo, 1))
+
+
+def desescalar(valor, escala):
+    """Converte um inteiro escalado de volta em Decimal (com as casas da escala)."""
+    if valor is None or escala == 1:
+        return valor
+    return (Decimal(valor) / escala).quantize(Decimal(1) / escala)
+
+
+def _deltas(valores):
+    """Codifica a lista como o primeiro valor seguido das diferenças sucessivas."""
+    anterior = 0
+    resultado = []
+    for valor in valores:
+        resultado.append(valor - anterior)
+        anterior = valor
+    return resultado
+
+
+def marcadores_colunares(marcadores):
+    """
+    Converte marcadores (dicts com codigo, latitude, longitude, valor e
+    desconto) em colunas paralelas com valores inteiros.
+
+    Latitude e longitude são quantizadas em micrograus e codificadas como
+    deltas em relação ao marcador anterior; o valor é enviado em centavos
+    e o desconto em pontos-base.
+    """
+    return {
+        'codigos': [m['codigo'] for m in marcadores],
+        'lat': _deltas([_quantizar(m['latitude'], ESCALA_COORDENADA) for m in marcadores]),
+        'lon': _deltas([_quantizar(m['longitude'], ESCALA_COORDENADA) for m in marcadores]),
+        'valor': [_quantizar(m['valor'], ESCALA_VALOR) for m in marcadores],
+        'desconto': [_quantizar(m['desconto'], ESCALA_DESCONTO) for m in marcadores],
+        'escala': {
+            'coordenada': ESCALA_COORDENADA,
+            'valor': ESCALA_VALOR,
+            'desconto': ESCALA_DESCONTO,
+        },
+    }
+
+
+def _little_endian(tipo, valores):
+    dados = array(tipo, valores)
+    if sys.byteorder != 'little':
+        dados.byteswap()
+    return dados.tobytes()
+
+
+def empacotar_binario(colunas):
+    """
+    Empacota as colunas de marcadores_colunares() em um buffer binário
+    little-endian com o layout:
+
+        'IMV' | versão (uint8) | n (uint32)
+        lat deltas (int32 * n) | lon deltas (int32 * n)
+        valor (int64 * n) | desconto (int32 * n)
+        códigos (UTF-8 separados por '\\n')
+    """
+    n = len(colunas['codigos'])
+    return b''.join([
+        ASSINATURA_BINARIO,
+        struct.pack('<BI', VERSAO_BINARIO, n),
+        _little_endian('i', colunas['lat']),
+        _little_endian('i', colunas['lon']),
+        _little_endian('q', colunas['valor']),
+        _little_endian('i', colunas['desconto']),
+        '\n'.join(colunas['codigos']).encode('utf-8'),
+    ])
@@ -0,0 +1,188 @@
+import json
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Propriedade
+from .versao import MemoPorVersao
+
+# Quantos bytes de fragmentos cada worker mantém em memória (os mais antigos
+# saem primeiro). O limite é em bytes porque um fragmento de detalhes, com a
+# descrição e a análise da matrícula, ocupa muitas vezes o de um item de lista.
+FRAGMENTOS_MAXIMO_BYTES = getattr(settings, 'FRAGMENTOS_MAX_BYTES', 64 * 1024 * 1024)
+
+
+def _dados_mapa(prop):
+    """Item de results do mapa_api (formato json)"""
+    return {
+        'codigo': prop.codigo,
+        'tipo_imovel': prop.tipo_imovel,
+        'cidade': prop.cidade,
+        'estado': prop.estado,
+        'bairro': prop.bairro,
+        'valor': str(prop.valor),
+        'latitude': str(prop.latitude),
+        'longitude': str(prop.longitude),
+        'desconto': str(prop.desconto or 0),
+        'valor_avaliacao': str(prop.valor_avaliacao) if prop.valor_avaliacao else None,
+        'endereco': prop.endereco
+    }
+
+
+def _texto_ou_nulo(valor):
+    return str(valor) if valor is not None else None
+
+
+def _dados_lista(prop):
+    """Item de results do propriedades_api (sem relevância e distância, que dependem da busca)"""
+    return {
+        'codigo': prop.codigo,
+        'tipo_imovel': prop.tipo_imovel,
+        'cidade': prop.cidade,
+        'estado': prop.estado,
+        'bairro': prop.bairro,
+        'endereco': prop.endereco,
+        'valor': _texto_ou_nulo(prop.valor),
+        'latitude': _texto_ou_nulo(prop.latitude),
+        'longitude': _texto_ou_nulo(prop.longitude),
+        'desconto': str(prop.desconto) if prop.desconto is not None else '0',
+        'imagem_url': prop.imagem_url,
+        'valor_avaliacao': _texto_ou_nulo(prop.valor_avaliacao),
+        'area': _texto_ou_nulo(prop.area),
+        'quartos': prop.quartos,
+        'modalidade_venda': prop.modalidade_venda,
+        'valor_m2': _texto_ou_nulo(prop.valor_m2),
+    }
+
+
+def _dados_detalhes(prop):
+    """Resposta do propriedade_detalhes_api"""
+    return {
+        'id': prop.id,
+        'codigo': prop.codigo,
+        'tipo': prop.tipo,
+        'tipo_imovel': prop.tipo_imovel,
+        'endereco': prop.endereco,
+        'cidade': prop.cidade,
+        'estado': prop.estado,
+        'bairro': prop.bairro,
+        'valor': float(prop.valor),
+        'valor_avaliacao': float(prop.valor_avaliacao) if prop.valor_avaliacao else None,
+        'desconto': float(prop.desconto) if prop.desconto else None,
+        'descricao': prop.descricao,
+        'modalidade_venda': prop.modalidade_venda,
+        'area': float(prop.area) if prop.area else None,
+        'area_total': float(prop.area_total) if prop.area_total else None,
+        'area_privativa': float(prop.area_privativa) if prop.area_privativa else None,
+        'area_terreno': float(prop.area_terreno) if prop.area_terreno else None,
+        'quartos': prop.quartos,
+        'link': prop.link,
+        'data_atualizacao': prop.data_atualizacao.isoformat(),
+        'latitude': float(prop.latitude) if prop.latitude else None,
+        'longitude': float(prop.longitude) if prop.longitude else None,
+        'imagem_url': prop.imagem_url,
+        'imagem_cloudinary_url': prop.imagem_cloudinary_url,
+        'imagem_cloudinary_id': prop.imagem_cloudinary_id,
+        'matricula_url': prop.matricula_url,
+        'analise_matricula': prop.analise_matricula,
+    }
+
+
+# Tipo de fragmento: (campos lidos do banco, None para todos; função que monta o dict)
+TIPOS_FRAGMENTO = {
+    'mapa': ((
+        'codigo', 'tipo_imovel', 'cidade', 'estado', 'bairro',
+        'valor', 'latitude', 'longitude', 'desconto', 'valor_avaliacao', 'endereco'
+    ), _dados_mapa),
+    'lista': ((
+        'codigo', 'tipo_imovel', 'cidade', 'estado', 'bairro', 'endereco',
+        'valor', 'latitude', 'longitude', 'desconto', 'imagem_url',
+        'valor_avaliacao', 'area', 'quartos', 'modalidade_venda', 'valor_m2'
+    ), _dados_lista),
+    'detalhes': (None, _dados_detalhes),
+}
+
+
+def codificar(dados):
+    """Serializa como o JsonResponse (DjangoJSONEncoder, separadores padrão)"""
+    return json.dumps(dados, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+class ListaFragmentos(list):
+    """
+    Lista de fragmentos JSON já serializados (bytes). Em codificar_json, é
+    escrita juntando os bytes, sem serializar os itens novamente.
+    """
+
+
+def codificar_json(dados):
+    """Serializa o dict, juntando os valores ListaFragmentos como arrays JSON prontos."""
+    prontos = {chave: valor for chave, valor in dados.items() if isinstance(valor, ListaFragmentos)}
+    if not prontos:
+        return codificar(dados)
+    campos = []
+    demais = codificar({chave: valor for chave, valor in dados.items() if chave not in prontos})[1:-1]
+    if demais:
+        campos.append(demais)
+    for chave, fragmentos in prontos.items():
+        campos.append(codificar(chave) + b': [' + b', '.join(fragmentos) + b']')
+    return b'{' + b', '.join(campos) + b'}'
+
+
+def acrescentar_campos(fragmento, campos):
+    """Acrescenta campos (como relevância e distância) ao objeto JSON do fragmento."""
+    if not campos:
+        return fragmento
+    return fragmento[:-1] + b', ' + codificar(campos)[1:]
+
+
+# Fragmentos da versão atual dos dados, por (tipo, código, revisão), em cada worker,
+# e o total de bytes guardados (alterados sob _trava)
+_memo = MemoPorVersao(lambda versao: {'fragmentos': {}, 'bytes': 0})
+_trava = threading.Lock()
+
+
+def obter_fragmentos(tipo, codigos, revisoes=None):
+    """
+    Retorna {código: fragmento JSON (bytes)} dos imóveis, na ordem dos códigos.
+    Os que ainda não estão em memória são montados com uma consulta só e
+    guardados até a versão dos dados mudar. Códigos inexistentes são omitidos.
+
+    Com `revisoes` ({código: data_atualizacao}), o fragmento guardado só é
+    reaproveitado se for da mesma data_atualizacao: é o caso dos detalhes,
+    que podem mudar (análise da matrícula) sem uma nova versão dos dados.
+    """
+    memo = _memo.obter()
+    fragmentos = memo['fragmentos']
+
+    codigos = [str(codigo) for codigo in codigos]
+    chaves = {codigo: (tipo, codigo, revisoes.get(codigo) if revisoes else None) for codigo in codigos}
+    novos = {}
+    faltando = [codigo for codigo in codigos if chaves[codigo] not in fragmentos]
+    if faltando:
+        campos, montar = TIPOS_FRAGMENTO[tipo]
+        queryset = Propriedade.objects.filter(codigo__in=faltando)
+        if campos:
+            queryset = queryset.only(*campos, *(['data_atualizacao'] if revisoes else []))
+        for prop in queryset:
+            # Guardado pela revisão lida agora (pode ser mais nova que a informada)
+            chave = (tipo, prop.codigo, prop.data_atualizacao if revisoes else None)
+            novos[chave] = codificar(montar(prop))
+        with _trava:
+            tamanho = memo['bytes'] + sum(len(fragmento) for fragmento in novos.values())
+            while tamanho > FRAGMENTOS_MAXIMO_BYTES and fragmentos:
+                tamanho -= len(fragmentos.pop(next(iter(fragmentos))))
+            for chave, fragmento in novos.items():
+                if (anterior := fragmentos.pop(chave, None)) is not None:
+                    tamanho -= len(anterior)
+                fragmentos[chave] = fragmento
+            memo['bytes'] = tamanho
+
+    novos_por_codigo = {codigo: fragmento for (_, codigo, _), fragmento in novos.items()}
+    resultado = {}
+    for codigo in codigos:
+        fragmento = novos_por_codigo.get(codigo) or fragmentos.get(chaves[codigo])
+        if fragmento is not None:
+            resultado[codigo] = fragmento
+    return resultado
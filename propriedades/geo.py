@@ -0,0 +1,157 @@
+import math
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+RAIO_TERRA_KM = 6371.0088
+
+# Maior raio aceito na busca por proximidade (cobre uma região metropolitana inteira)
+RAIO_MAXIMO_KM = 200
+
+KM_POR_GRAU_LATITUDE = 111.32
+
+# Maior quantidade de vértices aceita em um polígono desenhado pelo usuário
+VERTICES_MAXIMO = 10_000
+
+
+class PoligonoInvalido(ValueError):
+    pass
+
+
+def caixa_do_raio(lat, lon, raio_km):
+    """
+    Retorna o retângulo (min_lon, min_lat, max_lon, max_lat) que contém o
+    círculo, usado como pré-filtro pelos índices de latitude/longitude.
+    """
+    delta_lat = raio_km / KM_POR_GRAU_LATITUDE
+    cos_lat = math.cos(math.radians(min(abs(lat) + delta_lat, 89.9)))
+    delta_lon = min(raio_km / (KM_POR_GRAU_LATITUDE * cos_lat), 180.0)
+    return lon - delta_lon, lat - delta_lat, lon + delta_lon, lat + delta_lat
+
+
+def haversine_km(lat, lon, latitudes, longitudes):
+    """Distância (km) do ponto a cada par dos arrays, calculada de forma vetorizada."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def expressao_distancia_km(lat, lon, campo_latitude='latitude', campo_longitude='longitude', escala=1):
+    """
+    Expressão do ORM com a distância (km) de cada imóvel ao ponto (haversine).
+    Os campos podem guardar as coordenadas multiplicadas por `escala` (micrograus).
+    """
+    lat_imovel = Cast(F(campo_latitude), FloatField())
+    lon_imovel = Cast(F(campo_longitude), FloatField())
+    if escala != 1:
+        lat_imovel = lat_imovel / Value(float(escala))
+        lon_imovel = lon_imovel / Value(float(escala))
+    lat_imovel = Radians(lat_imovel)
+    lon_imovel = Radians(lon_imovel)
+    lat_ponto = math.radians(lat)
+    lon_ponto = math.radians(lon)
+    a = (
+        Power(Sin((lat_imovel - Value(lat_ponto)) / Value(2.0)), 2)
+        + Value(math.cos(lat_ponto)) * Cos(lat_imovel)
+        * Power(Sin((lon_imovel - Value(lon_ponto)) / Value(2.0)), 2)
+    )
+    return Value(2 * RAIO_TERRA_KM) * ASin(Sqrt(Least(a, Value(1.0))))
+
+
+def ler_poligono(dados):
+    """
+    Converte um GeoJSON (Polygon, MultiPolygon ou Feature com uma dessas
+    geometrias, em longitude/latitude) em geometria do shapely, preparada
+    para testes repetidos de ponto no polígono.
+    """
+    if isinstance(dados, dict) and dados.get('type') == 'Feature':
+        dados = dados.get('geometry')
+    if not isinstance(dados, dict) or dados.get('type') not in ('Polygon', 'MultiPolygon'):
+        raise PoligonoInvalido('Informe uma geometria GeoJSON do tipo Polygon ou MultiPolygon')
+    try:
+        geometria = shape(dados)
+    except (ValueError, TypeError, AttributeError, IndexError, shapely.errors.GEOSException) as e:
+        raise PoligonoInvalido(f'GeoJSON inválido: {e}')
+    if geometria.is_empty:
+        raise PoligonoInvalido('Polígono vazio')
+    if shapely.get_num_coordinates(geometria) > VERTICES_MAXIMO:
+        raise PoligonoInvalido(f'O polígono deve ter no máximo {VERTICES_MAXIMO} vértices')
+    if not geometria.is_valid:
+        # Polígonos desenhados à mão podem se auto-intersectar
+        geometria = shapely.make_valid(geometria)
+    shapely.prepare(geometria)
+    return geometria
+
+
+def dentro_do_poligono(geometria, latitudes, longitudes):
+    """Teste vetorizado de ponto no polígono (pontos na borda contam como dentro)."""
+    return shapely.intersects_xy(geometria, longitudes, latitudes)
+
+
+def retangulos_dentro(latitudes, longitudes, dentro):
+    """
+    Cobre os pontos marcados em `dentro` com retângulos que não contêm nenhum
+    outro ponto: a área é dividida em quadrantes (metades semiabertas) até que
+    cada um tenha só pontos de dentro ou só de fora. Retorna, para cada
+    retângulo, os índices dos pontos com a menor e a maior latitude e a menor
+    e a maior longitude, para que o retângulo seja montado com os valores
+    exatos das colunas. A quantidade de retângulos acompanha os pontos perto
+    da borda do polígono, não o total de pontos dentro dele.
+    """
+    retangulos = []
+    pilha = [np.arange(len(dentro))]
+    while pilha:
+        indices = pilha.pop()
+        marcados = dentro[indices]
+        if not marcados.any():
+            continue
+        lat, lon = latitudes[indices], longitudes[indices]
+        if marcados.all():
+            retangulos.append((
+                indices[lat.argmin()], indices[lat.argmax()], indices[lon.argmin()], indices[lon.argmax()]
+            ))
+            continue
+        # Pontos com as mesmas coordenadas têm o mesmo resultado, então ainda há o que dividir
+        norte = lat > (lat.min() + lat.max()) / 2
+        leste = lon > (lon.min() + lon.max()) / 2
+        for parte in (norte & leste, norte & ~leste, ~norte & leste, ~norte & ~leste):
+            if parte.any():
+                pilha.append(indices[parte])
+    return retangulos
+
+
+def _unir_com_ou(condicoes):
+    # Árvore balanceada: o SQLite limita a profundidade das expressões a 1000
+    if len(condicoes) == 1:
+        return condicoes[0]
+    meio = len(condicoes) // 2
+    return Q(_unir_com_ou(condicoes[:meio]), _unir_com_ou(condicoes[meio:]), _connector=Q.OR)
+
+
+def condicao_poligono(geometria, candidatos, campo_latitude='latitude', campo_longitude='longitude', escala=1):
+    """
+    Condição do ORM que seleciona, entre os candidatos (pares latitude,
+    longitude lidos do pré-filtro pelo retângulo do polígono), os que estão
+    dentro da geometria, como faixas de latitude/longitude (ver
+    retangulos_dentro) em vez de uma lista de ids. Deve ser aplicada junto com
+    o mesmo pré-filtro. As colunas podem guardar as coordenadas multiplicadas
+    por `escala` (micrograus).
+    """
+    if not candidatos:
+        return Q(pk__in=[])
+    latitudes, longitudes = zip(*candidatos)
+    graus_lat = np.array(latitudes, dtype=np.float64) / escala
+    graus_lon = np.array(longitudes, dtype=np.float64) / escala
+    dentro = dentro_do_poligono(geometria, graus_lat, graus_lon)
+    condicoes = [
+        Q(**{
+            f'{campo_latitude}__range': (latitudes[lat_min], latitudes[lat_max]),
+            f'{campo_longitude}__range': (longitudes[lon_min], longitudes[lon_max]),
+        })
+        for lat_min, lat_max, lon_min, lon_max in retangulos_dentro(graus_lat, graus_lon, dentro)
+    ]
+    return _unir_com_ou(condicoes) if condicoes else Q(pk__in=[])
@@ -0,0 +1,55 @@
+import numpy as np
+
+# Colunas numéricas com histograma disponível
+COLUNAS_HISTOGRAMA = ['valor', 'desconto', 'area_privativa']
+
+BINS_PADRAO = 20
+BINS_MAXIMO = 100
+
+
+def carregar_colunas(queryset, colunas=COLUNAS_HISTOGRAMA):
+    """
+    Lê as colunas numéricas do queryset em um único SELECT e as converte em
+    arrays float64 do NumPy (valores nulos viram NaN).
+    """
+    linhas = list(queryset.order_by().values_list(*colunas))
+    if not linhas:
+        return {coluna: np.empty(0) for coluna in colunas}
+    return {
+        coluna: np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+        for coluna, valores in zip(colunas, zip(*linhas))
+    }
+
+
+def histograma(valores, bins=BINS_PADRAO):
+    """Calcula o histograma (bins de mesma largura) dos valores não nulos."""
+    validos = valores[np.isfinite(valores)]
+    resultado = {
+        'count': int(validos.size),
+        'nulos': int(valores.size - validos.size),
+        'min': None,
+        'max': None,
+        'bins': [],
+    }
+    if not validos.size:
+        return resultado
+
+    contagens, bordas = np.histogram(validos, bins=bins)
+    resultado['min'] = float(bordas[0])
+    resultado['max'] = float(bordas[-1])
+    resultado['bins'] = [
+        {'inicio': round(float(inicio), 2), 'fim': round(float(fim), 2), 'count': int(quantidade)}
+        for inicio, fim, quantidade in zip(bordas[:-1], bordas[1:], contagens)
+    ]
+    return resultado
+
+
+def calcular_histogramas(queryset, bins=BINS_PADRAO, colunas=None):
+    """
+    Retorna os histogramas de valor, desconto e área privativa do queryset.
+    Se `colunas` já vier carregado (por exemplo, do snapshot colunar), o
+    banco não é consultado.
+    """
+    if colunas is None:
+        colunas = carregar_colunas(queryset)
+    return {coluna: histograma(valores, bins) for coluna, valores in colunas.items()}
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from propriedades.tiles import ZOOM_MAXIMO, ZOOM_PRE_CALCULADO, gerar_tiles
+
+class Command(BaseCommand):
+    help = 'Pré-calcula no cache do mapa os tiles dos zooms mais baixos (os demais são calculados sob demanda)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--zoom-maximo', type=int, default=ZOOM_PRE_CALCULADO, choices=range(ZOOM_MAXIMO + 1),
+            metavar=f'0-{ZOOM_MAXIMO}', help=f'Último zoom pré-calculado (padrão: {ZOOM_PRE_CALCULADO})'
+        )
+
+    def handle(self, *args, **options):
+        versao = gerar_tiles(options['zoom_maximo'])
+        self.stdout.write(self.style.SUCCESS(f'Tiles pré-calculados (versão {versao})'))
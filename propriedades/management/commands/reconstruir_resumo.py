@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from propriedades.marcadores import reconstruir_marcadores
+from propriedades.resumo import reconstruir_resumo_localidades
+from propriedades.tiles import gerar_tiles
+from propriedades.versao import incrementar_versao_dados
+
+class Command(BaseCommand):
+    help = 'Reconstrói as tabelas de resumo de localidades e de marcadores do mapa (e pré-calcula os tiles) a partir dos imóveis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--estado', help='Reconstruir apenas a UF informada')
+        parser.add_argument(
+            '--sem-tiles', action='store_true',
+            help='Não pré-calcular os tiles do mapa (são calculados sob demanda)'
+        )
+
+    def handle(self, *args, **options):
+        total = reconstruir_resumo_localidades(options.get('estado'))
+        total_marcadores = reconstruir_marcadores(options.get('estado'))
+        incrementar_versao_dados()
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumo reconstruído: {total} grupos; marcadores do mapa: {total_marcadores} imóveis'
+        ))
+        if not options['sem_tiles']:
+            self.stdout.write(self.style.SUCCESS(f'Tiles pré-calculados (versão {gerar_tiles()})'))
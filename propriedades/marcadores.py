@@ -0,0 +1,132 @@
+import logging
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .filtros import FILTROS_LISTA
+from .formatos import ESCALA_COORDENADA, campo_escalado
+from .geo import caixa_do_raio, condicao_poligono, expressao_distancia_km
+from .models import MarcadorMapa, Propriedade
+
+logger = logging.getLogger(__name__)
+
+# Filtros numéricos de FiltroPropriedades: campo de Propriedade, lookup e
+# arredondamento do limite para a escala inteira (o limite é um Decimal qualquer)
+FILTROS_NUMERICOS = {
+    'valor_min': ('valor', 'gte', math.ceil),
+    'valor_max': ('valor', 'lte', math.floor),
+    'desconto_min': ('desconto', 'gte', math.ceil),
+}
+
+TAMANHO_LOTE = 2000
+
+
+def _escalar(valor, escala):
+    """Converte o valor para a escala inteira do MarcadorMapa (None continua None)."""
+    if valor is None:
+        return None
+    return int((Decimal(valor) * escala).to_integral_value())
+
+
+def reconstruir_marcadores(estado=None):
+    """
+    Reconstrói a tabela MarcadorMapa de um estado (ou de todos, se estado
+    for None) a partir dos imóveis com coordenadas.
+    """
+    imoveis = Propriedade.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False
+    ).order_by()
+    if estado:
+        imoveis = imoveis.filter(estado=estado)
+
+    campos = ['codigo', 'estado', 'cidade', 'bairro', 'tipo_imovel', 'quartos']
+    escalados = list(MarcadorMapa.CAMPOS_ESCALADOS.items())
+    marcadores = []
+    for linha in imoveis.values('id', *campos, *(campo for campo, _ in escalados)).iterator(chunk_size=TAMANHO_LOTE):
+        marcadores.append(MarcadorMapa(
+            propriedade_id=linha['id'],
+            **{campo: linha[campo] for campo in campos},
+            **{nome: _escalar(linha[campo], escala) for campo, (nome, escala) in escalados}
+        ))
+
+    with transaction.atomic():
+        existentes = MarcadorMapa.objects.all()
+        if estado:
+            # Inclui os imóveis que mudaram para o estado (o marcador ainda está no anterior)
+            existentes = existentes.filter(Q(estado=estado) | Q(propriedade__estado=estado))
+        existentes.delete()
+        MarcadorMapa.objects.bulk_create(marcadores, batch_size=TAMANHO_LOTE)
+
+    logger.info(f"Marcadores do mapa reconstruídos ({estado or 'todos os estados'}): {len(marcadores)} imóveis")
+    return len(marcadores)
+
+
+def suporta(filtro):
+    """
+    Indica se as consultas com o filtro podem ler do MarcadorMapa (a busca
+    textual depende do texto de Propriedade) e se ele está ativo (MARCADORES_MAPA).
+    """
+    return getattr(settings, 'MARCADORES_MAPA', True) and not filtro.texto
+
+
+def consultar(filtro, apenas_mapa=False):
+    """
+    Retorna o queryset de MarcadorMapa com os filtros aplicados, com a mesma
+    semântica de FiltroPropriedades.aplicar. Com apenas_mapa, exclui as
+    coordenadas zeradas, como o mapa_api.
+    """
+    queryset = MarcadorMapa.objects.order_by('codigo')
+    if apenas_mapa:
+        queryset = queryset.exclude(latitude_e6=0).exclude(longitude_e6=0)
+
+    for nome, valores in filtro.listas.items():
+        queryset = queryset.filter(**{FILTROS_LISTA[nome]: valores})
+
+    for nome, valor in filtro.numeros.items():
+        campo, lookup, arredondar = FILTROS_NUMERICOS[nome]
+        nome_campo, escala = campo_escalado(MarcadorMapa, campo)
+        queryset = queryset.filter(**{f'{nome_campo}__{lookup}': arredondar(valor * escala)})
+
+    if filtro.quartos_min is not None:
+        queryset = queryset.filter(quartos__gte=filtro.quartos_min)
+
+    if filtro.codigo:
+        queryset = queryset.filter(codigo=filtro.codigo)
+
+    if filtro.bbox:
+        queryset = queryset.filter(_na_caixa(*filtro.bbox))
+
+    if filtro.raio:
+        # Pré-filtro pelo retângulo (índice de lat/lon) e refinamento pela distância real
+        lat, lon, raio_km = filtro.raio
+        queryset = queryset.filter(_na_caixa(*caixa_do_raio(lat, lon, raio_km))).annotate(
+            distancia_km=expressao_distancia_km(lat, lon, 'latitude_e6', 'longitude_e6', ESCALA_COORDENADA)
+        ).filter(distancia_km__lte=raio_km)
+
+    if filtro.poligono is not None:
+        # Pré-filtro pelo retângulo do polígono e teste vetorizado dos candidatos,
+        # que voltam para a consulta como faixas de latitude/longitude
+        queryset = queryset.filter(_na_caixa(*filtro.poligono.bounds))
+        candidatos = list(queryset.order_by().values_list('latitude_e6', 'longitude_e6'))
+        queryset = queryset.filter(condicao_poligono(
+            filtro.poligono, candidatos, 'latitude_e6', 'longitude_e6', ESCALA_COORDENADA
+        ))
+
+    return queryset
+
+
+def _na_caixa(min_lon, min_lat, max_lon, max_lat):
+    """Condição do retângulo em micrograus (arredondado para dentro, sem perder pontos da borda)."""
+    def limite(valor, arredondar):
+        return arredondar(Decimal(repr(float(valor))) * ESCALA_COORDENADA)
+
+    return Q(
+        latitude_e6__gte=limite(min_lat, math.ceil),
+        latitude_e6__lte=limite(max_lat, math.floor),
+        longitude_e6__gte=limite(min_lon, math.ceil),
+        longitude_e6__lte=limite(max_lon, math.floor),
+    )
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propriedades', '0011_auto_20250421_2012'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='propriedade',
+            index=models.Index(fields=['latitude', 'longitude'], name='propriedade_lat_lon_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propriedades', '0013_versaodados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoLocalidade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(max_length=2)),
+                ('cidade', models.CharField(max_length=100)),
+                ('bairro', models.CharField(blank=True, max_length=100, null=True)),
+                ('tipo_imovel', models.CharField(blank=True, max_length=50, null=True)),
+                ('total', models.IntegerField(default=0)),
+                ('total_com_coordenadas', models.IntegerField(default=0)),
+                ('valor_min', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('valor_mediana', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('desconto_max', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+            ],
+            options={
+                'verbose_name': 'Resumo de Localidade',
+                'verbose_name_plural': 'Resumos de Localidades',
+                'indexes': [models.Index(fields=['estado', 'cidade', 'bairro'], name='propriedade_estado_8a0b8c_idx'), models.Index(fields=['tipo_imovel'], name='propriedade_tipo_im_fffcf8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:42
+
+import re
+
+from django.db import migrations, models
+from unidecode import unidecode
+
+# Cópia de busca.CAMPOS_BUSCA e busca.normalizar_texto no momento desta
+# migração (migrações não devem depender do código atual do app)
+CAMPOS_BUSCA = ['endereco', 'bairro', 'cidade', 'descricao', 'analise_matricula']
+
+
+def normalizar_texto(texto):
+    if not texto:
+        return ''
+    texto = unidecode(texto).lower()
+    return re.sub(r'[^a-z0-9]+', ' ', texto).strip()
+
+
+# PostgreSQL: índice GIN sobre o tsvector em português do texto de busca
+SQL_POSTGRES = """
+CREATE INDEX IF NOT EXISTS propriedade_texto_busca_gin
+    ON propriedades_propriedade
+    USING GIN (to_tsvector('portuguese', texto_busca));
+"""
+SQL_POSTGRES_REVERSO = "DROP INDEX IF EXISTS propriedade_texto_busca_gin;"
+
+# SQLite: tabela FTS5 com conteúdo externo, mantida por triggers
+SQL_SQLITE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS propriedades_busca USING fts5(
+        texto_busca,
+        content='propriedades_propriedade',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS propriedades_busca_ai AFTER INSERT ON propriedades_propriedade BEGIN
+        INSERT INTO propriedades_busca(rowid, texto_busca) VALUES (new.id, new.texto_busca);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS propriedades_busca_ad AFTER DELETE ON propriedades_propriedade BEGIN
+        INSERT INTO propriedades_busca(propriedades_busca, rowid, texto_busca) VALUES ('delete', old.id, old.texto_busca);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS propriedades_busca_au AFTER UPDATE ON propriedades_propriedade BEGIN
+        INSERT INTO propriedades_busca(propriedades_busca, rowid, texto_busca) VALUES ('delete', old.id, old.texto_busca);
+        INSERT INTO propriedades_busca(rowid, texto_busca) VALUES (new.id, new.texto_busca);
+    END;
+    """,
+    "INSERT INTO propriedades_busca(propriedades_busca) VALUES ('rebuild');",
+]
+SQL_SQLITE_REVERSO = [
+    "DROP TRIGGER IF EXISTS propriedades_busca_ai;",
+    "DROP TRIGGER IF EXISTS propriedades_busca_ad;",
+    "DROP TRIGGER IF EXISTS propriedades_busca_au;",
+    "DROP TABLE IF EXISTS propriedades_busca;",
+]
+
+
+def preencher_texto_busca(apps, schema_editor):
+    Propriedade = apps.get_model('propriedades', 'Propriedade')
+    lote = []
+    for propriedade in Propriedade.objects.only('id', *CAMPOS_BUSCA).iterator(chunk_size=2000):
+        partes = (getattr(propriedade, campo) for campo in CAMPOS_BUSCA)
+        propriedade.texto_busca = ' '.join(normalizar_texto(parte) for parte in partes if parte)
+        lote.append(propriedade)
+        if len(lote) >= 2000:
+            Propriedade.objects.bulk_update(lote, ['texto_busca'])
+            lote = []
+    if lote:
+        Propriedade.objects.bulk_update(lote, ['texto_busca'])
+
+
+def criar_indice_busca(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(SQL_POSTGRES)
+    elif vendor == 'sqlite':
+        for sql in SQL_SQLITE:
+            schema_editor.execute(sql)
+
+
+def remover_indice_busca(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(SQL_POSTGRES_REVERSO)
+    elif vendor == 'sqlite':
+        for sql in SQL_SQLITE_REVERSO:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propriedades', '0014_resumolocalidade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propriedade',
+            name='texto_busca',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(preencher_texto_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice_busca, remover_indice_busca),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:46
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# sort=desconto ordena por desconto DESC NULLS LAST. O SQLite não aceita
+# NULLS LAST em índices, mas no DESC dele os nulos já ficam por último.
+SQL_INDICE_DESCONTO = {
+    'postgresql': 'CREATE INDEX IF NOT EXISTS propriedade_desconto_cod_idx ON propriedades_propriedade (desconto DESC NULLS LAST, codigo);',
+    'sqlite': 'CREATE INDEX IF NOT EXISTS propriedade_desconto_cod_idx ON propriedades_propriedade (desconto DESC, codigo);',
+}
+SQL_INDICE_DESCONTO_REVERSO = 'DROP INDEX IF EXISTS propriedade_desconto_cod_idx;'
+
+
+def preencher_valor_m2(apps, schema_editor):
+    Propriedade = apps.get_model('propriedades', 'Propriedade')
+    lote = []
+    for propriedade in Propriedade.objects.only('id', 'valor', 'area', 'area_privativa').iterator(chunk_size=2000):
+        # Mesmo cálculo de Propriedade.calcular_valor_m2
+        area = propriedade.area_privativa or propriedade.area
+        valor_m2 = None
+        if propriedade.valor is not None and area and area > 0:
+            valor_m2 = (Decimal(propriedade.valor) / Decimal(area)).quantize(Decimal('0.01'))
+            if valor_m2 >= 10 ** 10:
+                valor_m2 = None
+        propriedade.valor_m2 = valor_m2
+        lote.append(propriedade)
+        if len(lote) >= 2000:
+            Propriedade.objects.bulk_update(lote, ['valor_m2'])
+            lote = []
+    if lote:
+        Propriedade.objects.bulk_update(lote, ['valor_m2'])
+
+
+def criar_indice_desconto(apps, schema_editor):
+    sql = SQL_INDICE_DESCONTO.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql)
+
+
+def remover_indice_desconto(apps, schema_editor):
+    if schema_editor.connection.vendor in SQL_INDICE_DESCONTO:
+        schema_editor.execute(SQL_INDICE_DESCONTO_REVERSO)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propriedades', '0015_propriedade_texto_busca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propriedade',
+            name='valor_m2',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+        migrations.RunPython(preencher_valor_m2, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='propriedade',
+            index=models.Index(fields=['valor', 'codigo'], name='propriedade_valor_cod_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='propriedade',
+            index=models.Index(fields=['valor_m2', 'codigo'], name='propriedade_valor_m2_cod_idx'),
+        ),
+        migrations.RunPython(criar_indice_desconto, remover_indice_desconto),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:56
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# sort=desconto ordena por desconto DESC NULLS LAST (ver 0016)
+SQL_INDICE_DESCONTO = {
+    'postgresql': 'CREATE INDEX IF NOT EXISTS marcador_desconto_cod_idx ON propriedades_marcadormapa (desconto_pb DESC NULLS LAST, codigo);',
+    'sqlite': 'CREATE INDEX IF NOT EXISTS marcador_desconto_cod_idx ON propriedades_marcadormapa (desconto_pb DESC, codigo);',
+}
+SQL_INDICE_DESCONTO_REVERSO = 'DROP INDEX IF EXISTS marcador_desconto_cod_idx;'
+
+# Mesmas escalas de formatos.py
+ESCALAS = {
+    'latitude': ('latitude_e6', 1_000_000),
+    'longitude': ('longitude_e6', 1_000_000),
+    'valor': ('valor_centavos', 100),
+    'valor_m2': ('valor_m2_centavos', 100),
+    'desconto': ('desconto_pb', 100),
+}
+
+
+def preencher_marcadores(apps, schema_editor):
+    # Mesmo cálculo de marcadores.reconstruir_marcadores
+    Propriedade = apps.get_model('propriedades', 'Propriedade')
+    MarcadorMapa = apps.get_model('propriedades', 'MarcadorMapa')
+    campos = ['codigo', 'estado', 'cidade', 'bairro', 'tipo_imovel', 'quartos']
+    lote = []
+    for linha in Propriedade.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False
+    ).values('id', *campos, *ESCALAS).iterator(chunk_size=2000):
+        lote.append(MarcadorMapa(
+            propriedade_id=linha['id'],
+            **{campo: linha[campo] for campo in campos},
+            **{
+                nome: None if linha[campo] is None else int((Decimal(linha[campo]) * escala).to_integral_value())
+                for campo, (nome, escala) in ESCALAS.items()
+            }
+        ))
+        if len(lote) >= 2000:
+            MarcadorMapa.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        MarcadorMapa.objects.bulk_create(lote)
+
+
+def criar_indice_desconto(apps, schema_editor):
+    sql = SQL_INDICE_DESCONTO.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql)
+
+
+def remover_indice_desconto(apps, schema_editor):
+    if schema_editor.connection.vendor in SQL_INDICE_DESCONTO:
+        schema_editor.execute(SQL_INDICE_DESCONTO_REVERSO)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('propriedades', '0016_propriedade_valor_m2'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcadorMapa',
+            fields=[
+                ('propriedade', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='marcador', serialize=False, to='propriedades.propriedade')),
+                ('codigo', models.CharField(max_length=50, unique=True)),
+                ('estado', models.CharField(max_length=2)),
+                ('cidade', models.CharField(max_length=100)),
+                ('bairro', models.CharField(blank=True, max_length=100, null=True)),
+                ('tipo_imovel', models.CharField(blank=True, max_length=50, null=True)),
+                ('quartos', models.SmallIntegerField(blank=True, null=True)),
+                ('latitude_e6', models.IntegerField()),
+                ('longitude_e6', models.IntegerField()),
+                ('valor_centavos', models.BigIntegerField()),
+                ('valor_m2_centavos', models.BigIntegerField(blank=True, null=True)),
+                ('desconto_pb', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Marcador do Mapa',
+                'verbose_name_plural': 'Marcadores do Mapa',
+                'indexes': [models.Index(fields=['estado', 'cidade', 'bairro'], name='marcador_localidade_idx'), models.Index(fields=['tipo_imovel'], name='marcador_tipo_imovel_idx'), models.Index(fields=['latitude_e6', 'longitude_e6'], name='marcador_lat_lon_idx'), models.Index(fields=['valor_centavos', 'codigo'], name='marcador_valor_cod_idx'), models.Index(fields=['valor_m2_centavos', 'codigo'], name='marcador_valor_m2_cod_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_marcadores, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice_desconto, remover_indice_desconto),
+    ]
@@ -1,5 +1,10 @@
+from decimal import Decimal
+
 from django.db import models
 
+from .busca import texto_busca
+from .formatos import ESCALA_COORDENADA, ESCALA_DESCONTO, ESCALA_VALOR
+
 # Create your models here.
 
 class Propriedade(models.Model):
@@ -29,6 +34,10 @@ class Propriedade(models.Model):
     imagem_cloudinary_id = models.CharField(max_length=100, null=True, blank=True)
     matricula_url = models.URLField(blank=True, null=True, verbose_name='URL da Matrícula')
     analise_matricula = models.TextField(blank=True, null=True, verbose_name='Análise da Matrícula')
+    # Endereço, descrição e análise da matrícula sem acentos, para a busca textual (ver busca.py)
+    texto_busca = models.TextField(blank=True, default='', editable=False)
+    # Preço por m² (área privativa ou, na falta dela, área), para a ordenação sort=valor_m2
+    valor_m2 = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False)
 
     class Meta:
         indexes = [
@@ -36,6 +45,12 @@ class Propriedade(models.Model):
             models.Index(fields=['estado', 'cidade', 'bairro']),
             models.Index(fields=['tipo_imovel', 'valor']),
             models.Index(fields=['desconto', 'valor']),
+            # Consultas por viewport (bbox) do mapa
+            models.Index(fields=['latitude', 'longitude'], name='propriedade_lat_lon_idx'),
+            # Ordenações com cursor (sort=valor e sort=valor_m2), desempatadas por código.
+            # O índice de sort=desconto (DESC NULLS LAST) depende do banco e é criado na migração 0016
+            models.Index(fields=['valor', 'codigo'], name='propriedade_valor_cod_idx'),
+            models.Index(fields=['valor_m2', 'codigo'], name='propriedade_valor_m2_cod_idx'),
         ]
         verbose_name = "Propriedade"
         verbose_name_plural = "Propriedades"
@@ -43,6 +58,23 @@ class Propriedade(models.Model):
     def __str__(self):
         return f"{self.codigo} - {self.endereco}"
 
+    def calcular_valor_m2(self):
+        """Preço por m² da área privativa (ou da área), ou None se não houver área."""
+        area = self.area_privativa or self.area
+        if self.valor is None or not area or area <= 0:
+            return None
+        valor_m2 = (Decimal(self.valor) / Decimal(area)).quantize(Decimal('0.01'))
+        # Áreas cadastradas com erro (ex.: 0,01 m²) estourariam o campo
+        return valor_m2 if valor_m2 < 10 ** 10 else None
+
+    def save(self, *args, **kwargs):
+        self.texto_busca = texto_busca(self)
+        self.valor_m2 = self.calcular_valor_m2()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = [*{*update_fields, 'texto_busca', 'valor_m2'}]
+        super().save(*args, **kwargs)
+
 class ImagemPropriedade(models.Model):
     propriedade = models.ForeignKey(Propriedade, on_delete=models.CASCADE, related_name='imagens')
     url = models.URLField()
@@ -55,3 +87,97 @@ class ImagemPropriedade(models.Model):
         verbose_name = "Imagem da Propriedade"
         verbose_name_plural = "Imagens da Propriedade"
         ordering = ['ordem']
+
+class VersaoDados(models.Model):
+    """
+    Versão global do conjunto de dados de imóveis (registro único).
+
+    É incrementada pelo importador e pelos scripts de manutenção sempre que
+    gravam no banco, e compõe as chaves de cache das APIs.
+    """
+    versao = models.PositiveBigIntegerField(default=1)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Versão dos Dados"
+        verbose_name_plural = "Versão dos Dados"
+
+    def __str__(self):
+        return f"Versão {self.versao}"
+
+class ResumoLocalidade(models.Model):
+    """
+    Resumo dos imóveis por (estado, cidade, bairro, tipo_imovel).
+
+    Tabela pequena reconstruída pelo importador ao fim de cada estado; as
+    APIs de listas (estados, cidades, bairros, tipos) leem daqui em vez de
+    fazer DISTINCT sobre Propriedade.
+    """
+    estado = models.CharField(max_length=2)
+    cidade = models.CharField(max_length=100)
+    bairro = models.CharField(max_length=100, null=True, blank=True)
+    tipo_imovel = models.CharField(max_length=50, null=True, blank=True)
+    total = models.IntegerField(default=0)
+    total_com_coordenadas = models.IntegerField(default=0)
+    valor_min = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    valor_mediana = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    desconto_max = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'cidade', 'bairro']),
+            models.Index(fields=['tipo_imovel']),
+        ]
+        verbose_name = "Resumo de Localidade"
+        verbose_name_plural = "Resumos de Localidades"
+
+    def __str__(self):
+        return f"{self.estado} / {self.cidade} / {self.bairro or '-'} / {self.tipo_imovel or '-'}"
+
+class MarcadorMapa(models.Model):
+    """
+    Modelo de leitura estreito das consultas do mapa e da listagem.
+
+    Uma linha por imóvel com coordenadas, apenas com as chaves de filtro e
+    os campos numéricos em inteiros escalados (micrograus, centavos e
+    pontos-base, as mesmas escalas do formato colunar), sem as colunas de
+    texto longo de Propriedade. Reconstruída pelo importador ao fim de cada
+    estado (ver marcadores.reconstruir_marcadores).
+    """
+    # Campos de Propriedade guardados aqui como inteiros: nome local e escala
+    CAMPOS_ESCALADOS = {
+        'latitude': ('latitude_e6', ESCALA_COORDENADA),
+        'longitude': ('longitude_e6', ESCALA_COORDENADA),
+        'valor': ('valor_centavos', ESCALA_VALOR),
+        'valor_m2': ('valor_m2_centavos', ESCALA_VALOR),
+        'desconto': ('desconto_pb', ESCALA_DESCONTO),
+    }
+
+    propriedade = models.OneToOneField(
+        Propriedade, on_delete=models.CASCADE, primary_key=True, related_name='marcador'
+    )
+    codigo = models.CharField(max_length=50, unique=True)
+    estado = models.CharField(max_length=2)
+    cidade = models.CharField(max_length=100)
+    bairro = models.CharField(max_length=100, null=True, blank=True)
+    tipo_imovel = models.CharField(max_length=50, null=True, blank=True)
+    quartos = models.SmallIntegerField(null=True, blank=True)
+    latitude_e6 = models.IntegerField()
+    longitude_e6 = models.IntegerField()
+    valor_centavos = models.BigIntegerField()
+    valor_m2_centavos = models.BigIntegerField(null=True, blank=True)
+    desconto_pb = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'cidade', 'bairro'], name='marcador_localidade_idx'),
+            models.Index(fields=['tipo_imovel'], name='marcador_tipo_imovel_idx'),
+            models.Index(fields=['latitude_e6', 'longitude_e6'], name='marcador_lat_lon_idx'),
+            models.Index(fields=['valor_centavos', 'codigo'], name='marcador_valor_cod_idx'),
+            models.Index(fields=['valor_m2_centavos', 'codigo'], name='marcador_valor_m2_cod_idx'),
+        ]
+        verbose_name = "Marcador do Mapa"
+        verbose_name_plural = "Marcadores do Mapa"
+
+    def __str__(self):
+        return self.codigo
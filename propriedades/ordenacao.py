@@ -0,0 +1,101 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import F, Q
+
+from .formatos import campo_escalado, desescalar
+
+# Ordenações aceitas no parâmetro sort=: campo, se é decrescente, tipo do valor
+# guardado no cursor e o filtro exigido (distancia e relevancia são anotações
+# criadas pela busca por raio e pela busca textual). Todas desempatam por
+# código e deixam os valores nulos por último. No MarcadorMapa os campos são
+# inteiros escalados (ver formatos.campo_escalado), mas o valor no cursor fica
+# sempre na unidade de Propriedade, então os cursores valem para qualquer caminho.
+ORDENACOES = {
+    'codigo': {'campo': None, 'decrescente': False},
+    'desconto': {'campo': 'desconto', 'decrescente': True, 'tipo': Decimal},
+    'valor': {'campo': 'valor', 'decrescente': False, 'tipo': Decimal},
+    'valor_m2': {'campo': 'valor_m2', 'decrescente': False, 'tipo': Decimal},
+    'distancia': {'campo': 'distancia_km', 'decrescente': False, 'tipo': float, 'requer': 'raio'},
+    'relevancia': {'campo': 'relevancia', 'decrescente': True, 'tipo': float, 'requer': 'texto'},
+}
+
+ORDENACAO_PADRAO = 'codigo'
+
+
+def ler_ordenacao(params, filtro):
+    """
+    Retorna o nome da ordenação pedida em sort=. Sem sort= (ou com um valor
+    desconhecido ou sem o filtro que ele exige), buscas por raio são
+    ordenadas por distância, buscas textuais por relevância e as demais por código.
+    """
+    nome = params.get('sort')
+    if nome in ORDENACOES:
+        requer = ORDENACOES[nome].get('requer')
+        if requer is None or getattr(filtro, requer):
+            return nome
+    if filtro.raio:
+        return 'distancia'
+    if filtro.texto:
+        return 'relevancia'
+    return ORDENACAO_PADRAO
+
+
+def _campo(nome, modelo):
+    campo = ORDENACOES[nome]['campo']
+    if campo is None:
+        return None, 1
+    return campo_escalado(modelo, campo)
+
+
+def ordenar(queryset, nome):
+    """Aplica a ordenação (com desempate por código) ao queryset."""
+    campo, _ = _campo(nome, queryset.model)
+    if campo is None:
+        return queryset.order_by('codigo')
+    if ORDENACOES[nome]['decrescente']:
+        return queryset.order_by(F(campo).desc(nulls_last=True), 'codigo')
+    return queryset.order_by(F(campo).asc(nulls_last=True), 'codigo')
+
+
+def valor_do_item(item, nome, modelo=None):
+    """
+    Retorna o valor do campo de ordenação de um item (dict ou instância) do
+    modelo informado, na unidade de Propriedade.
+    """
+    campo, escala = _campo(nome, modelo)
+    if campo is None:
+        return None
+    return desescalar(item[campo] if isinstance(item, dict) else getattr(item, campo), escala)
+
+
+def texto_valor(valor):
+    """Serializa o valor de ordenação para o cursor (None continua None)."""
+    return None if valor is None else str(valor)
+
+
+def filtrar_apos(queryset, nome, posicao):
+    """
+    Restringe o queryset aos itens posteriores à posição do cursor
+    (keyset sobre o par valor de ordenação, código), sem OFFSET.
+    """
+    campo, escala = _campo(nome, queryset.model)
+    if campo is None:
+        return queryset.filter(codigo__gt=posicao['codigo'])
+
+    if posicao.get('valor') is None:
+        # Já estamos entre os nulos, que ficam no fim e são ordenados por código
+        return queryset.filter(**{f'{campo}__isnull': True, 'codigo__gt': posicao['codigo']})
+
+    try:
+        valor = ORDENACOES[nome]['tipo'](posicao['valor']) * escala
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(posicao['valor'])
+    if escala != 1 and valor == valor.to_integral_value():
+        # Inteiro, para o banco comparar com a coluna inteira usando o índice
+        valor = int(valor)
+    comparacao = 'lt' if ORDENACOES[nome]['decrescente'] else 'gt'
+    return queryset.filter(
+        Q(**{f'{campo}__{comparacao}': valor})
+        | Q(**{campo: valor, 'codigo__gt': posicao['codigo']})
+        | Q(**{f'{campo}__isnull': True})
+    )
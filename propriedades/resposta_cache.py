@@ -0,0 +1,82 @@
+import gzip
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .cache_utils import obter_ou_calcular
+from .fragmentos import codificar_json
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele, apenas gzip
+    brotli = None
+
+# Níveis de compressão: a compressão acontece uma vez por chave, no cache miss,
+# então vale usar níveis mais altos que os da compressão a cada requisição
+NIVEL_GZIP = 9
+QUALIDADE_BROTLI = 9
+
+COMPRESSORES = {
+    'gzip': lambda conteudo: gzip.compress(conteudo, compresslevel=NIVEL_GZIP, mtime=0),
+}
+if brotli is not None:
+    COMPRESSORES['br'] = lambda conteudo: brotli.compress(conteudo, quality=QUALIDADE_BROTLI)
+
+# Preferência quando o cliente aceita mais de uma codificação
+PREFERENCIA_CODIFICACOES = ['br', 'gzip']
+
+
+def escolher_codificacao(request):
+    """Escolhe a codificação da resposta a partir do Accept-Encoding ('identity' se nenhuma)."""
+    aceitas = set()
+    for parte in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        nome, _, parametros = parte.strip().partition(';')
+        if parametros.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        aceitas.add(nome.strip().lower())
+    for codificacao in PREFERENCIA_CODIFICACOES:
+        if codificacao in COMPRESSORES and (codificacao in aceitas or '*' in aceitas):
+            return codificacao
+    return 'identity'
+
+
+def serializar_json(dados, cabecalhos=None):
+    """
+    Serializa os dados como JsonResponse faria, no formato guardado pelo cache
+    de respostas. Valores ListaFragmentos são escritos juntando os bytes prontos.
+    """
+    return {
+        'conteudo': codificar_json(dados),
+        'content_type': 'application/json',
+        'cabecalhos': cabecalhos or {},
+    }
+
+
+def resposta_em_cache(request, chave, calcular, cache_alias='mapa'):
+    """
+    Retorna a resposta HTTP da chave a partir dos bytes finais em cache.
+
+    `calcular()` deve retornar um dict com 'conteudo' (bytes), 'content_type'
+    e 'cabecalhos' (ver serializar_json). O cache guarda uma entrada para os
+    bytes originais e uma por codificação (gzip, br) já comprimida, de forma
+    que um acerto não serializa nem comprime nada. Exceções de `calcular()`
+    são propagadas e não são gravadas em cache.
+    """
+    codificacao = escolher_codificacao(request)
+    chave_original = f'{chave}:identity'
+
+    if codificacao == 'identity':
+        entrada = obter_ou_calcular(chave_original, calcular, cache_alias=cache_alias)
+    else:
+        def comprimir():
+            original = obter_ou_calcular(chave_original, calcular, cache_alias=cache_alias)
+            return {**original, 'conteudo': COMPRESSORES[codificacao](original['conteudo'])}
+        entrada = obter_ou_calcular(f'{chave}:{codificacao}', comprimir, cache_alias=cache_alias)
+
+    response = HttpResponse(entrada['conteudo'], content_type=entrada['content_type'])
+    for nome, valor in entrada['cabecalhos'].items():
+        response[nome] = valor
+    if codificacao != 'identity':
+        response['Content-Encoding'] = codificacao
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
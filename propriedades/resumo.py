@@ -0,0 +1,59 @@
+import logging
+from decimal import Decimal
+from statistics import median
+
+from django.db import transaction
+
+from .models import Propriedade, ResumoLocalidade
+
+logger = logging.getLogger(__name__)
+
+
+def reconstruir_resumo_localidades(estado=None):
+    """
+    Reconstrói a tabela ResumoLocalidade de um estado (ou de todos, se
+    estado for None) a partir de uma única leitura de Propriedade.
+    """
+    imoveis = Propriedade.objects.order_by()
+    if estado:
+        imoveis = imoveis.filter(estado=estado)
+
+    grupos = {}
+    for uf, cidade, bairro, tipo, valor, desconto, lat, lon in imoveis.values_list(
+        'estado', 'cidade', 'bairro', 'tipo_imovel', 'valor', 'desconto', 'latitude', 'longitude'
+    ).iterator(chunk_size=2000):
+        grupo = grupos.setdefault((uf, cidade, bairro, tipo), {
+            'total_com_coordenadas': 0,
+            'valores': [],
+            'desconto_max': None,
+        })
+        grupo['valores'].append(valor)
+        if lat is not None and lon is not None:
+            grupo['total_com_coordenadas'] += 1
+        if desconto is not None and (grupo['desconto_max'] is None or desconto > grupo['desconto_max']):
+            grupo['desconto_max'] = desconto
+
+    resumos = []
+    for (uf, cidade, bairro, tipo), grupo in grupos.items():
+        valores = grupo['valores']
+        resumos.append(ResumoLocalidade(
+            estado=uf,
+            cidade=cidade,
+            bairro=bairro,
+            tipo_imovel=tipo,
+            total=len(valores),
+            total_com_coordenadas=grupo['total_com_coordenadas'],
+            valor_min=min(valores),
+            valor_mediana=Decimal(median(valores)).quantize(Decimal('0.01')),
+            desconto_max=grupo['desconto_max'],
+        ))
+
+    with transaction.atomic():
+        existentes = ResumoLocalidade.objects.all()
+        if estado:
+            existentes = existentes.filter(estado=estado)
+        existentes.delete()
+        ResumoLocalidade.objects.bulk_create(resumos, batch_size=1000)
+
+    logger.info(f"Resumo de localidades reconstruído ({estado or 'todos os estados'}): {len(resumos)} grupos")
+    return len(resumos)
@@ -0,0 +1,245 @@
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .clusters import indice_celula, montar_clusters, zoom_agrupamento
+from .formatos import ESCALA_COORDENADA
+from .geo import caixa_do_raio, dentro_do_poligono, haversine_km
+from .models import Propriedade
+from .versao import MemoPorVersao
+
+logger = logging.getLogger(__name__)
+
+# Colunas categóricas guardadas com codificação por dicionário
+COLUNAS_CATEGORICAS = ['estado', 'cidade', 'bairro', 'tipo_imovel', 'modalidade_venda']
+
+# Colunas numéricas guardadas como float64 (nulos viram NaN)
+COLUNAS_NUMERICAS = ['valor', 'desconto', 'latitude', 'longitude', 'quartos', 'area_privativa', 'valor_m2']
+
+# Colunas comparadas pelos filtros numéricos de FiltroPropriedades
+COLUNAS_FILTROS_NUMERICOS = {
+    'valor_min': ('valor', np.greater_equal),
+    'valor_max': ('valor', np.less_equal),
+    'desconto_min': ('desconto', np.greater_equal),
+}
+
+
+class SnapshotColunar:
+    """
+    Cópia somente leitura, em colunas NumPy, dos imóveis com coordenadas.
+
+    As linhas ficam ordenadas por código; filtros de igualdade e de faixa
+    viram máscaras vetorizadas e as contagens saem da própria máscara. O
+    banco só é consultado para hidratar os imóveis da página retornada.
+    """
+
+    def __init__(self, linhas, versao):
+        self.versao = versao
+        self.total = len(linhas)
+        colunas = list(zip(*linhas)) if linhas else [()] * (2 + len(COLUNAS_NUMERICAS) + len(COLUNAS_CATEGORICAS))
+
+        self.codigos = np.array(colunas[0], dtype=str)
+        self.ids = np.array(colunas[1], dtype=np.int64)
+
+        self.numericas = {}
+        for i, coluna in enumerate(COLUNAS_NUMERICAS, start=2):
+            self.numericas[coluna] = np.array(
+                [np.nan if v is None else v for v in colunas[i]], dtype=np.float64
+            )
+
+        self.categoricas = {}
+        self.dicionarios = {}
+        inicio = 2 + len(COLUNAS_NUMERICAS)
+        for i, coluna in enumerate(COLUNAS_CATEGORICAS, start=inicio):
+            dicionario = {}
+            codificada = np.fromiter(
+                (dicionario.setdefault(v, len(dicionario)) for v in colunas[i]),
+                dtype=np.int32, count=self.total
+            )
+            self.categoricas[coluna] = codificada
+            self.dicionarios[coluna] = dicionario
+
+        latitude = self.numericas['latitude']
+        longitude = self.numericas['longitude']
+        # Mesmo critério do mapa_api: coordenadas não nulas e diferentes de zero
+        self.coordenada_valida = (latitude != 0) & (longitude != 0)
+
+    @classmethod
+    def carregar(cls, versao):
+        inicio = time.time()
+        linhas = list(Propriedade.objects.filter(
+            latitude__isnull=False,
+            longitude__isnull=False
+        ).order_by('codigo').values_list(
+            'codigo', 'id', *COLUNAS_NUMERICAS, *COLUNAS_CATEGORICAS
+        ))
+        snapshot = cls(linhas, versao)
+        logger.info(f"Snapshot colunar carregado: {snapshot.total} imóveis em {time.time() - inicio:.2f}s (versão {versao})")
+        return snapshot
+
+    @staticmethod
+    def suporta(filtro):
+        """Indica se o filtro pode ser resolvido no snapshot (a busca textual não pode)."""
+        return not filtro.texto
+
+    def mascara(self, filtro, apenas_mapa=False):
+        """Retorna a máscara booleana das linhas que atendem ao filtro."""
+        mascara = self.coordenada_valida.copy() if apenas_mapa else np.ones(self.total, dtype=bool)
+
+        for nome, valores in filtro.listas.items():
+            dicionario = self.dicionarios[nome]
+            codigos = [dicionario[v] for v in valores if v in dicionario]
+            mascara &= np.isin(self.categoricas[nome], codigos)
+
+        for nome, valor in filtro.numeros.items():
+            coluna, comparacao = COLUNAS_FILTROS_NUMERICOS[nome]
+            mascara &= comparacao(self.numericas[coluna], float(valor))
+
+        if filtro.quartos_min is not None:
+            mascara &= self.numericas['quartos'] >= filtro.quartos_min
+
+        if filtro.codigo:
+            mascara &= self.codigos == filtro.codigo
+
+        if filtro.bbox:
+            min_lon, min_lat, max_lon, max_lat = filtro.bbox
+            latitude = self.numericas['latitude']
+            longitude = self.numericas['longitude']
+            mascara &= (latitude >= min_lat) & (latitude <= max_lat)
+            mascara &= (longitude >= min_lon) & (longitude <= max_lon)
+
+        if filtro.raio:
+            # Pré-filtro pelo retângulo; a distância só é calculada para os candidatos
+            lat, lon, raio_km = filtro.raio
+            min_lon, min_lat, max_lon, max_lat = caixa_do_raio(lat, lon, raio_km)
+            latitude = self.numericas['latitude']
+            longitude = self.numericas['longitude']
+            mascara &= (latitude >= min_lat) & (latitude <= max_lat)
+            mascara &= (longitude >= min_lon) & (longitude <= max_lon)
+            candidatos = np.flatnonzero(mascara)
+            mascara[candidatos] = haversine_km(lat, lon, latitude[candidatos], longitude[candidatos]) <= raio_km
+
+        if filtro.poligono is not None:
+            min_lon, min_lat, max_lon, max_lat = filtro.poligono.bounds
+            latitude = self.numericas['latitude']
+            longitude = self.numericas['longitude']
+            mascara &= (latitude >= min_lat) & (latitude <= max_lat)
+            mascara &= (longitude >= min_lon) & (longitude <= max_lon)
+            candidatos = np.flatnonzero(mascara)
+            mascara[candidatos] = dentro_do_poligono(filtro.poligono, latitude[candidatos], longitude[candidatos])
+
+        return mascara
+
+    def selecionar(self, filtro, apenas_mapa=False):
+        """Retorna os índices (em ordem de código) das linhas que atendem ao filtro."""
+        return np.flatnonzero(self.mascara(filtro, apenas_mapa))
+
+    def distancias(self, indices, lat, lon):
+        """Distância (km) de cada linha ao ponto."""
+        return haversine_km(lat, lon, self.numericas['latitude'][indices], self.numericas['longitude'][indices])
+
+    def ordenar(self, indices, campo, decrescente=False, centro=None):
+        """
+        Ordena os índices (já em ordem de código) pelo campo, com desempate
+        por código e nulos por último. Retorna (índices, valores do campo);
+        sem campo, mantém a ordem de código e os valores são None.
+        O campo distancia_km é calculado em relação a centro (lat, lon).
+        """
+        if campo is None:
+            return indices, None
+        if campo == 'distancia_km':
+            chaves = self.distancias(indices, *centro)
+        else:
+            chaves = self.numericas[campo][indices]
+        # argsort estável preserva a ordem de código nos empates; NaN (nulo) vai para o fim
+        ordem = np.argsort(-chaves if decrescente else chaves, kind='stable')
+        return indices[ordem], chaves[ordem]
+
+    def posicao_apos(self, indices, chaves, codigo, valor=None, decrescente=False):
+        """
+        Retorna a posição do primeiro item após o cursor (valor, código) nos
+        índices ordenados por ordenar(), equivalente ao keyset do banco.
+        """
+        codigos = self.codigos[indices]
+        if chaves is None:
+            return int(np.searchsorted(codigos, codigo, side='right'))
+        nulos = np.isnan(chaves)
+        if valor is None:
+            depois = nulos & (codigos > codigo)
+        else:
+            valor = float(valor)
+            alem = chaves < valor if decrescente else chaves > valor
+            depois = alem | ((chaves == valor) & (codigos > codigo)) | nulos
+        return int(np.argmax(depois)) if depois.any() else len(indices)
+
+    def clusters(self, indices, zoom, caixa=None):
+        """
+        Agrupa as linhas em células da grade e retorna (clusters, zoom da grade),
+        com a mesma grade e o mesmo formato de agrupar_em_clusters.
+        """
+        if not len(indices):
+            return [], zoom
+        latitude = self.numericas['latitude'][indices]
+        longitude = self.numericas['longitude'][indices]
+        valor = self.numericas['valor'][indices]
+        if caixa is None:
+            # Sem filtro de região, a grade inicial cobre a área ocupada pelos imóveis
+            caixa = (longitude.min(), latitude.min(), longitude.max(), latitude.max())
+        zoom = zoom_agrupamento(zoom, caixa)
+
+        # Mesma grade em micrograus inteiros do banco (ver clusters.indice_celula)
+        latitude_e6 = np.rint(latitude * ESCALA_COORDENADA).astype(np.int64)
+        longitude_e6 = np.rint(longitude * ESCALA_COORDENADA).astype(np.int64)
+        celulas = np.stack([indice_celula(latitude_e6, zoom), indice_celula(longitude_e6, zoom)], axis=1)
+        chaves, grupo = np.unique(celulas, axis=0, return_inverse=True)
+        grupo = grupo.ravel()
+        quantidade = np.bincount(grupo)
+        soma_lat = np.zeros(len(quantidade), dtype=np.int64)
+        soma_lon = np.zeros(len(quantidade), dtype=np.int64)
+        np.add.at(soma_lat, grupo, latitude_e6)
+        np.add.at(soma_lon, grupo, longitude_e6)
+        valor_min = np.full(len(quantidade), np.nan)
+        np.fmin.at(valor_min, grupo, valor)
+
+        return montar_clusters({
+            (int(chaves[i, 0]), int(chaves[i, 1])): (
+                int(quantidade[i]),
+                int(soma_lat[i]),
+                int(soma_lon[i]),
+                float(valor_min[i]) if np.isfinite(valor_min[i]) else None,
+            )
+            for i in range(len(quantidade))
+        }, zoom)
+
+    def marcadores(self, indices):
+        """Retorna os marcadores (codigo, latitude, longitude, valor, desconto) das linhas."""
+        colunas = [self.codigos[indices].tolist()] + [
+            [None if np.isnan(v) else v for v in self.numericas[coluna][indices].tolist()]
+            for coluna in ('latitude', 'longitude', 'valor', 'desconto')
+        ]
+        return [
+            {'codigo': codigo, 'latitude': lat, 'longitude': lon, 'valor': valor, 'desconto': desconto}
+            for codigo, lat, lon, valor, desconto in zip(*colunas)
+        ]
+
+    def colunas(self, indices, colunas):
+        """Retorna as colunas numéricas informadas restritas às linhas selecionadas."""
+        return {coluna: self.numericas[coluna][indices] for coluna in colunas}
+
+
+_memo = MemoPorVersao(SnapshotColunar.carregar)
+
+
+def obter_snapshot(filtro=None):
+    """
+    Retorna o snapshot do worker, recarregando-o quando a versão dos dados
+    muda. Retorna None se o snapshot estiver desativado (SNAPSHOT_COLUNAR)
+    ou se não suportar o filtro informado.
+    """
+    if not getattr(settings, 'SNAPSHOT_COLUNAR', True):
+        return None
+    if filtro is not None and not SnapshotColunar.suporta(filtro):
+        return None
+    return _memo.obter()
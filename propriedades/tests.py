@@ -1,3 +1,922 @@
-from django.test import TestCase
+import csv
+import io
+import itertools
+import json
+import struct
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+
+from . import tiles
+from .cache_utils import limpar_marca_versao_anterior, obter_ou_calcular, serviu_versao_anterior
+from .exportacao import CAMPOS_EXPORTACAO
+from .filtros import FiltroPropriedades
+from .formatos import CONTENT_TYPE_BINARIO, ESCALA_COORDENADA, empacotar_binario, marcadores_colunares
+from .geo import dentro_do_poligono, haversine_km, ler_poligono, retangulos_dentro
+from .histogramas import BINS_MAXIMO, BINS_PADRAO
+from .marcadores import reconstruir_marcadores
+from .models import Propriedade
+from .ordenacao import ORDENACOES
+from .resumo import reconstruir_resumo_localidades
+from .versao import chave_versionada, incrementar_versao_dados, versao_dados
+
+CACHES_TESTE = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'testes-{alias}'}
+    for alias in ('default', 'mapa')
+}
+
+# Filtros que habilitam cada ordenação (distancia e relevancia exigem raio e busca textual)
+FILTROS_ORDENACAO = {
+    'distancia': {'lat': '-23.5', 'lon': '-46.6', 'raio_km': '200'},
+    'relevancia': {'q': 'casa'},
+}
+FILTRO_PADRAO = {'estado': 'SP,RJ'}
+
+# Combinações de SNAPSHOT_COLUNAR e MARCADORES_MAPA (os três caminhos de consulta)
+CAMINHOS = [(True, True), (True, False), (False, True), (False, False)]
+
+
+def limpar_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+def criar_imovel(codigo, latitude, longitude, valor, **campos):
+    return Propriedade.objects.create(**{
+        'codigo': codigo,
+        'tipo': 'Venda',
+        'tipo_imovel': 'Casa',
+        'endereco': f'Rua {codigo}',
+        'cidade': 'São Paulo',
+        'estado': 'SP',
+        'bairro': 'Centro',
+        'valor': Decimal(valor),
+        'descricao': 'Casa',
+        'latitude': Decimal(latitude),
+        'longitude': Decimal(longitude),
+        **campos,
+    })
+
+
+class FiltroCanonicoTests(SimpleTestCase):
+    """Requisições equivalentes geram a mesma chave de cache; filtros diferentes, chaves diferentes."""
+
+    def chave(self, query, **extras):
+        return FiltroPropriedades.de_request(QueryDict(query)).chave('teste', **extras)
+
+    def test_requisicoes_equivalentes(self):
+        grupos = [
+            ['estado=SP,RJ&valor_min=100000', 'valor_min=100000.00&estado=RJ,%20SP,SP', 'estado=RJ,SP&valor_min=1E%2B5'],
+            ['bbox=-47,-24,-46,-23', 'bbox=-46,-23,-47,-24', 'bbox=-47.0000001,-24,-46,-23'],
+            ['q=Ed%C3%ADcula', 'q=edicula', 'q=%20EDICULA%20'],
+            ['quartos=2', 'quartos=3,2', 'quartos=2,x'],
+            ['estado=SP', 'estado=SP&valor_min=abc', 'estado=SP&desconto_min=1E%2B400', 'estado=SP&bbox=1,2,3'],
+            ['lat=-23.5&lon=-46.6&raio_km=500', 'lat=-23.5000001&lon=-46.6&raio_km=200'],
+        ]
+        for grupo in grupos:
+            with self.subTest(grupo=grupo):
+                self.assertEqual(len({self.chave(query) for query in grupo}), 1)
+
+    def test_filtros_diferentes(self):
+        consultas = [
+            '', 'estado=SP', 'estado=RJ', 'estado=SP,RJ', 'cidade=SP', 'valor_min=1', 'valor_max=1',
+            'quartos=1', 'codigo=1', 'q=casa', 'bbox=-47,-24,-46,-23', 'lat=-23.5&lon=-46.6&raio_km=5',
+        ]
+        self.assertEqual(len({self.chave(query) for query in consultas}), len(consultas))
+
+    def test_extras(self):
+        self.assertEqual(self.chave('estado=SP', page=None), self.chave('estado=SP'))
+        self.assertNotEqual(self.chave('estado=SP', page=2), self.chave('estado=SP'))
+        self.assertNotEqual(self.chave('estado=SP', page=2), self.chave('estado=SP', page_size=2))
+
+    def test_poligono_entra_na_chave(self):
+        filtro = FiltroPropriedades.de_request(QueryDict('estado=SP'))
+        sem_poligono = filtro.chave('teste')
+        filtro.poligono = ler_poligono({'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [0, 1], [0, 0]]]})
+        com_poligono = filtro.chave('teste')
+        filtro.poligono = ler_poligono({'type': 'Polygon', 'coordinates': [[[0, 0], [2, 0], [0, 2], [0, 0]]]})
+        self.assertEqual(len({sem_poligono, com_poligono, filtro.chave('teste')}), 3)
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class PaginacaoPorCursorTests(TestCase):
+    """
+    Percorre todas as páginas de cada ordenação pelo link next e confere que
+    os caminhos de consulta (snapshot colunar, MarcadorMapa e Propriedade)
+    devolvem os mesmos imóveis, na mesma ordem e sem repetições.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(37):
+            Propriedade.objects.create(
+                codigo=f'{1000 + i}',
+                tipo='Venda',
+                tipo_imovel='Casa' if i % 3 else 'Apartamento',
+                endereco=f'Rua {i}',
+                cidade='São Paulo' if i % 2 else 'Rio de Janeiro',
+                estado='SP' if i % 2 else 'RJ',
+                bairro='Centro',
+                # Valores e descontos repetidos (e nulos) para exercitar o desempate por código
+                valor=Decimal(100000 + (i % 5) * 25000),
+                valor_avaliacao=Decimal(200000),
+                desconto=None if i % 7 == 0 else Decimal(i % 4 * 10),
+                descricao='Casa com quintal' if i % 3 else 'Apartamento com varanda',
+                area=None if i % 6 == 0 else Decimal(50 + i % 3 * 10),
+                quartos=1 + i % 3,
+                latitude=Decimal('-23.5') + Decimal(i % 9) / 10,
+                longitude=Decimal('-46.6') + Decimal(i % 4) / 10,
+            )
+        reconstruir_marcadores()
+
+    def setUp(self):
+        incrementar_versao_dados()
+
+    def _percorrer(self, url, params):
+        """Segue os links next até o fim e retorna os códigos na ordem recebida."""
+        codigos = []
+        resposta = self.client.get(url, params)
+        while True:
+            self.assertEqual(resposta.status_code, 200)
+            dados = json.loads(resposta.content)
+            codigos += [item['codigo'] for item in dados['results']]
+            if not dados['next']:
+                return codigos
+            resposta = self.client.get(dados['next'])
+
+    def _codigos_por_caminho(self, url, params):
+        resultados = {}
+        for snapshot, marcadores in CAMINHOS:
+            with self.settings(SNAPSHOT_COLUNAR=snapshot, MARCADORES_MAPA=marcadores):
+                limpar_caches()
+                resultados[(snapshot, marcadores)] = self._percorrer(url, params)
+        return resultados
+
+    def test_ordenacoes_percorridas_ate_o_fim(self):
+        for url in ('/api/propriedades/', '/api/mapa/'):
+            for ordenacao in ORDENACOES:
+                params = {**FILTROS_ORDENACAO.get(ordenacao, FILTRO_PADRAO), 'sort': ordenacao, 'page_size': 4}
+                with self.subTest(url=url, sort=ordenacao):
+                    resultados = self._codigos_por_caminho(url, params)
+                    referencia = resultados[(False, False)]
+                    self.assertTrue(referencia)
+                    self.assertEqual(len(referencia), len(set(referencia)))
+                    for caminho, codigos in resultados.items():
+                        self.assertEqual(codigos, referencia, caminho)
+
+    @override_settings(ALLOWED_HOSTS=['a.exemplo.com', 'b.exemplo.com'])
+    def test_links_relativos_nao_dependem_do_host(self):
+        for url in ('/api/propriedades/', '/api/mapa/'):
+            params = {**FILTRO_PADRAO, 'page_size': 4, 'page': 2}
+            primeira = json.loads(self.client.get(url, params, HTTP_HOST='a.exemplo.com', secure=True).content)
+            # A segunda resposta vem do cache gravado pela primeira
+            segunda = json.loads(self.client.get(url, params, HTTP_HOST='b.exemplo.com').content)
+            with self.subTest(url=url):
+                self.assertTrue(primeira['next'].startswith(f'{url}?'))
+                self.assertTrue(primeira['previous'].startswith(f'{url}?'))
+                self.assertEqual((segunda['next'], segunda['previous']), (primeira['next'], primeira['previous']))
+
+    def test_contagem_max_igual_em_todos_os_caminhos(self):
+        total = Propriedade.objects.filter(estado__in=['SP', 'RJ']).count()
+        for url in ('/api/propriedades/', '/api/mapa/'):
+            for contagem_max, esperado in ((5, (5, False)), (total, (total, True)), (None, (total, True))):
+                params = {**FILTRO_PADRAO, 'page_size': 4}
+                if contagem_max:
+                    params['contagem_max'] = contagem_max
+                for snapshot, marcadores in CAMINHOS:
+                    with self.settings(SNAPSHOT_COLUNAR=snapshot, MARCADORES_MAPA=marcadores):
+                        limpar_caches()
+                        dados = json.loads(self.client.get(url, params).content)
+                    with self.subTest(url=url, contagem_max=contagem_max, snapshot=snapshot, marcadores=marcadores):
+                        self.assertEqual((dados['count'], dados['count_exato']), esperado)
+
+    def test_cursor_de_outra_ordenacao_retorna_400(self):
+        for snapshot, marcadores in CAMINHOS:
+            with self.settings(SNAPSHOT_COLUNAR=snapshot, MARCADORES_MAPA=marcadores):
+                limpar_caches()
+                dados = json.loads(self.client.get(
+                    '/api/propriedades/', {**FILTRO_PADRAO, 'sort': 'valor', 'page_size': 4}
+                ).content)
+                cursor = dados['next'].split('cursor=')[1].split('&')[0]
+                for url in ('/api/propriedades/', '/api/mapa/'):
+                    for params in (
+                        {'sort': 'desconto', 'cursor': cursor},
+                        {'cursor': cursor},
+                        {'sort': 'valor', 'cursor': 'nao-e-um-cursor'},
+                    ):
+                        with self.subTest(url=url, snapshot=snapshot, marcadores=marcadores, **params):
+                            resposta = self.client.get(url, {**FILTRO_PADRAO, 'page_size': 4, **params})
+                            self.assertEqual(resposta.status_code, 400)
+
+
+def decodificar_binario(conteudo):
+    """Lê o buffer de formatos.empacotar_binario de volta em colunas (como o cliente do mapa)."""
+    assinatura, (versao, n) = conteudo[:3], struct.unpack('<BI', conteudo[3:8])
+    posicao = 8
+    colunas = {'assinatura': assinatura, 'versao': versao}
+    for nome, tipo, tamanho in (('lat', 'i', 4), ('lon', 'i', 4), ('valor', 'q', 8), ('desconto', 'i', 4)):
+        colunas[nome] = list(struct.unpack(f'<{n}{tipo}', conteudo[posicao:posicao + n * tamanho]))
+        posicao += n * tamanho
+    colunas['codigos'] = conteudo[posicao:].decode('utf-8').split('\n') if n else []
+    return colunas
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class FormatosMapaTests(TestCase):
+    """Formatos columnar e binário do mapa_api: os mesmos marcadores do JSON, quantizados."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            criar_imovel(
+                f'{8000 + i}', Decimal('-23.5') - Decimal(i) / 1000 + Decimal('0.0000004'),
+                Decimal('-46.6') + Decimal(i) / 100, Decimal('123456.78') + i,
+                desconto=None if i % 4 == 0 else Decimal('12.34') + i,
+            )
+        reconstruir_marcadores()
+
+    def setUp(self):
+        incrementar_versao_dados()
+
+    def _esperado(self, resultados):
+        """Colunas esperadas a partir dos marcadores em JSON (deltas já somados)."""
+        def quantizar(valor, escala):
+            return 0 if valor is None else int((Decimal(str(valor)) * escala).to_integral_value())
+        return {
+            'codigos': [m['codigo'] for m in resultados],
+            'lat': [quantizar(m['latitude'], ESCALA_COORDENADA) for m in resultados],
+            'lon': [quantizar(m['longitude'], ESCALA_COORDENADA) for m in resultados],
+            'valor': [quantizar(m['valor'], 100) for m in resultados],
+            'desconto': [quantizar(m['desconto'], 100) for m in resultados],
+        }
+
+    def _somar_deltas(self, colunas):
+        return {
+            'codigos': colunas['codigos'],
+            'lat': list(itertools.accumulate(colunas['lat'])),
+            'lon': list(itertools.accumulate(colunas['lon'])),
+            'valor': colunas['valor'],
+            'desconto': colunas['desconto'],
+        }
+
+    def test_columnar_e_binario_iguais_ao_json(self):
+        params = {'estado': 'SP', 'page_size': 5, 'sort': 'valor'}
+        for snapshot, marcadores in CAMINHOS:
+            with self.settings(SNAPSHOT_COLUNAR=snapshot, MARCADORES_MAPA=marcadores):
+                limpar_caches()
+                json_ = json.loads(self.client.get('/api/mapa/', params).content)
+                columnar = json.loads(self.client.get('/api/mapa/', {**params, 'format': 'columnar'}).content)
+                binario = self.client.get(
+                    '/api/mapa/', {**params, 'format': 'columnar'}, HTTP_ACCEPT=CONTENT_TYPE_BINARIO
+                )
+            with self.subTest(snapshot=snapshot, marcadores=marcadores):
+                esperado = self._esperado(json_['results'])
+                self.assertEqual(len(esperado['codigos']), 5)
+                self.assertEqual(self._somar_deltas(columnar['columns']), esperado)
+                self.assertEqual(columnar['columns']['escala'], {'coordenada': 1_000_000, 'valor': 100, 'desconto': 100})
+                self.assertEqual(columnar['count'], json_['count'])
+                self.assertEqual(columnar['next'].split('cursor=')[1], json_['next'].split('cursor=')[1])
+
+                self.assertEqual(binario['Content-Type'], CONTENT_TYPE_BINARIO)
+                self.assertEqual(binario['X-Total-Count'], '12')
+                self.assertIn('rel="next"', binario['Link'])
+                colunas = decodificar_binario(binario.content)
+                self.assertEqual((colunas.pop('assinatura'), colunas.pop('versao')), (b'IMV', 1))
+                self.assertEqual(self._somar_deltas(colunas), esperado)
+
+    def test_empacotar_binario(self):
+        colunas = marcadores_colunares([
+            {'codigo': 'á1', 'latitude': Decimal('-23.5000004'), 'longitude': Decimal('-46.6'), 'valor': Decimal('0.01'), 'desconto': None},
+            {'codigo': 'b2', 'latitude': Decimal('89.999999'), 'longitude': Decimal('179.999999'), 'valor': Decimal('99999999999.99'), 'desconto': Decimal('100')},
+        ])
+        self.assertEqual(colunas['lat'], [-23500000, 89999999 + 23500000])
+        self.assertEqual(colunas['valor'], [1, 9999999999999])
+        self.assertEqual(colunas['desconto'], [0, 10000])
+        decodificadas = decodificar_binario(empacotar_binario(colunas))
+        self.assertEqual(
+            {nome: decodificadas[nome] for nome in ('codigos', 'lat', 'lon', 'valor', 'desconto')},
+            {nome: colunas[nome] for nome in ('codigos', 'lat', 'lon', 'valor', 'desconto')}
+        )
+        self.assertEqual(decodificar_binario(empacotar_binario(marcadores_colunares([])))['codigos'], [])
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class ClustersTests(TestCase):
+    """O modo cluster do mapa_api devolve as mesmas células em todos os caminhos de consulta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Pontos exatamente na borda das células do zoom 8 (0,3515625°) e logo ao lado
+        borda_lat, borda_lon = Decimal('-23.203125'), Decimal('-46.40625')
+        for i, (dlat, dlon) in enumerate([(0, 0), (Decimal('-0.000001'), 0), (0, Decimal('-0.000001')), (Decimal('0.1'), Decimal('0.1'))]):
+            criar_imovel(f'{2000 + i}', borda_lat + dlat, borda_lon + dlon, 56250 + i)
+        for i in range(20):
+            criar_imovel(f'{3000 + i}', Decimal('-22.9') + Decimal(i) / 7, Decimal('-43.2') - Decimal(i) / 9, 100000 + i * 1000)
+        reconstruir_marcadores()
+
+    def setUp(self):
+        incrementar_versao_dados()
+
+    def test_clusters_iguais_em_todos_os_caminhos(self):
+        for params in ({'zoom': 8}, {'zoom': 12, 'bbox': '-47,-24,-46,-23'}, {'zoom': 3}):
+            resultados = {}
+            for snapshot, marcadores in CAMINHOS:
+                with self.settings(SNAPSHOT_COLUNAR=snapshot, MARCADORES_MAPA=marcadores):
+                    limpar_caches()
+                    dados = json.loads(self.client.get('/api/mapa/', {'cluster': '1', **params}).content)
+                resultados[(snapshot, marcadores)] = sorted(
+                    (c['count'], c['valor_min'], c['latitude'], c['longitude']) for c in dados['clusters']
+                )
+            with self.subTest(**params):
+                referencia = resultados[(False, False)]
+                self.assertEqual(sum(c[0] for c in referencia), 24 if 'bbox' not in params else 4)
+                for caminho, clusters in resultados.items():
+                    self.assertEqual(clusters, referencia, caminho)
+
+    def test_valor_min_com_duas_casas(self):
+        for snapshot, marcadores in CAMINHOS:
+            with self.settings(SNAPSHOT_COLUNAR=snapshot, MARCADORES_MAPA=marcadores):
+                limpar_caches()
+                dados = json.loads(self.client.get('/api/mapa/', {'cluster': '1', 'zoom': 8}).content)
+            with self.subTest(snapshot=snapshot, marcadores=marcadores):
+                self.assertIn('56250.00', [c['valor_min'] for c in dados['clusters']])
+
+    def test_clusters_limitados_sem_bbox(self):
+        # Sem bbox, a grade parte da área ocupada pelos imóveis e é engrossada até caber no limite
+        with mock.patch('propriedades.clusters.MAXIMO_CLUSTERS', 3):
+            for snapshot, marcadores in CAMINHOS:
+                with self.settings(SNAPSHOT_COLUNAR=snapshot, MARCADORES_MAPA=marcadores):
+                    limpar_caches()
+                    dados = json.loads(self.client.get('/api/mapa/', {'cluster': '1', 'zoom': 13}).content)
+                with self.subTest(snapshot=snapshot, marcadores=marcadores):
+                    self.assertLessEqual(len(dados['clusters']), 3)
+                    self.assertLess(dados['zoom_celulas'], 13)
+                    self.assertEqual(sum(c['count'] for c in dados['clusters']), 24)
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class TilesTests(TestCase):
+    """Tiles calculados sob demanda pelo tiles_api e pré-calculados por gerar_tiles."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Pontos na borda das células e dos tiles do zoom 8 e espalhados por dois estados
+        borda_lat, borda_lon = Decimal('-23.203125'), Decimal('-46.40625')
+        for i, (dlat, dlon) in enumerate([(0, 0), (Decimal('-0.000001'), 0), (0, Decimal('-0.000001'))]):
+            criar_imovel(f'{5000 + i}', borda_lat + dlat, borda_lon + dlon, 80000 + i)
+        for i in range(20):
+            criar_imovel(f'{5100 + i}', Decimal('-22.9') + Decimal(i) / 7, Decimal('-43.2') - Decimal(i) / 9, 100000 + i * 1000)
+
+    def setUp(self):
+        incrementar_versao_dados()
+        limpar_caches()
+
+    def test_tile_sob_demanda_igual_ao_calculado_com_todos_os_imoveis(self):
+        pontos = tiles._carregar_pontos()
+        for zoom in (3, 8, 11, tiles.ZOOM_MAXIMO):
+            esperados = tiles._tiles_do_zoom(pontos, zoom)
+            for (x, y), conteudo in esperados.items():
+                with self.subTest(zoom=zoom, x=x, y=y):
+                    dados = json.loads(self.client.get(f'/api/tiles/{zoom}/{x}/{y}/').content)
+                    self.assertEqual(dados, {**conteudo, 'versao': str(versao_dados())})
+            total = sum(
+                sum(c['count'] for c in conteudo['clusters']) if 'clusters' in conteudo else len(conteudo['results'])
+                for conteudo in esperados.values()
+            )
+            self.assertEqual(total, 23)
+
+    def test_zoom_acima_do_maximo_usa_tile_pai(self):
+        x, y = tiles.tile_do_ponto(-23.203125, -46.40625, tiles.ZOOM_MAXIMO + 2)
+        filho = json.loads(self.client.get(f'/api/tiles/{tiles.ZOOM_MAXIMO + 2}/{x}/{y}/').content)
+        pai = json.loads(self.client.get(f'/api/tiles/{tiles.ZOOM_MAXIMO}/{x >> 2}/{y >> 2}/').content)
+        self.assertEqual(filho, pai)
+        self.assertIn('5000', [m['codigo'] for m in pai['results']])
+
+    def test_tile_vazio_e_tile_invalido(self):
+        self.assertEqual(json.loads(self.client.get('/api/tiles/2/0/0/').content), {'versao': str(versao_dados())})
+        self.assertEqual(self.client.get('/api/tiles/2/4/0/').status_code, 404)
+
+    def test_gerar_tiles_grava_no_cache(self):
+        tiles.gerar_tiles(3)
+        x, y = tiles.tile_do_ponto(-23.2, -46.4, 3)
+        with mock.patch('propriedades.tiles.calcular_tile') as calcular:
+            resposta = self.client.get(f'/api/tiles/3/{x}/{y}/', {'v': tiles.versao_atual()})
+        calcular.assert_not_called()
+        esperado = tiles._tiles_do_zoom(tiles._carregar_pontos(), 3)[(x, y)]
+        self.assertEqual(json.loads(resposta.content), {**esperado, 'versao': tiles.versao_atual()})
+        self.assertIn('immutable', resposta['Cache-Control'])
+
+    def test_nova_versao_recalcula_o_tile(self):
+        x, y = tiles.tile_do_ponto(-23.2, -46.4, 5)
+        antes = json.loads(self.client.get(f'/api/tiles/5/{x}/{y}/').content)
+        criar_imovel('5999', '-23.21', '-46.41', 50000)
+        incrementar_versao_dados()
+        depois = json.loads(self.client.get(f'/api/tiles/5/{x}/{y}/').content)
+        self.assertEqual(
+            sum(c['count'] for c in depois['clusters']),
+            sum(c['count'] for c in antes['clusters']) + 1
+        )
+        self.assertEqual(json.loads(self.client.get('/api/tiles/').content)['versao'], depois['versao'])
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class BuscaGeograficaTests(TestCase):
+    """Busca por raio e por polígono: mesmos imóveis em todos os caminhos de consulta."""
+
+    # Triângulo em longitude/latitude; o vértice (-46.6, -23.5) coincide com um imóvel
+    POLIGONO = {'type': 'Polygon', 'coordinates': [[[-46.6, -23.5], [-46.5, -23.5], [-46.6, -23.4], [-46.6, -23.5]]]}
+
+    @classmethod
+    def setUpTestData(cls):
+        # Grade de 15 x 15 imóveis espaçados de 0,01°
+        for i in range(15):
+            for j in range(15):
+                criar_imovel(
+                    f'{6000 + i * 15 + j}', Decimal('-23.55') + Decimal(i) / 100,
+                    Decimal('-46.65') + Decimal(j) / 100, 100000 + j * 1000
+                )
+        reconstruir_marcadores()
+        cls.coordenadas = {
+            p.codigo: (float(p.latitude), float(p.longitude)) for p in Propriedade.objects.all()
+        }
+
+    def setUp(self):
+        incrementar_versao_dados()
+
+    def _percorrer(self, requisicao):
+        codigos, params = [], {'page_size': 50}
+        while True:
+            dados = json.loads(requisicao(params).content)
+            codigos += [item['codigo'] for item in dados['results']]
+            if not dados['next']:
+                return dados['count'], codigos
+            params = {'page_size': 50, 'cursor': dados['next'].split('cursor=')[1].split('&')[0]}
+
+    def _por_caminho(self, requisicao):
+        resultados = {}
+        for snapshot, marcadores in CAMINHOS:
+            with self.settings(SNAPSHOT_COLUNAR=snapshot, MARCADORES_MAPA=marcadores):
+                limpar_caches()
+                resultados[(snapshot, marcadores)] = self._percorrer(requisicao)
+        return resultados
+
+    def test_busca_por_raio(self):
+        lat, lon, raio_km = -23.5, -46.6, 3
+        esperados = {
+            codigo for codigo, (la, lo) in self.coordenadas.items() if haversine_km(lat, lon, la, lo) <= raio_km
+        }
+        resultados = self._por_caminho(lambda params: self.client.get(
+            '/api/propriedades/', {'lat': lat, 'lon': lon, 'raio_km': raio_km, **params}
+        ))
+        for caminho, (total, codigos) in resultados.items():
+            with self.subTest(caminho=caminho):
+                self.assertEqual(total, len(esperados))
+                self.assertEqual(set(codigos), esperados)
+                # Ordenada por distância
+                self.assertEqual(codigos, resultados[(False, False)][1])
+
+    def test_busca_por_poligono(self):
+        poligono = ler_poligono(self.POLIGONO)
+        esperados = {
+            codigo for codigo, (la, lo) in self.coordenadas.items() if dentro_do_poligono(poligono, la, lo)
+        }
+        resultados = self._por_caminho(lambda params: self.client.post(
+            f'/api/busca/poligono/?page_size={params["page_size"]}' + (f'&cursor={params["cursor"]}' if 'cursor' in params else ''),
+            json.dumps(self.POLIGONO), content_type='application/json'
+        ))
+        # Os pontos da borda (e o vértice) contam como dentro
+        self.assertIn('6080', esperados)
+        for caminho, (total, codigos) in resultados.items():
+            with self.subTest(caminho=caminho):
+                self.assertEqual(total, len(esperados))
+                self.assertEqual(sorted(codigos), sorted(esperados))
+
+    def test_poligono_invalido(self):
+        resposta = self.client.post('/api/busca/poligono/', json.dumps({'type': 'Point', 'coordinates': [0, 0]}),
+                                    content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_retangulos_cobrem_apenas_os_pontos_de_dentro(self):
+        gerador = np.random.default_rng(1)
+        latitudes, longitudes = gerador.uniform(-24, -23, 2000), gerador.uniform(-47, -46, 2000)
+        poligono = ler_poligono({'type': 'Polygon', 'coordinates': [[[-47, -24], [-46, -23.5], [-46.8, -23], [-47, -24]]]})
+        dentro = dentro_do_poligono(poligono, latitudes, longitudes)
+        cobertos = np.zeros(len(dentro), dtype=bool)
+        retangulos = retangulos_dentro(latitudes, longitudes, dentro)
+        for lat_min, lat_max, lon_min, lon_max in retangulos:
+            no_retangulo = (
+                (latitudes >= latitudes[lat_min]) & (latitudes <= latitudes[lat_max])
+                & (longitudes >= longitudes[lon_min]) & (longitudes <= longitudes[lon_max])
+            )
+            self.assertTrue(dentro[no_retangulo].all())
+            cobertos |= no_retangulo
+        np.testing.assert_array_equal(cobertos, dentro)
+        # Bem menos condições que pontos dentro do polígono
+        self.assertLess(len(retangulos), dentro.sum() / 5)
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class FacetasTests(TestCase):
+    """Contagens por opção do /api/facets/ para os mesmos filtros das listagens."""
+
+    IMOVEIS = [
+        # estado, cidade, bairro, tipo_imovel, modalidade_venda, valor
+        ('SP', 'São Paulo', 'Centro', 'Casa', 'Leilão', 100000),
+        ('SP', 'São Paulo', 'Centro', 'Apartamento', 'Venda Direta', 150000),
+        ('SP', 'São Paulo', None, 'Casa', None, 200000),
+        ('SP', 'Campinas', 'Cambuí', 'Apartamento', 'Leilão', 250000),
+        ('RJ', 'Rio de Janeiro', 'Centro', 'Casa', 'Leilão', 300000),
+        ('RJ', 'Niterói', 'Icaraí', 'Apartamento', None, 350000),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, (estado, cidade, bairro, tipo, modalidade, valor) in enumerate(cls.IMOVEIS):
+            criar_imovel(
+                f'{9000 + i}', '-23.5', '-46.6', valor, estado=estado, cidade=cidade,
+                bairro=bairro, tipo_imovel=tipo, modalidade_venda=modalidade,
+            )
+        # Sem coordenadas: fora das listagens e, portanto, das facetas
+        Propriedade.objects.filter(pk=criar_imovel('9100', '0', '0', 100000).pk).update(latitude=None, longitude=None)
+
+    def setUp(self):
+        incrementar_versao_dados()
+        limpar_caches()
+
+    def _esperado(self, imoveis):
+        campos = ['estado', 'cidade', 'bairro', 'tipo_imovel', 'modalidade_venda']
+        esperado = {'count': len(imoveis)}
+        for i, campo in enumerate(campos):
+            contagens = {}
+            for imovel in imoveis:
+                contagens[imovel[i]] = contagens.get(imovel[i], 0) + 1
+            esperado[campo] = [
+                {'valor': valor, 'count': total}
+                for valor, total in sorted(contagens.items(), key=lambda item: (item[0] is None, item[0] or ''))
+            ]
+        return esperado
+
+    def test_contagens_por_opcao(self):
+        for params, imoveis in (
+            ({}, self.IMOVEIS),
+            ({'estado': 'SP'}, [i for i in self.IMOVEIS if i[0] == 'SP']),
+            ({'valor_min': '200000', 'tipo_imovel': 'Casa'}, [i for i in self.IMOVEIS if i[5] >= 200000 and i[3] == 'Casa']),
+            ({'estado': 'MG'}, []),
+        ):
+            with self.subTest(**params):
+                resposta = self.client.get('/api/facets/', params)
+                self.assertEqual(json.loads(resposta.content), self._esperado(imoveis))
+                self.assertTrue(resposta.has_header('ETag'))
+
+    def test_nulos_por_ultimo(self):
+        dados = json.loads(self.client.get('/api/facets/', {'estado': 'SP'}).content)
+        self.assertEqual(dados['bairro'][-1], {'valor': None, 'count': 1})
+        self.assertEqual([b['valor'] for b in dados['bairro']], ['Cambuí', 'Centro', None])
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class HistogramasTests(TestCase):
+    """Histogramas do /api/histogramas/: mesmos bins com e sem o snapshot colunar."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            criar_imovel(
+                f'{9500 + i}', '-23.5', '-46.6', 100000 + i * 10000,
+                estado='SP' if i < 20 else 'RJ',
+                desconto=None if i % 5 == 0 else Decimal(i),
+                area_privativa=None if i % 3 == 0 else Decimal(40 + i),
+            )
+
+    def setUp(self):
+        incrementar_versao_dados()
+
+    def _histogramas(self, params):
+        resultados = {}
+        for snapshot in (True, False):
+            with self.settings(SNAPSHOT_COLUNAR=snapshot):
+                limpar_caches()
+                resultados[snapshot] = json.loads(self.client.get('/api/histogramas/', params).content)
+        self.assertEqual(resultados[True], resultados[False])
+        return resultados[False]
+
+    def test_bins_e_nulos(self):
+        dados = self._histogramas({'estado': 'SP', 'bins': 4})
+        valor = dados['valor']
+        self.assertEqual((valor['count'], valor['nulos'], valor['min'], valor['max']), (20, 0, 100000.0, 290000.0))
+        self.assertEqual([b['count'] for b in valor['bins']], [5, 5, 5, 5])
+        self.assertEqual((valor['bins'][0]['inicio'], valor['bins'][0]['fim']), (100000.0, 147500.0))
+        self.assertEqual((dados['desconto']['count'], dados['desconto']['nulos']), (16, 4))
+        self.assertEqual((dados['area_privativa']['count'], dados['area_privativa']['nulos']), (13, 7))
+        self.assertEqual(sum(b['count'] for b in dados['desconto']['bins']), 16)
+
+    def test_sem_resultados(self):
+        dados = self._histogramas({'estado': 'MG'})
+        self.assertEqual(dados['valor'], {'count': 0, 'nulos': 0, 'min': None, 'max': None, 'bins': []})
+
+    def test_quantidade_de_bins_limitada(self):
+        for bins, esperado in (('0', 1), ('1000', BINS_MAXIMO), ('abc', BINS_PADRAO)):
+            with self.subTest(bins=bins):
+                dados = self._histogramas({'bins': bins})
+                self.assertEqual(len(dados['valor']['bins']), esperado)
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class AutocompleteTests(TestCase):
+    """Sugestões do /api/autocomplete/: prefixo sem acento, erro de digitação e filtros."""
+
+    @classmethod
+    def setUpTestData(cls):
+        localidades = [
+            ('SP', 'São Paulo', 'Vila Mariana', 3),
+            ('SP', 'São Paulo', 'Centro', 2),
+            ('SP', 'São José dos Campos', 'Centro', 1),
+            ('SP', 'Santos', 'Gonzaga', 1),
+            ('RJ', 'Rio de Janeiro', 'Copacabana', 2),
+        ]
+        codigo = 9700
+        for estado, cidade, bairro, quantidade in localidades:
+            for _ in range(quantidade):
+                criar_imovel(str(codigo), '-23.5', '-46.6', 100000, estado=estado, cidade=cidade, bairro=bairro)
+                codigo += 1
+        reconstruir_resumo_localidades()
+
+    def setUp(self):
+        incrementar_versao_dados()
+
+    def sugerir(self, **params):
+        return [
+            (s['tipo'], s['cidade'], s['bairro'], s['count'])
+            for s in json.loads(self.client.get('/api/autocomplete/', params).content)['results']
+        ]
+
+    def test_prefixo_sem_acento(self):
+        self.assertEqual(self.sugerir(q='sao', tipo='cidade'), [
+            ('cidade', 'São Paulo', None, 5),
+            ('cidade', 'São José dos Campos', None, 1),
+        ])
+
+    def test_prefixo_de_outra_palavra(self):
+        self.assertEqual(self.sugerir(q='jose'), [('cidade', 'São José dos Campos', None, 1)])
+        self.assertEqual(self.sugerir(q='mari')[0], ('bairro', 'São Paulo', 'Vila Mariana', 3))
+
+    def test_erro_de_digitacao(self):
+        self.assertEqual(self.sugerir(q='copacabna'), [('bairro', 'Rio de Janeiro', 'Copacabana', 2)])
+
+    def test_filtros_e_limite(self):
+        self.assertEqual(self.sugerir(q='centro', estado='RJ'), [])
+        self.assertEqual(
+            self.sugerir(q='centro', estado='SP'),
+            [('bairro', 'São Paulo', 'Centro', 2), ('bairro', 'São José dos Campos', 'Centro', 1)]
+        )
+        self.assertEqual(len(self.sugerir(q='s')), 3)
+        self.assertEqual(self.sugerir(q='s', limite='1'), self.sugerir(q='s')[:1])
+        self.assertEqual(self.sugerir(q='s', limite='abc'), self.sugerir(q='s'))
+        self.assertEqual(self.sugerir(q=''), [])
+
+    def test_indice_recarregado_na_nova_versao(self):
+        self.assertEqual(self.sugerir(q='campinas'), [])
+        criar_imovel('9800', '-22.9', '-47.1', 100000, cidade='Campinas', bairro='Cambuí')
+        reconstruir_resumo_localidades('SP')
+        incrementar_versao_dados()
+        self.assertEqual(self.sugerir(q='campinas'), [('cidade', 'Campinas', None, 1)])
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class ExportacaoTests(TestCase):
+    """Exportação em NDJSON e CSV: resposta em streaming, em pedaços, com os mesmos imóveis da listagem."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(11):
+            criar_imovel(
+                f'{9900 + i}', Decimal('-23.5') + Decimal(i) / 100, '-46.6', 100000 + (i % 4) * 5000,
+                bairro=None if i % 3 == 0 else 'Água Branca', desconto=Decimal('10.50') if i % 2 else None,
+            )
+        # Sem coordenadas: fica fora da exportação, como nas listagens
+        Propriedade.objects.filter(pk=criar_imovel('9999', '0', '0', 100000).pk).update(latitude=None, longitude=None)
+
+    def setUp(self):
+        incrementar_versao_dados()
+
+    def _exportar(self, **params):
+        resposta = self.client.get('/api/exportar/', params)
+        self.assertTrue(resposta.streaming)
+        return resposta, [pedaco.decode('utf-8') for pedaco in resposta.streaming_content]
+
+    def test_ndjson_em_pedacos(self):
+        with mock.patch('propriedades.exportacao.LINHAS_POR_PEDACO', 4):
+            resposta, pedacos = self._exportar(estado='SP', sort='valor')
+        self.assertEqual(resposta['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(resposta['Content-Disposition'], 'attachment; filename="imoveis.ndjson"')
+        # Primeira linha sozinha e depois pedaços de até LINHAS_POR_PEDACO linhas
+        self.assertEqual([pedaco.count('\n') for pedaco in pedacos], [1, 4, 4, 2])
+
+        itens = [json.loads(linha) for linha in ''.join(pedacos).splitlines()]
+        esperados = list(Propriedade.objects.filter(latitude__isnull=False).order_by('valor', 'codigo').values_list(
+            'codigo', flat=True
+        ))
+        self.assertEqual([item['codigo'] for item in itens], esperados)
+        self.assertEqual(list(itens[0]), CAMPOS_EXPORTACAO)
+        imovel = Propriedade.objects.get(codigo=itens[1]['codigo'])
+        # Decimais como string, como no propriedades_api
+        self.assertEqual(itens[1]['valor'], str(imovel.valor))
+        self.assertEqual(itens[1]['bairro'], imovel.bairro)
+
+    def test_csv(self):
+        resposta, pedacos = self._exportar(estado='SP', format='csv')
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        linhas = list(csv.reader(io.StringIO(''.join(pedacos))))
+        self.assertEqual(linhas[0], CAMPOS_EXPORTACAO)
+        self.assertEqual(len(linhas), 12)
+        por_codigo = {linha[0]: dict(zip(linhas[0], linha)) for linha in linhas[1:]}
+        self.assertEqual(por_codigo['9900']['bairro'], '')
+        self.assertEqual(por_codigo['9901']['bairro'], 'Água Branca')
+        self.assertEqual((por_codigo['9901']['desconto'], por_codigo['9900']['desconto']), ('10.50', ''))
+
+    def test_raio_acrescenta_distancia(self):
+        _, pedacos = self._exportar(lat='-23.5', lon='-46.6', raio_km='3')
+        itens = [json.loads(linha) for linha in ''.join(pedacos).splitlines()]
+        self.assertEqual([item['codigo'] for item in itens], ['9900', '9901', '9902'])
+        self.assertEqual(list(itens[0])[-1], 'distancia_km')
+        self.assertLess(itens[0]['distancia_km'], itens[-1]['distancia_km'])
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get('/api/exportar/', {'format': 'xlsx'}).status_code, 400)
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class LeituraCondicionalTests(TestCase):
+    """ETag, Last-Modified e 304 das APIs de leitura."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.imovel = criar_imovel('4000', '-23.5', '-46.6', 150000)
+        criar_imovel('4001', '-23.6', '-46.7', 250000)
+
+    def setUp(self):
+        incrementar_versao_dados()
+        limpar_caches()
+
+    def test_304_com_vary_e_cache_control(self):
+        resposta = self.client.get('/api/propriedades/', {'estado': 'SP'})
+        self.assertEqual(resposta.status_code, 200)
+        repetida = self.client.get('/api/propriedades/', {'estado': 'SP'}, HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+        for resposta_atual in (resposta, repetida):
+            self.assertIn('no-cache', resposta_atual['Cache-Control'])
+            self.assertIn('Accept-Encoding', resposta_atual['Vary'])
+            self.assertIn('Accept', resposta_atual['Vary'])
+
+    def test_nova_versao_invalida_etag_da_listagem(self):
+        etag = self.client.get('/api/propriedades/', {'estado': 'SP'})['ETag']
+        incrementar_versao_dados()
+        resposta = self.client.get('/api/propriedades/', {'estado': 'SP'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+
+    def test_detalhes_usam_data_atualizacao_do_imovel(self):
+        url = f'/api/propriedades/{self.imovel.codigo}/'
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        self.imovel.refresh_from_db()
+        self.assertEqual(resposta['Last-Modified'], http_date(self.imovel.data_atualizacao.timestamp()))
+
+        # Outra importação ou outro imóvel alterado não invalidam os detalhes deste
+        incrementar_versao_dados()
+        Propriedade.objects.get(codigo='4001').save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 304)
+
+        self.imovel.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 200)
+
+    def test_detalhes_de_imovel_inexistente(self):
+        self.assertEqual(self.client.get('/api/propriedades/nao-existe/').status_code, 404)
+
+
+@override_settings(CACHES=CACHES_TESTE, GEMINI_API_KEY='teste')
+class AnaliseMatriculaTests(TestCase):
+    """Salvar a análise da matrícula atualiza só o imóvel, sem trocar a versão global."""
+
+    def setUp(self):
+        self.imovel = criar_imovel('5000', '-23.5', '-46.6', 150000)
+        incrementar_versao_dados()
+        limpar_caches()
+
+    def test_analise_invalida_apenas_os_detalhes_do_imovel(self):
+        url = f'/api/propriedades/{self.imovel.codigo}/'
+        antes = self.client.get(url)
+        self.assertIsNone(json.loads(antes.content)['analise_matricula'])
+        versao = versao_dados()
+
+        resposta_gemini = mock.Mock(ok=True, status_code=200, headers={})
+        resposta_gemini.json.return_value = {'candidates': [{'content': {'parts': [{'text': 'Sem ônus'}]}}]}
+        with tempfile.TemporaryDirectory() as diretorio, self.settings(BASE_DIR=diretorio), \
+                mock.patch('propriedades.views.requests.post', return_value=resposta_gemini):
+            resposta = self.client.post(
+                '/api/analisar-matricula/',
+                json.dumps({'codigo': self.imovel.codigo, 'matricula_url': 'https://exemplo.com/m.pdf'}),
+                content_type='application/json'
+            )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(versao_dados(), versao)
+
+        depois = self.client.get(url, HTTP_IF_NONE_MATCH=antes['ETag'])
+        self.assertEqual(depois.status_code, 200)
+        self.assertEqual(json.loads(depois.content)['analise_matricula'], 'Sem ônus')
+
+
+@override_settings(CACHES=CACHES_TESTE)
+class ObterOuCalcularTests(TestCase):
+    """Single-flight do cache versionado e o valor da versão anterior logo após uma nova versão."""
+
+    def setUp(self):
+        incrementar_versao_dados()
+        limpar_caches()
+        limpar_marca_versao_anterior()
+        versao_dados()
+
+    def test_um_unico_calculo_por_chave(self):
+        chamadas = []
+        barreira = threading.Barrier(6)
+
+        def calcular():
+            chamadas.append(1)
+            time.sleep(0.2)
+            return 'valor'
+
+        def requisicao():
+            barreira.wait()
+            resultados.append(obter_ou_calcular(chave_versionada('single_flight'), calcular))
+
+        resultados = []
+        threads = [threading.Thread(target=requisicao) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(chamadas), 1)
+        self.assertEqual(resultados, ['valor'] * 6)
+
+    def test_versao_anterior_servida_durante_o_recalculo(self):
+        obter_ou_calcular(chave_versionada('lista'), lambda: 'antigo')
+        incrementar_versao_dados()
+        chave = chave_versionada('lista')
+        # Outra requisição está calculando a chave da nova versão
+        caches['default'].add(f'{chave}:trava', 1)
+        calcular = mock.Mock(return_value='novo')
+        self.assertEqual(obter_ou_calcular(chave, calcular), 'antigo')
+        calcular.assert_not_called()
+        self.assertTrue(serviu_versao_anterior())
+
+        caches['default'].delete(f'{chave}:trava')
+        limpar_marca_versao_anterior()
+        self.assertEqual(obter_ou_calcular(chave, calcular), 'novo')
+        self.assertFalse(serviu_versao_anterior())
+
+    def test_resposta_da_versao_anterior_sem_etag_e_sem_gravar_derivados(self):
+        self.client.get('/api/estados/')
+        criar_imovel('7000', '-23.5', '-46.6', 150000)
+        self.client.get('/api/mapa/', {'estado': 'SP'}, HTTP_ACCEPT_ENCODING='gzip')
+        # Chave do mapa_api gravada na versão atual (o locmem guarda ':1:<chave>')
+        anterior = next(k for k in caches['mapa']._cache if k.endswith(':identity'))[3:-len(':identity')]
+        versao = versao_dados()
+        incrementar_versao_dados()
+        trava_estados = f"{chave_versionada('estados_list')}:trava"
+        chave_mapa = anterior.replace(f'_v{versao}', f'_v{versao + 1}')
+        caches['default'].add(trava_estados, 1)
+        caches['mapa'].add(f'{chave_mapa}:identity:trava', 1)
+
+        estados = self.client.get('/api/estados/')
+        self.assertEqual(estados.status_code, 200)
+        self.assertFalse(estados.has_header('ETag'))
+        self.assertIn('no-store', estados['Cache-Control'])
+
+        mapa = self.client.get('/api/mapa/', {'estado': 'SP'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(mapa['Content-Encoding'], 'gzip')
+        self.assertFalse(mapa.has_header('ETag'))
+        # O gzip foi feito sobre os bytes da versão anterior: não pode ficar na chave da nova
+        self.assertIsNone(caches['mapa'].get(f'{chave_mapa}:gzip'))
+
+
+class BackendCacheTests(TestCase):
+    """A falta do pacote do backend de cache é apontada ao iniciar a aplicação."""
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}})
+    def test_pacote_ausente(self):
+        with mock.patch('importlib.util.find_spec', return_value=None):
+            with self.assertRaisesMessage(ImproperlyConfigured, "requer o pacote 'redis'"):
+                apps.get_app_config('propriedades').ready()
+
+    def test_backend_sem_dependencias(self):
+        with mock.patch('importlib.util.find_spec', return_value=None):
+            apps.get_app_config('propriedades').ready()
@@ -0,0 +1,170 @@
+import logging
+import math
+import time
+from decimal import Decimal
+
+from .cache_utils import obter_ou_calcular
+from .clusters import CELULAS_POR_TILE, ZOOM_MARCADORES_INDIVIDUAIS, formatar_valor, indice_celula, tamanho_celula
+from .formatos import ESCALA_COORDENADA
+from .models import Propriedade
+from .resposta_cache import serializar_json
+from .versao import chave_versionada, versao_dados
+
+logger = logging.getLogger(__name__)
+
+# Maior zoom com tiles próprios; zooms maiores são servidos pelo tile pai neste nível
+ZOOM_MAXIMO = ZOOM_MARCADORES_INDIVIDUAIS
+
+# Zooms pré-calculados por gerar_tiles; os demais tiles são calculados na
+# primeira requisição e ficam no cache 'mapa' até a próxima versão dos dados
+ZOOM_PRE_CALCULADO = 7
+
+
+def tile_do_ponto(lat, lon, zoom):
+    """Converte latitude/longitude no par (x, y) do tile (Web Mercator)."""
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_pai(z, x, y, zoom):
+    """Retorna o tile ancestral de (z, x, y) no zoom informado."""
+    deslocamento = z - zoom
+    return zoom, x >> deslocamento, y >> deslocamento
+
+
+def tile_valido(z, x, y):
+    return z >= 0 and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def caixa_do_tile(z, x, y):
+    """Retorna a área (min_lon, min_lat, max_lon, max_lat) coberta pelo tile."""
+    n = 2 ** z
+
+    def latitude(linha):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * linha / n))))
+
+    return x / n * 360.0 - 180.0, latitude(y + 1), (x + 1) / n * 360.0 - 180.0, latitude(y)
+
+
+def versao_atual():
+    """Os tiles acompanham a versão dos dados (ver versao.py)."""
+    return str(versao_dados())
+
+
+def chave_tile(z, x, y):
+    return chave_versionada(f'tile_{z}_{x}_{y}')
+
+
+def _carregar_pontos(caixa=None):
+    pontos = Propriedade.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False
+    ).exclude(latitude=0).exclude(longitude=0)
+    if caixa is not None:
+        min_lon, min_lat, max_lon, max_lat = caixa
+        pontos = pontos.filter(
+            latitude__gte=min_lat, latitude__lte=max_lat,
+            longitude__gte=min_lon, longitude__lte=max_lon,
+        )
+    return list(pontos.values_list(
+        'codigo', 'latitude', 'longitude', 'valor', 'desconto', 'tipo_imovel'
+    ).order_by('codigo'))
+
+
+def _tiles_de_clusters(pontos, zoom):
+    """Agrupa os pontos em células da grade e distribui as células pelos tiles."""
+    celulas = {}
+    for codigo, lat, lon, valor, desconto, tipo in pontos:
+        # Mesma grade em micrograus inteiros do mapa_api (ver clusters.indice_celula)
+        chave = (
+            indice_celula(int(round(Decimal(lat) * ESCALA_COORDENADA)), zoom),
+            indice_celula(int(round(Decimal(lon) * ESCALA_COORDENADA)), zoom),
+        )
+        lat, lon = float(lat), float(lon)
+        grupo = celulas.get(chave)
+        if grupo is None:
+            celulas[chave] = [1, lat, lon, valor]
+        else:
+            grupo[0] += 1
+            grupo[1] += lat
+            grupo[2] += lon
+            if valor < grupo[3]:
+                grupo[3] = valor
+
+    tiles = {}
+    for chave in sorted(celulas):
+        total, soma_lat, soma_lon, valor_min = celulas[chave]
+        lat, lon = soma_lat / total, soma_lon / total
+        tiles.setdefault(tile_do_ponto(lat, lon, zoom), []).append({
+            'latitude': round(lat, 6),
+            'longitude': round(lon, 6),
+            'count': total,
+            'valor_min': formatar_valor(valor_min),
+        })
+    return {xy: {'clusters': clusters} for xy, clusters in tiles.items()}
+
+
+def _tiles_de_marcadores(pontos, zoom):
+    tiles = {}
+    for codigo, lat, lon, valor, desconto, tipo in pontos:
+        tiles.setdefault(tile_do_ponto(float(lat), float(lon), zoom), []).append({
+            'codigo': codigo,
+            'latitude': float(lat),
+            'longitude': float(lon),
+            'valor': str(valor),
+            'desconto': str(desconto or 0),
+            'tipo_imovel': tipo,
+        })
+    return {xy: {'results': marcadores} for xy, marcadores in tiles.items()}
+
+
+def _tiles_do_zoom(pontos, zoom):
+    if zoom < ZOOM_MARCADORES_INDIVIDUAIS:
+        return _tiles_de_clusters(pontos, zoom)
+    return _tiles_de_marcadores(pontos, zoom)
+
+
+def _entrada(conteudo):
+    return serializar_json({**conteudo, 'versao': versao_atual()})
+
+
+def calcular_tile(z, x, y):
+    """
+    Calcula um tile (no formato de serializar_json) a partir dos imóveis da
+    sua área. A área é ampliada em uma célula para cada lado, para que as
+    células que cruzam a borda tenham o mesmo centro e contagem calculados
+    por gerar_tiles a partir de todos os imóveis.
+    """
+    margem = float(tamanho_celula(z))
+    min_lon, min_lat, max_lon, max_lat = caixa_do_tile(z, x, y)
+    pontos = _carregar_pontos((min_lon - margem, min_lat - margem, max_lon + margem, max_lat + margem))
+    return _entrada(_tiles_do_zoom(pontos, z).get((x, y), {}))
+
+
+def gerar_tiles(zoom_maximo=ZOOM_PRE_CALCULADO):
+    """
+    Pré-calcula, a partir de uma única leitura do banco, os tiles com imóveis
+    dos zooms 0 a zoom_maximo no cache 'mapa' (com as chaves da versão atual
+    dos dados). É só um aquecimento: qualquer tile ausente é calculado pelo
+    tiles_api na primeira requisição. Retorna a versão dos tiles gerados.
+    """
+    inicio = time.time()
+    pontos = _carregar_pontos()
+
+    total_tiles = 0
+    for zoom in range(min(zoom_maximo, ZOOM_MAXIMO) + 1):
+        tiles = _tiles_do_zoom(pontos, zoom)
+        for (x, y), conteudo in tiles.items():
+            obter_ou_calcular(f'{chave_tile(zoom, x, y)}:identity', lambda: _entrada(conteudo), cache_alias='mapa')
+        total_tiles += len(tiles)
+
+    versao = versao_atual()
+    logger.info(
+        f"Tiles pré-calculados: {total_tiles} tiles (zooms 0 a {zoom_maximo}) para {len(pontos)} imóveis "
+        f"em {time.time() - inicio:.1f}s (versão {versao}, {CELULAS_POR_TILE} células por tile)"
+    )
+    return versao
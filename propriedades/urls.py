@@ -6,10 +6,19 @@ urlpatterns = [
     path('', RedirectView.as_view(url='mapa/', permanent=True), name='index'),
     path('mapa/', views.mapa_view, name='mapa'),
     path('api/mapa/', views.mapa_api, name='mapa_api'),
+    path('api/tiles/', views.tiles_indice_api, name='tiles_indice_api'),
+    path('api/tiles/<int:z>/<int:x>/<int:y>/', views.tiles_api, name='tiles_api'),
     path('api/propriedades/', views.propriedades_api, name='propriedades_api'),
+    path('api/exportar/', views.exportar_api, name='exportar_api'),
+    path('api/busca/poligono/', views.busca_poligono_api, name='busca_poligono_api'),
     path('api/propriedades/<str:codigo>/', views.propriedade_detalhes_api, name='propriedade_detalhes_api'),
+    path('api/facets/', views.facetas_api, name='facetas_api'),
+    path('api/histogramas/', views.histogramas_api, name='histogramas_api'),
     path('api/cidades/<str:estado>/', views.cidades_api, name='cidades_api'),
     path('api/bairros/<str:cidade>/', views.bairros_api, name='bairros_api'),
+    path('api/bairros/<str:estado>/<str:cidade>/', views.bairros_api, name='bairros_estado_api'),
+    path('api/localidades/', views.localidades_api, name='localidades_api'),
+    path('api/autocomplete/', views.autocomplete_api, name='autocomplete_api'),
     path('api/estados/', views.estados_api, name='estados_api'),
     path('api/tipos-imovel/', views.tipos_imovel_api, name='tipos_imovel_api'),
     path('api/analisar-matricula/', views.analisar_matricula, name='analisar_matricula'),
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import VersaoDados
+
+# As entradas versionadas só se tornam inválidas quando a versão muda, então
+# podem viver bem mais que os TTLs fixos antigos (o TTL apenas limpa versões antigas)
+TIMEOUT_CACHE_VERSIONADO = 60 * 60 * 24
+
+# Por quanto tempo (segundos) cada worker reaproveita a versão lida do banco
+TTL_VERSAO_LOCAL = getattr(settings, 'VERSAO_DADOS_TTL', 5)
+
+_versao_local = {'versao': None, 'atualizado_em': None, 'lida_em': 0.0}
+
+
+def _ler_versao():
+    agora = time.monotonic()
+    if _versao_local['versao'] is None or agora - _versao_local['lida_em'] > TTL_VERSAO_LOCAL:
+        linha = VersaoDados.objects.filter(pk=1).values_list('versao', 'atualizado_em').first()
+        versao, atualizado_em = linha or (None, None)
+        _versao_local['versao'] = versao or 1
+        _versao_local['atualizado_em'] = atualizado_em
+        _versao_local['lida_em'] = agora
+    return _versao_local
+
+
+def versao_dados():
+    """
+    Retorna a versão atual do conjunto de dados.
+
+    A versão é lida do banco no máximo uma vez a cada TTL_VERSAO_LOCAL
+    segundos por worker; um incremento feito por outro processo (importador,
+    scripts) é percebido por todos os workers dentro desse intervalo.
+    """
+    return _ler_versao()['versao']
+
+
+def data_versao():
+    """
+    Retorna quando a versão atual foi criada (ou None, se nunca foi
+    incrementada). Como a versão é incrementada depois de cada carga, a data
+    não é anterior ao data_atualizacao de nenhum imóvel alterado até ali.
+    Compartilha a leitura (e o TTL) de versao_dados().
+    """
+    return _ler_versao()['atualizado_em']
+
+
+def incrementar_versao_dados():
+    """Incrementa a versão do conjunto de dados, invalidando todas as entradas de cache."""
+    VersaoDados.objects.get_or_create(pk=1)
+    VersaoDados.objects.filter(pk=1).update(versao=F('versao') + 1, atualizado_em=timezone.now())
+    _versao_local['versao'] = None
+    return versao_dados()
+
+
+def chave_versionada(chave):
+    """Acrescenta a versão atual dos dados à chave de cache."""
+    return f"{chave}_v{versao_dados()}"
+
+
+def chave_versao_anterior(chave):
+    """
+    Retorna a chave equivalente da versão anterior dos dados para uma chave
+    montada por chave_versionada (com ou sem sufixo ':...' depois da versão),
+    ou None se a chave não for da versão atual.
+    """
+    versao = versao_dados()
+    sufixo = f"_v{versao}"
+    posicao = chave.rfind(sufixo)
+    fim = posicao + len(sufixo)
+    if versao <= 1 or posicao < 0 or chave[fim:fim + 1] not in ('', ':'):
+        return None
+    return f"{chave[:posicao]}_v{versao - 1}{chave[fim:]}"
+
+
+class MemoPorVersao:
+    """
+    Valor mantido em memória por worker (snapshot, índices, fragmentos) e
+    recriado por `carregar(versao)` quando a versão dos dados muda. Só uma
+    thread recria o valor; as demais esperam por ele em vez de recriá-lo também.
+    """
+
+    def __init__(self, carregar):
+        self._carregar = carregar
+        # ((versão, data), valor) juntos, para que a leitura sem trava nunca os misture
+        self._atual = None
+        self._trava = threading.Lock()
+
+    def obter(self):
+        # A data da versão também entra na comparação: se o banco for restaurado
+        # (ou uma transação desfeita) e o contador voltar a um número já visto,
+        # o valor guardado daquela época não é reaproveitado
+        leitura = _ler_versao()
+        chave = (leitura['versao'], leitura['atualizado_em'])
+        atual = self._atual
+        if atual is not None and atual[0] == chave:
+            return atual[1]
+
+        with self._trava:
+            atual = self._atual
+            if atual is None or atual[0] != chave:
+                atual = (chave, self._carregar(chave[0]))
+                self._atual = atual
+        return atual[1]
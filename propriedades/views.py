@@ -1,11 +1,12 @@
 from django.shortcuts import render
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from .models import Propriedade
-from django.db.models import Q
+from .models import Propriedade, ResumoLocalidade
+from django.db.models import Q, Count
 import requests
 import json
+import logging
 from django.conf import settings
 import os
 import uuid
@@ -14,41 +15,273 @@ import time
 from django.contrib.auth.decorators import login_required
 from django.http import Http404
 import random
+import base64
+import numpy as np
+import gzip
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import viewsets
 from .serializers import PropriedadeSerializer
-from django.core.cache import cache
+from .clusters import agrupar_em_clusters, ZOOM_MARCADORES_INDIVIDUAIS
+from . import tiles
+from .filtros import FiltroPropriedades
+from .versao import chave_versionada, versao_dados
+from .condicional import data_imovel, leitura_condicional, leitura_condicional_imovel
+from .resposta_cache import resposta_em_cache, serializar_json
+from .cache_utils import limpar_marca_versao_anterior, obter_ou_calcular, serviu_versao_anterior
+from .histogramas import calcular_histogramas, BINS_PADRAO, BINS_MAXIMO, COLUNAS_HISTOGRAMA
+from .formatos import marcadores_colunares, empacotar_binario, campo_escalado, desescalar, CONTENT_TYPE_BINARIO
+from . import marcadores as marcadores_mapa
+from .snapshot import obter_snapshot
+from .ordenacao import ORDENACOES, ORDENACAO_PADRAO, filtrar_apos, ler_ordenacao, ordenar, texto_valor, valor_do_item
+from .geo import caixa_do_raio, ler_poligono, PoligonoInvalido
+from .autocomplete import obter_indice, LIMITE_PADRAO, LIMITE_MAXIMO
+from .fragmentos import ListaFragmentos, acrescentar_campos, obter_fragmentos
+from .exportacao import CAMPOS_EXPORTACAO, FORMATOS_EXPORTACAO, gerar_exportacao
 from django.http import HttpRequest
 from django.http import QueryDict
 
+logger = logging.getLogger(__name__)
+
 # Create your views here.
 
+class CursorInvalido(ValueError):
+    pass
+
+def _codificar_cursor(dados):
+    """Gera um cursor opaco a partir da posição do último item da página"""
+    texto = json.dumps(dados, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+def _decodificar_cursor(cursor):
+    """Decodifica um cursor gerado por _codificar_cursor"""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        dados = json.loads(texto)
+        if not isinstance(dados, dict) or 'codigo' not in dados:
+            raise ValueError
+        return dados
+    except (ValueError, TypeError):
+        raise CursorInvalido(cursor)
+
+def _posicao_cursor(request, ordenacao):
+    """Lê o cursor da requisição, que deve ter sido gerado para a mesma ordenação"""
+    posicao = _decodificar_cursor(request.GET['cursor'])
+    if posicao.get('sort', ORDENACAO_PADRAO) != ordenacao:
+        raise CursorInvalido(request.GET['cursor'])
+    return posicao
+
+def _paginar(request, queryset, page_size, ordenacao=ORDENACAO_PADRAO):
+    """
+    Pagina o queryset na ordenação informada (ver ordenacao.py) e retorna
+    (itens, next, previous).
+
+    Com o parâmetro `cursor` a página é obtida por keyset (valor de ordenação
+    e código após os do último item visto), sem OFFSET, de forma que páginas
+    profundas custam o mesmo que a primeira. O parâmetro `page` continua
+    aceito para compatibilidade. O link `next` é sempre uma URL com cursor.
+    """
+    queryset = ordenar(queryset, ordenacao)
+
+    if request.GET.get('cursor'):
+        posicao = _posicao_cursor(request, ordenacao)
+        try:
+            queryset = filtrar_apos(queryset, ordenacao, posicao)
+        except ValueError:
+            raise CursorInvalido(request.GET['cursor'])
+        itens = list(queryset[:page_size + 1])
+        page = None
+    else:
+        page = _numero_pagina(request)
+        start = (page - 1) * page_size
+        itens = list(queryset[start:start + page_size + 1])
+
+    tem_proxima = len(itens) > page_size
+    itens = itens[:page_size]
+
+    ultimo = None
+    if tem_proxima:
+        item = itens[-1]
+        ultimo = (
+            item['codigo'] if isinstance(item, dict) else item.codigo,
+            texto_valor(valor_do_item(item, ordenacao, queryset.model))
+        )
+
+    next_url, previous_url = _links_paginacao(request, page, ultimo, ordenacao)
+    return itens, next_url, previous_url
+
+def _paginar_snapshot(request, snapshot, indices, page_size, ordenacao=ORDENACAO_PADRAO, centro=None):
+    """
+    Ordena e pagina os índices selecionados no snapshot colunar, com a
+    mesma semântica de cursor/page do _paginar, e retorna (índices, next, previous)
+    """
+    config = ORDENACOES[ordenacao]
+    indices, chaves = snapshot.ordenar(indices, config['campo'], config['decrescente'], centro)
+
+    if request.GET.get('cursor'):
+        posicao = _posicao_cursor(request, ordenacao)
+        try:
+            inicio = snapshot.posicao_apos(
+                indices, chaves, posicao['codigo'], posicao.get('valor'), config['decrescente']
+            )
+        except (ValueError, TypeError):
+            raise CursorInvalido(request.GET['cursor'])
+        page = None
+    else:
+        page = _numero_pagina(request)
+        inicio = (page - 1) * page_size
+
+    pagina = indices[inicio:inicio + page_size]
+    ultimo = None
+    if len(indices) > inicio + page_size:
+        fim = inicio + page_size - 1
+        valor = None if chaves is None or np.isnan(chaves[fim]) else repr(float(chaves[fim]))
+        ultimo = (str(snapshot.codigos[indices[fim]]), valor)
+
+    next_url, previous_url = _links_paginacao(request, page, ultimo, ordenacao)
+    return pagina, next_url, previous_url
+
+def _links_paginacao(request, page, ultimo, ordenacao=ORDENACAO_PADRAO):
+    """
+    Monta os links next (cursor após o último item, dado como (código, valor
+    de ordenação)) e previous (page - 1). Os links são relativos ao host: as
+    respostas ficam em cache com chaves que não incluem host nem esquema
+    """
+    base_url = request.path
+    query_params = request.GET.copy()
+
+    next_url = None
+    if ultimo is not None:
+        codigo, valor = ultimo
+        posicao = {'codigo': codigo}
+        if ordenacao != ORDENACAO_PADRAO:
+            posicao.update({'sort': ordenacao, 'valor': valor})
+        query_params.pop('page', None)
+        query_params['cursor'] = _codificar_cursor(posicao)
+        next_url = f"{base_url}?{query_params.urlencode()}"
+
+    previous_url = None
+    if page and page > 1:
+        query_params.pop('cursor', None)
+        query_params['page'] = page - 1
+        previous_url = f"{base_url}?{query_params.urlencode()}"
+
+    return next_url, previous_url
+
+def _campos_ordenacao(queryset, ordenacao):
+    """Campo do queryset (Propriedade ou MarcadorMapa) lido para o cursor da ordenação"""
+    campo = ORDENACOES[ordenacao]['campo']
+    return [campo_escalado(queryset.model, campo)[0]] if campo else []
+
+def _paginar_marcadores(request, queryset, page_size, ordenacao=ORDENACAO_PADRAO):
+    """
+    Pagina os marcadores (codigo, latitude, longitude, valor e desconto, nas
+    unidades de Propriedade) de um queryset de Propriedade ou de MarcadorMapa
+    """
+    campos = {campo: campo_escalado(queryset.model, campo) for campo in ('latitude', 'longitude', 'valor', 'desconto')}
+    itens, next_page, previous_page = _paginar(request, queryset.values(
+        'codigo', *(nome for nome, _ in campos.values()), *_campos_ordenacao(queryset, ordenacao)
+    ), page_size, ordenacao=ordenacao)
+    marcadores = [
+        {'codigo': item['codigo'], **{campo: desescalar(item[nome], escala) for campo, (nome, escala) in campos.items()}}
+        for item in itens
+    ]
+    return marcadores, next_page, previous_page
+
+def _formato_mapa(request):
+    """Identifica o formato de resposta pedido ao mapa_api: json, columnar ou binario"""
+    formato = request.GET.get('format', 'json')
+    if formato == 'columnar' and CONTENT_TYPE_BINARIO in request.META.get('HTTP_ACCEPT', ''):
+        formato = 'binario'
+    return formato if formato in ('columnar', 'binario') else 'json'
+
+def _tamanho_pagina(request, padrao, maximo=None):
+    """
+    Lê o parâmetro page_size (no mínimo 1 e, se informado, no máximo `maximo`).
+    Levanta ValueError se não for um inteiro.
+    """
+    tamanho = max(int(request.GET.get('page_size', padrao)), 1)
+    return min(tamanho, maximo) if maximo else tamanho
+
+# Páginas mais profundas que isso devem ser lidas pelo cursor (OFFSET muito grande estoura o banco)
+PAGINA_MAXIMA = 1_000_000
+
+def _numero_pagina(request):
+    """
+    Lê o parâmetro page (no mínimo 1). Levanta ValueError se não for um
+    inteiro ou se passar de PAGINA_MAXIMA.
+    """
+    pagina = max(int(request.GET.get('page', 1)), 1)
+    if pagina > PAGINA_MAXIMA:
+        raise ValueError(pagina)
+    return pagina
+
+def _contagem_max(request):
+    """Lê o parâmetro contagem_max (limite da contagem de resultados), se informado"""
+    try:
+        contagem_max = int(request.GET.get('contagem_max', 0))
+    except (ValueError, TypeError):
+        return None
+    return contagem_max if contagem_max > 0 else None
+
+def _limitar_contagem(total, contagem_max=None):
+    """Retorna (total, exato): acima de contagem_max, o total é o próprio limite ("1000+")"""
+    if contagem_max is not None and total > contagem_max:
+        return contagem_max, False
+    return total, True
+
+def _contar(queryset, contagem_max=None):
+    """
+    Conta os resultados do queryset e retorna (total, exato).
+
+    Com contagem_max, o banco conta no máximo contagem_max + 1 linhas
+    (COUNT sobre uma subconsulta com LIMIT); se o limite for ultrapassado,
+    o total retornado é o próprio limite e exato é False ("1000+").
+    """
+    if contagem_max is None:
+        return queryset.count(), True
+    return _limitar_contagem(queryset.order_by()[:contagem_max + 1].count(), contagem_max)
+
+def _serializar_mapa(dados, formato):
+    """
+    Serializa os dados do mapa_api para o cache de respostas. No formato
+    binário a paginação vai nos cabeçalhos.
+    """
+    if formato != 'binario':
+        return serializar_json(dados)
+    cabecalhos = {
+        "X-Total-Count": str(dados['count']),
+        "X-Total-Count-Exato": 'true' if dados['count_exato'] else 'false',
+    }
+    if dados['next']:
+        cabecalhos["Link"] = f'<{dados["next"]}>; rel="next"'
+    return {'conteudo': dados['conteudo'], 'content_type': CONTENT_TYPE_BINARIO, 'cabecalhos': cabecalhos}
+
+@leitura_condicional
 def estados_api(request):
     """API para retornar lista de estados"""
-    cache_key = 'estados_list'
-    estados = cache.get(cache_key)
-    if estados is None:
-        estados = list(Propriedade.objects.values_list('estado', flat=True).distinct().order_by('estado'))
-        cache.set(cache_key, estados, 3600)  # Cache por 1 hora
+    estados = obter_ou_calcular(
+        chave_versionada('estados_list'),
+        lambda: list(ResumoLocalidade.objects.values_list('estado', flat=True).distinct().order_by('estado'))
+    )
     return JsonResponse(estados, safe=False)
 
+@leitura_condicional
 def tipos_imovel_api(request):
     """API para retornar lista de tipos de imóvel"""
-    cache_key = 'tipos_imovel_list'
-    tipos = cache.get(cache_key)
-    if tipos is None:
-        tipos = list(Propriedade.objects.values_list('tipo_imovel', flat=True).distinct().order_by('tipo_imovel'))
-        cache.set(cache_key, tipos, 3600)  # Cache por 1 hora
+    tipos = obter_ou_calcular(
+        chave_versionada('tipos_imovel_list'),
+        lambda: list(ResumoLocalidade.objects.values_list('tipo_imovel', flat=True).distinct().order_by('tipo_imovel'))
+    )
     return JsonResponse(tipos, safe=False)
 
 def mapa_view(request):
     """View para renderizar a página do mapa"""
     # Obter lista de estados únicos
-    estados = Propriedade.objects.values_list('estado', flat=True).distinct().order_by('estado')
+    estados = ResumoLocalidade.objects.values_list('estado', flat=True).distinct().order_by('estado')
     
     # Obter tipos de imóveis únicos
-    tipos_imovel = Propriedade.objects.values_list('tipo_imovel', flat=True).distinct().order_by('tipo_imovel')
+    tipos_imovel = ResumoLocalidade.objects.values_list('tipo_imovel', flat=True).distinct().order_by('tipo_imovel')
     
     context = {
         'estados': estados,
@@ -56,286 +289,583 @@ def mapa_view(request):
     }
     return render(request, 'propriedades/mapa.html', context)
 
+@leitura_condicional
 def mapa_api(request):
     """API para retornar dados para o mapa"""
-    # Verificar se há algum filtro aplicado
-    tem_filtros = any([
-        request.GET.get('estado'),
-        request.GET.get('cidade'),
-        request.GET.get('bairro'),
-        request.GET.get('tipo_imovel'),
-        request.GET.get('valor_max'),
-        request.GET.get('desconto_min')
-    ])
-    
-    # Se não houver filtros, retornar lista vazia
-    if not tem_filtros:
+    # Modo cluster: agrupa os imóveis em células da grade no zoom informado
+    try:
+        zoom = int(request.GET.get('zoom', 4))
+    except (ValueError, TypeError):
+        zoom = 4
+    modo_cluster = request.GET.get('cluster') == '1' and zoom < ZOOM_MARCADORES_INDIVIDUAIS
+
+    filtro = FiltroPropriedades.de_request(request.GET)
+
+    # Se não houver filtros, retornar lista vazia (exceto no modo cluster,
+    # que permite visualizar o país inteiro)
+    if not filtro.tem_filtros() and not modo_cluster:
         return JsonResponse({
             'count': 0,
             'results': [],
             'message': 'Selecione os filtros para buscar imóveis'
         })
 
-    # Gerar chave de cache baseada nos filtros
-    cache_key = f"mapa_api_{request.GET.urlencode()}"
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return JsonResponse(cached_data)
-
-    # Iniciar queryset apenas com imóveis que têm coordenadas
-    queryset = Propriedade.objects.filter(
-        Q(latitude__isnull=False) & 
-        Q(longitude__isnull=False) &
-        ~Q(latitude=0) & 
-        ~Q(longitude=0)
-    ).only(
-        'codigo', 'tipo_imovel', 'cidade', 'estado', 'bairro',
-        'valor', 'latitude', 'longitude', 'desconto', 'valor_avaliacao', 'endereco'
-    ).order_by('codigo')
-    
-    # Aplicar filtros
-    if estado := request.GET.get('estado'):
-        estados = estado.split(',')
-        queryset = queryset.filter(estado__in=estados)
-        
-    if cidade := request.GET.get('cidade'):
-        cidades = cidade.split(',')
-        queryset = queryset.filter(cidade__in=cidades)
-        
-    if bairro := request.GET.get('bairro'):
-        bairros = bairro.split(',')
-        queryset = queryset.filter(bairro__in=bairros)
-        
-    if tipo_imovel := request.GET.get('tipo_imovel'):
-        tipos = tipo_imovel.split(',')
-        queryset = queryset.filter(tipo_imovel__in=tipos)
-        
-    if valor_min_str := request.GET.get('valor_min'):
-        try:
-            valor_min = float(valor_min_str)
-            print(f"DEBUG: Aplicando filtro valor_min: {valor_min}")
-            queryset = queryset.filter(valor__gte=valor_min)
-        except (ValueError, TypeError):
-            print(f"DEBUG: Valor inválido para valor_min: {valor_min_str}")
-            pass
-        
-    if valor_max_str := request.GET.get('valor_max'):
-        try:
-            valor_max = float(valor_max_str)
-            print(f"DEBUG: Aplicando filtro valor_max: {valor_max}")
-            queryset = queryset.filter(valor__lte=valor_max)
-        except (ValueError, TypeError):
-            print(f"DEBUG: Valor inválido para valor_max: {valor_max_str}")
-            pass
-        
-    if desconto_min_str := request.GET.get('desconto_min'): 
-        try:
-            desconto_min = float(desconto_min_str) # Converter para float
-            print(f"DEBUG: Aplicando filtro desconto_min: {desconto_min}")
-            queryset = queryset.filter(desconto__gte=desconto_min)
-        except (ValueError, TypeError):
-             print(f"DEBUG: Valor inválido para desconto_min: {desconto_min_str}")
-             pass
+    formato = _formato_mapa(request)
+    ordenacao = ler_ordenacao(request.GET, filtro)
 
-    # Contar total de resultados
-    total_count = queryset.count()
-    
-    # Implementar paginação manual
-    page_size = int(request.GET.get('page_size', 100))
-    page = int(request.GET.get('page', 1))
-    
     # Limitar o tamanho da página
-    page_size = min(page_size, 500)
-    
-    # Calcular offset e limite
-    start = (page - 1) * page_size
-    end = start + page_size
-    
-    # Obter resultados da página atual
-    paged_queryset = queryset[start:end]
-    
-    # Converter para lista de dicionários
-    propriedades = []
-    for prop in paged_queryset:
-        propriedades.append({
-            'codigo': prop.codigo,
-            'tipo_imovel': prop.tipo_imovel,
-            'cidade': prop.cidade,
-            'estado': prop.estado,
-            'bairro': prop.bairro,
-            'valor': str(prop.valor),
-            'latitude': str(prop.latitude),
-            'longitude': str(prop.longitude),
-            'desconto': str(prop.desconto or 0),
-            'valor_avaliacao': str(prop.valor_avaliacao) if prop.valor_avaliacao else None,
-            'endereco': prop.endereco
-        })
-    
-    # Construir URLs de paginação
-    base_url = request.build_absolute_uri().split('?')[0]
-    query_params = request.GET.copy()
-    
-    # Próxima página
-    next_page = None
-    if start + page_size < total_count:
-        query_params['page'] = page + 1
-        next_page = f"{base_url}?{query_params.urlencode()}"
-    
-    # Página anterior
-    previous_page = None
-    if page > 1:
-        query_params['page'] = page - 1
-        previous_page = f"{base_url}?{query_params.urlencode()}"
-    
+    try:
+        page_size = _tamanho_pagina(request, 100, maximo=500)
+    except ValueError:
+        return JsonResponse({'error': 'page_size inválido'}, status=400)
+    try:
+        page = _numero_pagina(request) if not request.GET.get('cursor') else None
+    except ValueError:
+        return JsonResponse({'error': 'page inválido'}, status=400)
+    contagem_max = _contagem_max(request)
+
+    # Gerar chave de cache canônica baseada nos filtros
+    if modo_cluster:
+        cache_key = chave_versionada(filtro.chave('mapa_api', cluster=1, zoom=zoom))
+    else:
+        cache_key = chave_versionada(filtro.chave(
+            'mapa_api', formato=formato, page_size=page_size, contagem_max=contagem_max, sort=ordenacao,
+            page=page, cursor=request.GET.get('cursor')
+        ))
+    # O cache guarda os bytes finais (já comprimidos para cada Content-Encoding)
+    try:
+        return resposta_em_cache(
+            request,
+            cache_key,
+            lambda: _serializar_mapa(
+                _dados_mapa(request, filtro, modo_cluster, zoom, formato, page_size, contagem_max, ordenacao),
+                'json' if modo_cluster else formato
+            )
+        )
+    except CursorInvalido:
+        return JsonResponse({'error': 'Cursor inválido'}, status=400)
+
+def _caixa_do_filtro(filtro):
+    """Retorna a caixa (min_lon, min_lat, max_lon, max_lat) que limita a região do filtro, se houver."""
+    caixas = []
+    if filtro.bbox:
+        caixas.append(filtro.bbox)
+    if filtro.raio:
+        caixas.append(caixa_do_raio(*filtro.raio))
+    if filtro.poligono is not None:
+        caixas.append(filtro.poligono.bounds)
+    if not caixas:
+        return None
+    # A região é a interseção das caixas (todas as condições se aplicam)
+    min_lon, min_lat, max_lon, max_lat = (
+        max(c[0] for c in caixas), max(c[1] for c in caixas),
+        min(c[2] for c in caixas), min(c[3] for c in caixas),
+    )
+    return (min_lon, min_lat, max(max_lon, min_lon), max(max_lat, min_lat))
+
+def _dados_mapa(request, filtro, modo_cluster, zoom, formato, page_size, contagem_max=None, ordenacao=ORDENACAO_PADRAO):
+    """
+    Monta os dados de resposta do mapa_api. Com o snapshot colunar ativo, os
+    filtros, a contagem e os clusters são resolvidos em memória. Sem ele, as
+    consultas leem a tabela estreita MarcadorMapa (exceto na busca textual).
+    """
+    snapshot = obter_snapshot(filtro)
+
+    # Aplicar filtros (com o snapshot, o banco não é consultado para filtrar)
+    if snapshot:
+        indices = snapshot.selecionar(filtro, apenas_mapa=True)
+        centro = filtro.raio[:2] if filtro.raio else None
+    elif marcadores_mapa.suporta(filtro):
+        queryset = marcadores_mapa.consultar(filtro, apenas_mapa=True)
+    else:
+        # Iniciar queryset apenas com imóveis que têm coordenadas
+        queryset = filtro.aplicar(Propriedade.objects.filter(
+            Q(latitude__isnull=False) & 
+            Q(longitude__isnull=False) &
+            ~Q(latitude=0) & 
+            ~Q(longitude=0)
+        ).order_by('codigo'))
+
+    if modo_cluster:
+        # Com muitas células ocupadas, a grade fica mais grossa que a do zoom pedido
+        if snapshot:
+            clusters, zoom_celulas = snapshot.clusters(indices, zoom, _caixa_do_filtro(filtro))
+        else:
+            clusters, zoom_celulas = agrupar_em_clusters(queryset, zoom, _caixa_do_filtro(filtro))
+        response_data = {
+            'count': sum(c['count'] for c in clusters),
+            'count_exato': True,
+            'zoom': zoom,
+            'zoom_celulas': zoom_celulas,
+            'clusters': clusters,
+            'results': [],
+            'next': None,
+            'previous': None
+        }
+        return response_data
+
+    # Contar total de resultados (no snapshot a contagem sai da máscara, mas
+    # contagem_max é aplicado igual ao banco para a resposta não depender do caminho)
+    if snapshot:
+        total_count, count_exato = _limitar_contagem(len(indices), contagem_max)
+    else:
+        total_count, count_exato = _contar(queryset, contagem_max)
+
+    if formato != 'json':
+        # Formatos compactos: apenas as colunas necessárias para os marcadores
+        if snapshot:
+            pagina, next_page, previous_page = _paginar_snapshot(
+                request, snapshot, indices, page_size, ordenacao, centro
+            )
+            marcadores = snapshot.marcadores(pagina)
+        else:
+            marcadores, next_page, previous_page = _paginar_marcadores(request, queryset, page_size, ordenacao)
+
+        colunas = marcadores_colunares(marcadores)
+        if formato == 'binario':
+            response_data = {
+                'count': total_count,
+                'count_exato': count_exato,
+                'conteudo': empacotar_binario(colunas),
+                'next': next_page
+            }
+            return response_data
+
+        response_data = {
+            'count': total_count,
+            'count_exato': count_exato,
+            'columns': colunas,
+            'next': next_page,
+            'previous': previous_page
+        }
+        return response_data
+
+    # Obter os códigos da página atual
+    if snapshot:
+        pagina, next_page, previous_page = _paginar_snapshot(
+            request, snapshot, indices, page_size, ordenacao, centro
+        )
+        codigos = snapshot.codigos[pagina].tolist()
+    else:
+        itens, next_page, previous_page = _paginar(
+            request, queryset.values('codigo', *_campos_ordenacao(queryset, ordenacao)), page_size, ordenacao=ordenacao
+        )
+        codigos = [item['codigo'] for item in itens]
+
+    # Cada imóvel já vem serializado (fragmentos em memória por versão dos dados)
     response_data = {
         'count': total_count,
-        'results': propriedades,
+        'count_exato': count_exato,
+        'results': ListaFragmentos(obter_fragmentos('mapa', codigos).values()),
         'next': next_page,
         'previous': previous_page
     }
     
-    # Cache por 5 minutos (300 segundos)
-    cache.set(cache_key, response_data, 300)
-    
-    return JsonResponse(response_data)
+    return response_data
+
+
+@require_http_methods(["GET"])
+def tiles_indice_api(request):
+    """API para informar a versão atual dos tiles do mapa"""
+    versao = tiles.versao_atual()
+    response = JsonResponse({
+        'versao': versao,
+        'zoom_maximo': tiles.ZOOM_MAXIMO,
+        'url': f"/api/tiles/{{z}}/{{x}}/{{y}}/?v={versao}"
+    })
+    response["Cache-Control"] = "public, max-age=60"
+    return response
+
+@require_http_methods(["GET"])
+def tiles_api(request, z, x, y):
+    """
+    API para servir tiles (z/x/y) do mapa. Cada tile é calculado na primeira
+    requisição (ou pré-calculado por gerar_tiles) e fica no cache 'mapa' até
+    a próxima versão dos dados.
+    """
+    if not tiles.tile_valido(z, x, y):
+        return JsonResponse({'erro': 'Tile inválido'}, status=404)
+
+    if z > tiles.ZOOM_MAXIMO:
+        z, x, y = tiles.tile_pai(z, x, y, tiles.ZOOM_MAXIMO)
+
+    versao = tiles.versao_atual()
+    limpar_marca_versao_anterior()
+    response = resposta_em_cache(request, tiles.chave_tile(z, x, y), lambda: tiles.calcular_tile(z, x, y))
+    if serviu_versao_anterior():
+        # Tile da versão anterior, servido enquanto o da atual é calculado
+        response["Cache-Control"] = "no-store"
+    elif request.GET.get('v') == versao:
+        # Tiles são imutáveis dentro de uma mesma versão dos dados
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response["Cache-Control"] = "public, max-age=300"
+    response["Access-Control-Allow-Origin"] = "*"
+    return response
 
+@leitura_condicional
 def propriedades_api(request):
-    """API para retornar imóveis filtrados"""
-    # Iniciar queryset apenas com imóveis que têm coordenadas
-    queryset = Propriedade.objects.filter(
-        latitude__isnull=False,
-        longitude__isnull=False
-    ).only(
-        'codigo', 'tipo_imovel', 'cidade', 'estado',
-        'valor', 'latitude', 'longitude', 'desconto'
-    ).order_by('codigo')
-    
-    # Aplicar filtros
-    if estado := request.GET.get('estado'):
-        estados = estado.split(',')
-        queryset = queryset.filter(estado__in=estados)
-        
-    if cidade := request.GET.get('cidade'):
-        cidades = cidade.split(',')
-        queryset = queryset.filter(cidade__in=cidades)
-        
-    if bairro := request.GET.get('bairro'):
-        bairros = bairro.split(',')
-        queryset = queryset.filter(bairro__in=bairros)
-        
-    if tipo_imovel := request.GET.get('tipo_imovel'):
-        tipos = tipo_imovel.split(',')
-        queryset = queryset.filter(tipo_imovel__in=tipos)
-        
-    if valor_min_str := request.GET.get('valor_min'):
-        try:
-            valor_min = float(valor_min_str)
-            print(f"DEBUG: Aplicando filtro valor_min: {valor_min}")
-            queryset = queryset.filter(valor__gte=valor_min)
-        except (ValueError, TypeError):
-            print(f"DEBUG: Valor inválido para valor_min: {valor_min_str}")
-            pass
-        
-    if valor_max_str := request.GET.get('valor_max'):
-        try:
-            valor_max = float(valor_max_str)
-            print(f"DEBUG: Aplicando filtro valor_max: {valor_max}")
-            queryset = queryset.filter(valor__lte=valor_max)
-        except (ValueError, TypeError):
-            print(f"DEBUG: Valor inválido para valor_max: {valor_max_str}")
-            pass
-        
-    if desconto_min_str := request.GET.get('desconto_min'): 
-        try:
-            desconto_min = float(desconto_min_str) # Converter para float
-            print(f"DEBUG: Aplicando filtro desconto_min: {desconto_min}")
-            queryset = queryset.filter(desconto__gte=desconto_min)
-        except (ValueError, TypeError):
-             print(f"DEBUG: Valor inválido para desconto_min: {desconto_min_str}")
-             pass
-        
-    if quartos := request.GET.get('quartos'):
-        quartos_list = quartos.split(',')
-        if quartos_list:
-            quartos_q = Q()
-            for q in quartos_list:
-                quartos_q |= Q(quartos__gte=q)
-            queryset = queryset.filter(quartos_q)
-
-    if codigo := request.GET.get('codigo'):
-        queryset = queryset.filter(codigo=codigo)
-
-    # Paginação
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 10)) # Usar 10 como padrão, igual ao frontend
-    start = (page - 1) * page_size
-    end = start + page_size
-
-    # Obter o total antes de aplicar a paginação ao queryset principal
-    total_count = queryset.count()
-
-    # Aplicar paginação
-    paged_queryset = queryset[start:end]
-
-    # Converter queryset para lista de dicionários
-    propriedades = list(paged_queryset.values(
-        'codigo', 'tipo_imovel', 'cidade', 'estado', 'bairro', 'endereco',
-        'valor', 'latitude', 'longitude', 'desconto', 'imagem_url',
-        'valor_avaliacao', 'area', 'quartos', 'modalidade_venda' # Adicionar os novos campos
+    """
+    API para retornar imóveis filtrados. q= faz busca textual (ordenada por
+    relevância) e lat, lon e raio_km buscam por proximidade (ordenada por
+    distância). sort= escolhe a ordenação: codigo, desconto, valor, valor_m2,
+    distancia ou relevancia (ver ordenacao.py)
+    """
+    filtro = FiltroPropriedades.de_request(request.GET)
+    try:
+        page_size = _tamanho_pagina(request, 10) # Usar 10 como padrão, igual ao frontend
+    except ValueError:
+        return JsonResponse({'error': 'page_size inválido'}, status=400)
+    try:
+        page = _numero_pagina(request) if not request.GET.get('cursor') else None
+    except ValueError:
+        return JsonResponse({'error': 'page inválido'}, status=400)
+    contagem_max = _contagem_max(request)
+    ordenacao = ler_ordenacao(request.GET, filtro)
+
+    # Gerar chave de cache canônica baseada nos filtros
+    cache_key = chave_versionada(filtro.chave(
+        'propriedades_api', page_size=page_size, contagem_max=contagem_max, sort=ordenacao,
+        page=page, cursor=request.GET.get('cursor')
     ))
-    
-    # Garantir que valores numéricos sejam strings ou null onde apropriado
-    for prop in propriedades:
-        prop['valor'] = str(prop['valor']) if prop['valor'] is not None else None
-        prop['latitude'] = str(prop['latitude']) if prop['latitude'] is not None else None
-        prop['longitude'] = str(prop['longitude']) if prop['longitude'] is not None else None
-        prop['desconto'] = str(prop['desconto']) if prop['desconto'] is not None else '0'
-        prop['valor_avaliacao'] = str(prop['valor_avaliacao']) if prop['valor_avaliacao'] is not None else None
-        prop['area'] = str(prop['area']) if prop['area'] is not None else None # Converter area
-        # quartos e modalidade_venda não precisam de conversão extra aqui, mas são incluídos nos .values()
-        
-    # Construir URLs de paginação (lógica similar à mapa_api)
-    base_url = request.build_absolute_uri().split('?')[0]
-    query_params = request.GET.copy()
-    
-    next_page_url = None
-    if end < total_count:
-        query_params['page'] = page + 1
-        next_page_url = f"{base_url}?{query_params.urlencode()}"
-    
-    previous_page_url = None
-    if page > 1:
-        query_params['page'] = page - 1
-        previous_page_url = f"{base_url}?{query_params.urlencode()}"
+    try:
+        return resposta_em_cache(
+            request,
+            cache_key,
+            lambda: serializar_json(_dados_propriedades(request, filtro, page_size, contagem_max, ordenacao))
+        )
+    except CursorInvalido:
+        return JsonResponse({'error': 'Cursor inválido'}, status=400)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def busca_poligono_api(request):
+    """
+    API para retornar os imóveis dentro de um polígono desenhado no mapa.
+    O corpo é um GeoJSON (Polygon, MultiPolygon ou Feature); os demais
+    filtros e a paginação são os mesmos do propriedades_api, na URL.
+    """
+    try:
+        poligono = ler_poligono(json.loads(request.body))
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    except PoligonoInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    filtro = FiltroPropriedades.de_request(request.GET)
+    filtro.poligono = poligono
+    try:
+        page_size = _tamanho_pagina(request, 10, maximo=500)
+    except ValueError:
+        return JsonResponse({'error': 'page_size inválido'}, status=400)
+    try:
+        page = _numero_pagina(request) if not request.GET.get('cursor') else None
+    except ValueError:
+        return JsonResponse({'error': 'page inválido'}, status=400)
+    contagem_max = _contagem_max(request)
+    ordenacao = ler_ordenacao(request.GET, filtro)
+
+    cache_key = chave_versionada(filtro.chave(
+        'busca_poligono_api', page_size=page_size, contagem_max=contagem_max, sort=ordenacao,
+        page=page, cursor=request.GET.get('cursor')
+    ))
+    try:
+        return resposta_em_cache(
+            request,
+            cache_key,
+            lambda: serializar_json(_dados_propriedades(request, filtro, page_size, contagem_max, ordenacao))
+        )
+    except CursorInvalido:
+        return JsonResponse({'error': 'Cursor inválido'}, status=400)
+
+def _dados_propriedades(request, filtro, page_size, contagem_max=None, ordenacao=ORDENACAO_PADRAO):
+    """
+    Monta os dados de resposta do propriedades_api. Com o snapshot colunar
+    ativo, o banco não é consultado para filtrar, contar nem paginar; sem ele,
+    as consultas leem o MarcadorMapa (exceto na busca textual). Os imóveis da
+    página vêm dos fragmentos JSON já serializados.
+    """
+    snapshot = obter_snapshot(filtro)
+
+    # Campos que dependem da busca e são acrescentados ao fragmento de cada imóvel
+    extras = {}
 
-    # Retornar JSON na estrutura esperada pelo frontend (ApiResponse)
-    return JsonResponse({
+    if snapshot:
+        # Filtros, contagem e ordenação em memória
+        indices = snapshot.selecionar(filtro)
+        # Mesmo limite de contagem_max do banco, para a resposta não depender do caminho
+        total_count, count_exato = _limitar_contagem(len(indices), contagem_max)
+        centro = filtro.raio[:2] if filtro.raio else None
+        pagina, next_page_url, previous_page_url = _paginar_snapshot(
+            request, snapshot, indices, page_size, ordenacao, centro
+        )
+        codigos = snapshot.codigos[pagina].tolist()
+        if centro:
+            for codigo, distancia in zip(codigos, snapshot.distancias(pagina, *centro).tolist()):
+                extras[codigo] = {'distancia_km': round(distancia, 3)}
+    else:
+        if marcadores_mapa.suporta(filtro):
+            queryset = marcadores_mapa.consultar(filtro)
+        else:
+            # Iniciar queryset apenas com imóveis que têm coordenadas
+            queryset = filtro.aplicar(Propriedade.objects.filter(
+                latitude__isnull=False,
+                longitude__isnull=False
+            ))
+
+        # Obter o total antes de aplicar a paginação ao queryset principal
+        total_count, count_exato = _contar(queryset, contagem_max)
+
+        # A página só precisa dos códigos, do valor de ordenação (para o cursor)
+        # e das anotações da busca textual e por raio
+        campos = ['codigo']
+        if filtro.texto:
+            campos.append('relevancia')
+        if filtro.raio:
+            campos.append('distancia_km')
+        campos += [campo for campo in _campos_ordenacao(queryset, ordenacao) if campo not in campos]
+        itens, next_page_url, previous_page_url = _paginar(
+            request, queryset.values(*campos), page_size, ordenacao=ordenacao
+        )
+        codigos = [item['codigo'] for item in itens]
+
+        for item in itens:
+            extras[item['codigo']] = campos_item = {}
+            if filtro.texto:
+                campos_item['relevancia'] = round(float(item['relevancia'] or 0), 6)
+            if filtro.raio:
+                campos_item['distancia_km'] = round(float(item['distancia_km']), 3)
+
+    propriedades = ListaFragmentos(
+        acrescentar_campos(fragmento, extras.get(codigo))
+        for codigo, fragmento in obter_fragmentos('lista', codigos).items()
+    )
+
+    # Estrutura esperada pelo frontend (ApiResponse)
+    return {
         'count': total_count,
+        'count_exato': count_exato,
         'next': next_page_url,
         'previous': previous_page_url,
         'results': propriedades
-    })
+    }
+
+@require_http_methods(["GET"])
+@leitura_condicional
+def exportar_api(request):
+    """
+    Exporta todos os imóveis filtrados (mesmos filtros e sort= do
+    propriedades_api) em NDJSON ou CSV (?format=ndjson|csv). A resposta é
+    gerada aos poucos, lendo o banco por um cursor do servidor, então a
+    memória não cresce com a quantidade de linhas e não há contagem.
+    """
+    formato = request.GET.get('format', 'ndjson')
+    if formato not in FORMATOS_EXPORTACAO:
+        return JsonResponse({'error': 'Formato inválido (use ndjson ou csv)'}, status=400)
+
+    filtro = FiltroPropriedades.de_request(request.GET)
+    ordenacao = ler_ordenacao(request.GET, filtro)
+    queryset = ordenar(filtro.aplicar(Propriedade.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False
+    )), ordenacao)
+    campos = [
+        *CAMPOS_EXPORTACAO,
+        *(['relevancia'] if filtro.texto else []),
+        *(['distancia_km'] if filtro.raio else []),
+    ]
+
+    response = StreamingHttpResponse(
+        gerar_exportacao(queryset, campos, formato),
+        content_type=FORMATOS_EXPORTACAO[formato]
+    )
+    response['Content-Disposition'] = f'attachment; filename="imoveis.{formato}"'
+    return response
+
+# Campos com contagem por opção no endpoint de facetas
+CAMPOS_FACETAS = ['estado', 'cidade', 'bairro', 'tipo_imovel', 'modalidade_venda']
+
+@require_http_methods(["GET"])
+@leitura_condicional
+def facetas_api(request):
+    """
+    API para retornar, para os mesmos filtros do propriedades_api, a
+    quantidade de imóveis por estado, cidade, bairro, tipo e modalidade
+    """
+    filtro = FiltroPropriedades.de_request(request.GET)
+    facetas = obter_ou_calcular(
+        chave_versionada(filtro.chave('facetas_api')),
+        lambda: _calcular_facetas(filtro),
+        cache_alias='mapa'
+    )
+    return JsonResponse(facetas)
+
+def _calcular_facetas(filtro):
+    """Conta os imóveis por opção de cada faceta em uma única consulta agrupada"""
+    queryset = filtro.aplicar(Propriedade.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False
+    ))
+    grupos = queryset.order_by().values(*CAMPOS_FACETAS).annotate(total=Count('id'))
+
+    contagens = {campo: {} for campo in CAMPOS_FACETAS}
+    total = 0
+    for grupo in grupos:
+        total += grupo['total']
+        for campo in CAMPOS_FACETAS:
+            valor = grupo[campo]
+            contagens[campo][valor] = contagens[campo].get(valor, 0) + grupo['total']
+
+    facetas = {'count': total}
+    for campo, valores in contagens.items():
+        facetas[campo] = [
+            {'valor': valor, 'count': quantidade}
+            for valor, quantidade in sorted(valores.items(), key=lambda item: (item[0] is None, item[0] or ''))
+        ]
+    return facetas
+
+@require_http_methods(["GET"])
+@leitura_condicional
+def histogramas_api(request):
+    """
+    API para retornar os histogramas de valor, desconto e área privativa
+    dos imóveis que atendem aos filtros (para os controles deslizantes)
+    """
+    filtro = FiltroPropriedades.de_request(request.GET)
+    try:
+        bins = min(max(int(request.GET.get('bins', BINS_PADRAO)), 1), BINS_MAXIMO)
+    except (ValueError, TypeError):
+        bins = BINS_PADRAO
+
+    histogramas = obter_ou_calcular(
+        chave_versionada(filtro.chave('histogramas_api', bins=bins)),
+        lambda: _calcular_histogramas(filtro, bins),
+        cache_alias='mapa'
+    )
+    return JsonResponse(histogramas)
+
+def _calcular_histogramas(filtro, bins):
+    """Calcula os histogramas a partir do snapshot colunar, se ativo, ou do banco"""
+    snapshot = obter_snapshot(filtro)
+    if snapshot:
+        return calcular_histogramas(None, bins, colunas=snapshot.colunas(snapshot.selecionar(filtro), COLUNAS_HISTOGRAMA))
+    return calcular_histogramas(filtro.aplicar(Propriedade.objects.filter(
+        latitude__isnull=False,
+        longitude__isnull=False
+    )), bins)
 
+@leitura_condicional
 def cidades_api(request, estado):
     """API para retornar cidades de um estado"""
-    cidades = Propriedade.objects.filter(
+    cidades = ResumoLocalidade.objects.filter(
         estado=estado,
-        latitude__isnull=False,
-        longitude__isnull=False
+        total_com_coordenadas__gt=0
     ).values_list('cidade', flat=True).distinct().order_by('cidade')
     
     return JsonResponse(list(cidades), safe=False)
 
-def bairros_api(request, cidade):
+@leitura_condicional
+def bairros_api(request, cidade, estado=None):
     """API para retornar bairros de uma cidade"""
-    bairros = Propriedade.objects.filter(
+    bairros = ResumoLocalidade.objects.filter(
         cidade=cidade,
-        latitude__isnull=False,
-        longitude__isnull=False
-    ).values_list('bairro', flat=True).distinct().order_by('bairro')
+        total_com_coordenadas__gt=0
+    )
+    # Cidades homônimas em estados diferentes só são separadas se o estado for informado
+    if estado := estado or request.GET.get('estado'):
+        bairros = bairros.filter(estado=estado)
+    bairros = bairros.values_list('bairro', flat=True).distinct().order_by('bairro')
     
     return JsonResponse(list(bairros), safe=False)
 
+@require_http_methods(["GET"])
+@leitura_condicional
+def autocomplete_api(request):
+    """
+    API para sugerir cidades e bairros enquanto o usuário digita, tolerando
+    acentos ausentes e erros de digitação (?q=, ?estado=, ?tipo=cidade|bairro)
+    """
+    try:
+        limite = min(max(int(request.GET.get('limite', LIMITE_PADRAO)), 1), LIMITE_MAXIMO)
+    except (ValueError, TypeError):
+        limite = LIMITE_PADRAO
+
+    sugestoes = obter_indice().sugerir(
+        request.GET.get('q', ''),
+        estado=request.GET.get('estado') or None,
+        tipo=request.GET.get('tipo') or None,
+        limite=limite
+    )
+    return JsonResponse({'results': sugestoes})
+
+def _arvore_localidades():
+    """Monta a árvore estado → cidade → bairro com a quantidade de imóveis no mapa"""
+    resumos = ResumoLocalidade.objects.filter(total_com_coordenadas__gt=0).values_list(
+        'estado', 'cidade', 'bairro', 'total_com_coordenadas'
+    ).order_by('estado', 'cidade', 'bairro')
+
+    arvore = {}
+    for estado, cidade, bairro, total in resumos:
+        cidades = arvore.setdefault(estado, {})
+        bairros = cidades.setdefault(cidade, {})
+        bairros[bairro] = bairros.get(bairro, 0) + total
+
+    return [
+        {
+            'estado': estado,
+            'count': sum(sum(bairros.values()) for bairros in cidades.values()),
+            'cidades': [
+                {
+                    'cidade': cidade,
+                    'count': sum(bairros.values()),
+                    'bairros': [{'bairro': bairro, 'count': total} for bairro, total in bairros.items()],
+                }
+                for cidade, bairros in cidades.items()
+            ],
+        }
+        for estado, cidades in arvore.items()
+    ]
+
+def _serializar_localidades():
+    """Serializa a árvore de localidades uma única vez, em JSON puro e compactado"""
+    conteudo = json.dumps(_arvore_localidades(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return {'json': conteudo, 'gzip': gzip.compress(conteudo)}
+
+@require_http_methods(["GET"])
+def localidades_api(request):
+    """
+    API para retornar toda a árvore estado → cidade → bairro com contagens.
+
+    A resposta é pré-serializada e compactada por versão dos dados; o ETag
+    deriva da versão, então requisições condicionais (If-None-Match)
+    recebem 304 sem nenhuma consulta aos dados.
+    """
+    usa_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    versao = versao_dados()
+    etag = f'"localidades-v{versao}{"-gzip" if usa_gzip else ""}"'
+
+    if etag in [e.strip() for e in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        limpar_marca_versao_anterior()
+        conteudo = obter_ou_calcular(chave_versionada('localidades'), _serializar_localidades)
+        response = HttpResponse(
+            conteudo['gzip'] if usa_gzip else conteudo['json'],
+            content_type='application/json'
+        )
+        if usa_gzip:
+            response["Content-Encoding"] = "gzip"
+        if serviu_versao_anterior():
+            # Árvore da versão anterior, servida enquanto a atual é calculada: sem ETag
+            response["Vary"] = "Accept-Encoding"
+            response["Cache-Control"] = "no-store"
+            return response
+
+    response["ETag"] = etag
+    response["Vary"] = "Accept-Encoding"
+    response["Cache-Control"] = "public, no-cache"
+    return response
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def analisar_matricula(request):
@@ -423,6 +953,8 @@ def analisar_matricula(request):
                 
                 # Salvar a análise no banco de dados
                 propriedade.analise_matricula = analise
+                # O save() atualiza data_atualizacao, que invalida o ETag e o fragmento
+                # de detalhes deste imóvel (sem descartar os caches dos demais)
                 propriedade.save()
                 
                 return JsonResponse({'success': True, 'analise': analise})
@@ -439,6 +971,7 @@ def analisar_matricula(request):
         return JsonResponse({'error': f'Erro interno do servidor: {str(e)}'}, status=500)
 
 @require_http_methods(["GET"])
+@leitura_condicional_imovel
 def get_propriedade(request, codigo):
     try:
         propriedade = Propriedade.objects.get(codigo=codigo)
@@ -656,46 +1189,20 @@ def propriedade_view(request, codigo):
         raise Http404("Propriedade não encontrada")
 
 @require_http_methods(["GET"])
+@leitura_condicional_imovel
 def propriedade_detalhes_api(request, codigo):
     """
     API para retornar todos os detalhes de uma propriedade específica
     """
     try:
-        propriedade = Propriedade.objects.get(codigo=codigo)
-        
-        # Preparar dados da propriedade incluindo todos os campos
-        propriedade_dados = {
-            'id': propriedade.id,
-            'codigo': propriedade.codigo,
-            'tipo': propriedade.tipo,
-            'tipo_imovel': propriedade.tipo_imovel,
-            'endereco': propriedade.endereco,
-            'cidade': propriedade.cidade,
-            'estado': propriedade.estado,
-            'bairro': propriedade.bairro,
-            'valor': float(propriedade.valor),
-            'valor_avaliacao': float(propriedade.valor_avaliacao) if propriedade.valor_avaliacao else None,
-            'desconto': float(propriedade.desconto) if propriedade.desconto else None,
-            'descricao': propriedade.descricao,
-            'modalidade_venda': propriedade.modalidade_venda,
-            'area': float(propriedade.area) if propriedade.area else None,
-            'area_total': float(propriedade.area_total) if propriedade.area_total else None,
-            'area_privativa': float(propriedade.area_privativa) if propriedade.area_privativa else None,
-            'area_terreno': float(propriedade.area_terreno) if propriedade.area_terreno else None,
-            'quartos': propriedade.quartos,
-            'link': propriedade.link,
-            'data_atualizacao': propriedade.data_atualizacao.isoformat(),
-            'latitude': float(propriedade.latitude) if propriedade.latitude else None,
-            'longitude': float(propriedade.longitude) if propriedade.longitude else None,
-            'imagem_url': propriedade.imagem_url,
-            'imagem_cloudinary_url': propriedade.imagem_cloudinary_url,
-            'imagem_cloudinary_id': propriedade.imagem_cloudinary_id,
-            'matricula_url': propriedade.matricula_url,
-            'analise_matricula': propriedade.analise_matricula,
-        }
+        # Fragmento JSON já serializado (em memória por versão dos dados)
+        # Os detalhes são guardados por data_atualizacao (a análise da matrícula muda o imóvel)
+        fragmento = obter_fragmentos('detalhes', [codigo], {codigo: data_imovel(request, codigo)}).get(codigo)
+        if fragmento is None:
+            raise Propriedade.DoesNotExist
         
         # Adicionar CORS headers para permitir acesso do frontend
-        response = JsonResponse(propriedade_dados)
+        response = HttpResponse(fragmento, content_type='application/json')
         response["Access-Control-Allow-Origin"] = "*"
         response["Access-Control-Allow-Methods"] = "GET, OPTIONS"
         response["Access-Control-Allow-Headers"] = "Content-Type"
@@ -11,6 +11,9 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'imoveis_caixa.settings')
 django.setup()
 
 from propriedades.models import Propriedade
+from propriedades.marcadores import reconstruir_marcadores
+from propriedades.tiles import gerar_tiles
+from propriedades.versao import incrementar_versao_dados
 
 # Configuração de logging
 logging.basicConfig(
@@ -122,6 +125,16 @@ class RevalidadorCoordenadas:
                     
         except Exception as e:
             logger.error(f"Erro durante a validação: {str(e)}")
+        
+        if total['invalidos']:
+            reconstruir_marcadores()
+            incrementar_versao_dados()
+
+            # Os tiles do mapa também guardam as coordenadas
+            try:
+                gerar_tiles()
+            except Exception as e:
+                logger.error(f"Erro ao gerar tiles do mapa: {str(e)}")
             
         # Relatório final
         logger.info("\n=== Relatório Final ===")